@@ -0,0 +1,204 @@
+"""ベンチマーク用のDBの生成・計測・結果の比較
+
+srcフォルダで実行する
+
+    python -m benchmark generate bench.db --files 1000000 --tags 50000
+    python -m benchmark run bench.db --output result.json
+    python -m benchmark compare base.json result.json --threshold 0.2
+    python -m benchmark plan bench.db
+
+compareは遅くなったケースがある場合に終了コード1を返す。
+planは一覧の深いページが範囲検索にならない並び替えがある場合に終了コード1を返す。
+uiのケースはfletがインストールされている場合のみ計測する
+"""
+
+import argparse
+import json
+import os
+import sys
+
+from benchmark import dataset, runner
+from benchmark.cases import GROUPS
+
+EXIT_OK = 0
+EXIT_REGRESSED = 1
+EXIT_ERROR = 2
+
+
+def cmd_generate(args) -> int:
+    info = dataset.generate(
+        args.db,
+        files=args.files,
+        tags=args.tags,
+        seed=args.seed,
+        tag_skew=args.skew,
+        on_progress=dataset.print_progress,
+    )
+    print(json.dumps(info, ensure_ascii=False, indent=2))
+    return EXIT_OK
+
+
+def _dataset_info(db_path: str, file_manager) -> dict:
+    import util.util_query as util_query
+
+    info = {}
+    info_path = dataset.dataset_info_path(db_path)
+    if os.path.exists(info_path):
+        with open(info_path, encoding="utf-8") as f:
+            info.update(json.load(f))
+    with file_manager.read_session() as cursor:
+        info["counts"] = dict(util_query.select_table_stats(cursor))
+    info["path"] = os.path.abspath(db_path)
+    info["size_bytes"] = os.path.getsize(db_path)
+    info["fts"] = file_manager.fts_enabled
+    return info
+
+
+def cmd_run(args) -> int:
+    from benchmark.cases import build_cases
+    from database.file_manager import FileManager
+
+    if not os.path.exists(args.db):
+        print(f"DBが存在しません: {args.db}", file=sys.stderr)
+        return EXIT_ERROR
+    file_manager = FileManager(args.db)
+    try:
+        cases, skipped = build_cases(file_manager, tuple(args.group or GROUPS))
+        if args.filter:
+            cases = [case for case in cases if args.filter in case.name]
+        for group, reason in skipped.items():
+            print(f"{group}: 実行しません({reason})", file=sys.stderr)
+        results = runner.run_cases(
+            cases,
+            args.repeat,
+            args.warmup,
+            on_result=lambda result: print(runner.format_result(result), file=sys.stderr),
+        )
+        report = runner.build_report(
+            results, _dataset_info(args.db, file_manager), skipped
+        )
+    finally:
+        file_manager.close()
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    return EXIT_OK
+
+
+def cmd_plan(args) -> int:
+    from benchmark.cases import plan_checks
+    from database.file_manager import FileManager
+
+    if not os.path.exists(args.db):
+        print(f"DBが存在しません: {args.db}", file=sys.stderr)
+        return EXIT_ERROR
+    file_manager = FileManager(args.db)
+    try:
+        results = plan_checks(file_manager)
+    finally:
+        file_manager.close()
+    failed = 0
+    for name, ok, plan in results:
+        print(f"{'OK' if ok else 'NG'} {name}")
+        if not ok or args.verbose:
+            for line in plan:
+                print(f"    {line}")
+        failed += 0 if ok else 1
+    if failed:
+        print(f"範囲検索にならない並び替え: {failed}件", file=sys.stderr)
+        return EXIT_REGRESSED
+    return EXIT_OK
+
+
+def cmd_compare(args) -> int:
+    rows = runner.compare_reports(
+        runner.load_report(args.baseline),
+        runner.load_report(args.current),
+        args.threshold,
+        args.min_delta / 1000,
+    )
+    runner.print_comparison(rows)
+    regressed = [row[0] for row in rows if row[4]]
+    if regressed:
+        print(f"遅くなったケース: {len(regressed)}件", file=sys.stderr)
+        return EXIT_REGRESSED
+    return EXIT_OK
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmark", description=__doc__.splitlines()[0]
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    generate = commands.add_parser("generate", help="ベンチマーク用のDBを作成")
+    generate.add_argument("db", help="作成するDBファイルのパス")
+    generate.add_argument("--files", type=int, default=dataset.DEFAULT_FILES)
+    generate.add_argument("--tags", type=int, default=dataset.DEFAULT_TAGS)
+    generate.add_argument("--seed", type=int, default=dataset.DEFAULT_SEED)
+    generate.add_argument(
+        "--skew",
+        type=float,
+        default=dataset.DEFAULT_TAG_SKEW,
+        help="タグの偏り(Zipf分布の指数)",
+    )
+    generate.set_defaults(func=cmd_generate)
+
+    run = commands.add_parser("run", help="計測して結果をJSONで出力")
+    run.add_argument("db", help="計測するDBファイルのパス")
+    run.add_argument("--output", "-o", help="結果の出力先(省略時は標準出力)")
+    run.add_argument("--repeat", "-n", type=int, default=runner.DEFAULT_REPEAT)
+    run.add_argument("--warmup", type=int, default=runner.DEFAULT_WARMUP)
+    run.add_argument(
+        "--group",
+        action="append",
+        choices=GROUPS,
+        help="計測するグループ(複数指定可、省略時はすべて)",
+    )
+    run.add_argument("--filter", "-k", help="ケース名に含まれる文字列で絞り込み")
+    run.set_defaults(func=cmd_run)
+
+    plan = commands.add_parser("plan", help="一覧の深いページの実行計画を確認")
+    plan.add_argument("db", help="確認するDBファイルのパス")
+    plan.add_argument(
+        "--verbose", "-v", action="store_true", help="すべての実行計画を表示"
+    )
+    plan.set_defaults(func=cmd_plan)
+
+    compare = commands.add_parser("compare", help="2つの結果を比較")
+    compare.add_argument("baseline", help="比較元の結果")
+    compare.add_argument("current", help="比較先の結果")
+    compare.add_argument(
+        "--threshold",
+        type=float,
+        default=runner.DEFAULT_THRESHOLD,
+        help="中央値がこの割合を超えて増えたケースを遅延とする",
+    )
+    compare.add_argument(
+        "--min-delta",
+        type=float,
+        default=runner.DEFAULT_MIN_DELTA * 1000,
+        help="遅延とみなす最小の差(ミリ秒)",
+    )
+    compare.set_defaults(func=cmd_compare)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if not sys.stdout.isatty():
+        # パイプ・リダイレクト先にはOSの既定によらずUTF-8で出力
+        sys.stdout.reconfigure(encoding="utf-8")
+    try:
+        return args.func(args)
+    except (FileExistsError, ValueError) as ex:
+        # 既存のDBへの生成・形式の異なる結果の比較など
+        print(f"エラー: {ex}", file=sys.stderr)
+        return EXIT_ERROR
+
+
+if __name__ == "__main__":
+    sys.exit(main())
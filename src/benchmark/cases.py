@@ -0,0 +1,276 @@
+"""計測するケース
+
+db: 検索・タグ一覧(読み取り)とタグの紐づけ・削除(書き込み、毎回ロールバック)
+ui: 一覧の行・テーブル一覧の作成(画面に接続しないページで計測、fletが必要)
+"""
+
+import time
+
+import util.util_query as util_query
+from benchmark.runner import Case
+from database.file_search import (
+    SORT_EXPRESSIONS,
+    SORT_MEMO,
+    SORT_SIZE,
+    SORT_TAGS,
+    TARGET_MEMO,
+    TARGET_PATH,
+    FileQuery,
+    explain_file_page,
+)
+from database.tag_query import quote_tag
+from util.path_info import LINK_MISSING
+
+GROUPS = ("db", "ui")
+# 深いページの計測で読み進めるページ数
+DEEP_PAGES = 20
+# update_table_listの完了を待つ上限(秒)
+UI_TIMEOUT = 30
+
+
+class StubPage:
+    """画面に接続しないページ
+
+    コントロールから呼ばれる更新要求は回数を数えるだけで何もしない
+    """
+
+    def __init__(self):
+        self.dialog = None
+        self.overlay = []
+        self.updates = 0
+
+    def update(self, *controls):
+        self.updates += 1
+
+    def show_snack_bar(self, snack_bar):
+        pass
+
+    def set_clipboard(self, value):
+        pass
+
+
+class Sample:
+    """ケースで使うDB内の値(タグは紐づけ件数の多い順)"""
+
+    def __init__(self, file_manager):
+        with file_manager.read_session() as cursor:
+            counts = util_query.select_tag_counts(cursor)
+            cursor.execute("SELECT MIN(id), MAX(id) FROM file_entries")
+            self.min_id, self.max_id = cursor.fetchone()
+        if not counts or self.min_id is None:
+            raise ValueError("ファイル・タグが登録されていないDBは計測できません")
+        ranked = sorted(counts, key=lambda row: -row[2])
+        self.tags = [name for _, name, _ in ranked]
+        self.top_tag = self.tags[0]
+        self.median_tag = self.tags[len(self.tags) // 2]
+        self.tail_tag = self.tags[-1]
+
+    def middle_file_id(self) -> int:
+        return (self.min_id + self.max_id) // 2
+
+
+def _wait(submit):
+    return lambda: submit().result()
+
+
+def _search(file_manager, query: FileQuery, after: tuple = None):
+    return lambda: file_manager.executor.search_files(query, after).result()
+
+
+def _deep_cursor(file_manager, query: FileQuery) -> tuple:
+    """DEEP_PAGESページ読み進めた時点のカーソル"""
+    after = None
+    for _ in range(DEEP_PAGES):
+        _, after = file_manager.executor.search_files(query, after).result()
+        if after is None:
+            break
+    return after
+
+
+def search_cases(file_manager, sample: Sample) -> list:
+    """DbExecutor.search_files(一覧の1ページ目の取得)"""
+    queries = {
+        "default": FileQuery(),
+        "text_ascii": FileQuery(text="report"),
+        "text_ja": FileQuery(text="議事録"),
+        "text_short": FileQuery(text="見積"),
+        "path": FileQuery(text="営業本部", targets=(TARGET_PATH,)),
+        "memo": FileQuery(text="先方確認済み", targets=(TARGET_MEMO,)),
+        "tag_top": FileQuery(tag_expression=quote_tag(sample.top_tag)),
+        "tag_tail": FileQuery(tag_expression=quote_tag(sample.tail_tag)),
+        "tag_and": FileQuery(
+            tag_expression=f"{quote_tag(sample.tags[0])} AND {quote_tag(sample.tags[1])}"
+        ),
+        "tag_not": FileQuery(
+            tag_expression=f"{quote_tag(sample.tags[1])} NOT {quote_tag(sample.tags[0])}"
+        ),
+        "sort_size_desc": FileQuery(sort_key=SORT_SIZE, ascending=False),
+        "sort_memo": FileQuery(sort_key=SORT_MEMO),
+        "sort_tags": FileQuery(sort_key=SORT_TAGS),
+        "link_missing": FileQuery(link_status=LINK_MISSING),
+    }
+    cases = [
+        Case(f"db.search_files[{name}]", _search(file_manager, query))
+        for name, query in queries.items()
+    ]
+    for name in ("default", "tag_top", "sort_size_desc", "sort_memo"):
+        query = queries[name]
+        cases.append(
+            Case(
+                f"db.search_files[{name}_page{DEEP_PAGES + 1}]",
+                _search(file_manager, query, _deep_cursor(file_manager, query)),
+            )
+        )
+    return cases
+
+
+def plan_checks(file_manager) -> list:
+    """深いページの実行計画の確認(すべての並び替え・昇順と降順)
+
+    並び替えのインデックスを前ページの続きから範囲検索(SEARCH)していること。
+    先頭から読み飛ばす(SCAN)場合はページが深いほど遅くなる
+
+    Returns:
+        list: (名前, 範囲検索の場合True, 実行計画の各行)のリスト
+    """
+    results = []
+    for sort_key in SORT_EXPRESSIONS:
+        for ascending in (True, False):
+            query = FileQuery(sort_key=sort_key, ascending=ascending)
+            after = _deep_cursor(file_manager, query)
+            if after is None:
+                continue
+            with file_manager.read_session() as cursor:
+                plan = explain_file_page(
+                    cursor, query, after, fts=file_manager.fts_enabled
+                )
+            # 一覧のサブクエリ(CO-ROUTINE f)の最初の処理が読み込みの起点
+            start = plan.index("CO-ROUTINE f") + 1
+            direction = "asc" if ascending else "desc"
+            name = f"plan.search_files[sort_{sort_key}_{direction}_page{DEEP_PAGES + 1}]"
+            results.append((name, plan[start].startswith("SEARCH"), plan))
+    return results
+
+
+class RolledBackWrite:
+    """書き込みのケース
+
+    計測前に書き込みセッションを開始し、計測後にロールバックして
+    DBを毎回同じ状態に戻す
+    """
+
+    def __init__(self, file_manager, func, *args):
+        self.file_manager = file_manager
+        self.func = func
+        self.args = args
+        self._session = None
+        self._cursor = None
+
+    def setup(self):
+        self._session = self.file_manager.write_session()
+        self._cursor = self._session.__enter__()
+
+    def run(self):
+        self.func(self._cursor, *self.args)
+
+    def teardown(self):
+        self._cursor.connection.rollback()
+        self._session.__exit__(None, None, None)
+        self._session = self._cursor = None
+
+    def case(self, name: str) -> Case:
+        return Case(name, self.run, self.setup, self.teardown)
+
+
+def db_cases(file_manager) -> list:
+    sample = Sample(file_manager)
+    executor = file_manager.executor
+    file_id = sample.middle_file_id()
+    cases = search_cases(file_manager, sample)
+    cases += [
+        Case("db.list_tags", _wait(executor.list_tags)),
+        Case("db.list_tag_counts", _wait(executor.list_tag_counts)),
+        Case("db.table_stats", _wait(executor.table_stats)),
+    ]
+    writes = {
+        "db.insert_file_joined[new_tag]": (
+            util_query.insert_file_joined, file_id, "benchmark_new_tag", 99
+        ),
+        "db.insert_file_joined[median_tag]": (
+            util_query.insert_file_joined, file_id, sample.median_tag, 99
+        ),
+        "db.delete_tag[top]": (util_query.delete_tag, sample.top_tag),
+        "db.delete_tag[median]": (util_query.delete_tag, sample.median_tag),
+        "db.delete_tag[tail]": (util_query.delete_tag, sample.tail_tag),
+    }
+    cases += [
+        RolledBackWrite(file_manager, *args).case(name)
+        for name, args in writes.items()
+    ]
+    return cases
+
+
+def ui_cases(file_manager) -> list:
+    """一覧の行・テーブル一覧の作成
+
+    Raises:
+        ImportError: fletがインストールされていない場合
+    """
+    from database.file_search import fetch_file_page
+    from ui.pages.database_info import DatabaseInfoPage
+    from ui.pages.file_list import FileListPage, FileRow
+
+    page = StubPage()
+    file_list = FileListPage(page, file_manager)
+    with file_manager.read_session() as cursor:
+        files, _ = fetch_file_page(cursor, FileQuery(), fts=file_manager.fts_enabled)
+    file_list.files = files
+    file_list.set_tags(file_manager.executor.list_tags().result())
+    pool_size = len(file_list.row_pool)
+
+    def create_rows():
+        for _ in range(pool_size):
+            FileRow(page, file_manager, file_list.wrap_action)
+
+    def bind_rows():
+        for index, file in enumerate(files):
+            file_list.row_pool[index % pool_size].bind(
+                file, file_list.tags, file_list.file_open_type
+            )
+
+    database_info = DatabaseInfoPage(page, file_manager)
+
+    def update_table_list():
+        rows = database_info.table_list.rows
+        database_info._update_table_list(page)
+        # 行の作成はワーカースレッドで行うため、置き換わるまで待つ
+        deadline = time.monotonic() + UI_TIMEOUT
+        while database_info.table_list.rows is rows:
+            if time.monotonic() > deadline:
+                raise TimeoutError("テーブル一覧が更新されませんでした")
+            time.sleep(0.0001)
+
+    return [
+        Case(f"ui.file_row_init[{pool_size}]", create_rows),
+        Case(f"ui.file_row_bind[{len(files)}]", bind_rows),
+        Case("ui.set_files_table", file_list.set_files_table),
+        Case("ui.update_table_list", update_table_list),
+    ]
+
+
+def build_cases(file_manager, groups: tuple = GROUPS) -> tuple:
+    """計測するケース
+
+    Returns:
+        tuple: (ケースのリスト, 実行しなかったグループ -> 理由)
+    """
+    cases = []
+    skipped = {}
+    if "db" in groups:
+        cases += db_cases(file_manager)
+    if "ui" in groups:
+        try:
+            cases += ui_cases(file_manager)
+        except ImportError as ex:
+            skipped["ui"] = f"fletを読み込めません({ex})"
+    return cases, skipped
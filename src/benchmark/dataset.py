@@ -0,0 +1,236 @@
+"""ベンチマーク用のfiles.dbを生成する
+
+日本語・英数字を混ぜた深いパス、長いメモ、件数の偏ったタグ(Zipf分布)を持つ
+DBを乱数のシードから再現可能に作成する
+"""
+
+import itertools
+import json
+import os
+import random
+import sys
+import time
+
+import util.util_query as util_query
+from database.file_manager import FileManager
+from util.path_info import KIND_DIR, KIND_FILE, LINK_MISSING, LINK_OK
+
+DEFAULT_FILES = 100_000
+DEFAULT_TAGS = 5_000
+DEFAULT_SEED = 1
+# タグの偏り(Zipf分布の指数。大きいほど上位のタグに集中する)
+DEFAULT_TAG_SKEW = 1.1
+# 1フォルダあたりの平均ファイル数
+FILES_PER_DIR = 25
+# 1トランザクションで登録する件数
+BATCH_SIZE = 5000
+
+ROOTS = (
+    "C:\\Users\\tanaka\\Documents",
+    "C:\\work",
+    "D:\\プロジェクト",
+    "\\\\fileserver\\共有\\営業本部",
+    "\\\\nas01\\archive",
+)
+WORDS_JA = (
+    "営業部", "経理", "人事", "2024年度", "2023年度", "議事録", "報告書", "見積書",
+    "請求書", "設計資料", "お客様対応", "プロジェクト管理", "会議資料", "テスト結果",
+    "アーカイブ", "作業中", "提出用", "参考資料", "社外秘", "東京支社", "大阪支社",
+    "仕様書", "手順書", "月次", "週報", "ひな形", "最新版", "旧版",
+)
+WORDS_EN = (
+    "src", "docs", "archive", "backup", "release", "design", "meeting_notes",
+    "customer_A", "customer_B", "specifications", "drafts", "final", "review",
+    "budget", "roadmap", "infra", "migration", "report", "summary", "scan",
+)
+EXTENSIONS = (
+    ".xlsx", ".docx", ".pdf", ".txt", ".pptx", ".csv", ".png", ".zip", ".msg", ".md",
+)
+MEMO_SENTENCES = (
+    "最新版は共有フォルダの提出用に置いてあります。",
+    "先方確認済み。修正依頼があれば営業部の担当者へ連絡すること。",
+    "旧システムから移行したデータのため、一部の文字が化けている可能性あり。",
+    "月次の締め処理で使用する。変更する場合は経理の承認が必要。",
+    "Reviewed by the infra team; see the attached checklist before release.",
+    "Scanned copy of the signed contract. Original is kept in the archive room.",
+    "Draft only - numbers are not final until the budget meeting.",
+    "会議で指摘された点(3ページ目の表)を反映済み。",
+)
+TAG_WORDS = (
+    "重要", "確認待ち", "完了", "顧客", "社内", "契約", "見積", "設計", "手順",
+    "work", "draft", "todo", "archive", "review", "invoice", "contract", "photo",
+)
+
+
+def dataset_info_path(db_path: str) -> str:
+    """生成条件を保存するファイルのパス"""
+    return db_path + ".json"
+
+
+def _word(rng: random.Random) -> str:
+    return rng.choice(WORDS_JA if rng.random() < 0.6 else WORDS_EN)
+
+
+def _make_dirs(rng: random.Random, count: int) -> list:
+    """フォルダのパスを作成(既存のフォルダの下に追加して深い階層を作る)"""
+    dirs = list(ROOTS)
+    seen = set(dirs)
+    while len(dirs) < count + len(ROOTS):
+        # 深い階層ほど選ばれにくくならないよう、直近に作ったフォルダも親の候補にする
+        parent = dirs[-1] if rng.random() < 0.3 else rng.choice(dirs)
+        if parent.count("\\") > 14:
+            parent = rng.choice(ROOTS)
+        name = _word(rng)
+        if rng.random() < 0.5:
+            name = f"{name}_{rng.randrange(1000):03d}"
+        path = f"{parent}\\{name}"
+        if path not in seen:
+            seen.add(path)
+            dirs.append(path)
+    return dirs[len(ROOTS):]
+
+
+def _memo(rng: random.Random) -> str:
+    if rng.random() < 0.6:
+        return ""
+    # まれに長いメモ(数百文字)
+    count = rng.randint(8, 20) if rng.random() < 0.05 else rng.randint(1, 3)
+    return "".join(rng.choice(MEMO_SENTENCES) for _ in range(count))
+
+
+def _info(rng: random.Random, now: float, is_dir: bool) -> tuple:
+    """パス情報(path_info.stat_pathの戻り値の順)"""
+    link_status = rng.choices(
+        (LINK_OK, LINK_MISSING, None), weights=(85, 3, 12)
+    )[0]
+    if link_status is None:
+        # 未確認
+        return (None,) * 8
+    if link_status == LINK_MISSING:
+        return (None, None, None, 0, now, LINK_MISSING, None, None)
+    size = None if is_dir else int(rng.lognormvariate(11, 2.5))
+    mtime = now - rng.random() * 5 * 365 * 24 * 60 * 60
+    return (KIND_DIR if is_dir else KIND_FILE, size, mtime, 1, now, LINK_OK, None, None)
+
+
+def generate(
+    db_path: str,
+    files: int = DEFAULT_FILES,
+    tags: int = DEFAULT_TAGS,
+    seed: int = DEFAULT_SEED,
+    tag_skew: float = DEFAULT_TAG_SKEW,
+    on_progress=None,
+) -> dict:
+    """ベンチマーク用のDBを作成
+
+    同じ引数であれば同じ内容のDBになる
+
+    Args:
+        db_path (str): 作成するDBファイルのパス(存在しないこと)
+        files (int): ファイル数
+        tags (int): タグ数
+        seed (int): 乱数のシード
+        tag_skew (float): タグの偏り(Zipf分布の指数)
+        on_progress (function): (登録済み件数, 全件数)を受け取る処理
+
+    Raises:
+        FileExistsError: DBファイルが既に存在する場合
+
+    Returns:
+        dict: 生成条件と件数(dataset_info_pathにも保存する)
+    """
+    if os.path.exists(db_path):
+        raise FileExistsError(db_path)
+    rng = random.Random(seed)
+    started = time.monotonic()
+    now = time.time()
+
+    dirs = _make_dirs(rng, max(1, files // FILES_PER_DIR))
+    tag_names = [
+        f"{TAG_WORDS[i % len(TAG_WORDS)]}{i // len(TAG_WORDS) or ''}"
+        for i in range(tags)
+    ]
+    # 順位がiのタグの累積の重み(上位のタグほど多くのファイルに付く)
+    tag_weights = list(
+        itertools.accumulate(1 / (rank + 1) ** tag_skew for rank in range(tags))
+    )
+
+    file_manager = FileManager(db_path, reader_count=1)
+    try:
+        with file_manager.write_session() as cursor:
+            tag_ids = {}
+            for start in range(0, len(tag_names), util_query.IN_BATCH):
+                tag_ids.update(
+                    util_query.select_tag_ids(
+                        cursor, tag_names[start : start + util_query.IN_BATCH]
+                    )
+                )
+        ranked_tag_ids = [tag_ids[name] for name in tag_names]
+
+        for start in range(0, files, BATCH_SIZE):
+            entries = []
+            memos = []
+            links = []
+            for index in range(start, min(start + BATCH_SIZE, files)):
+                is_dir = rng.random() < 0.05
+                stem = "_".join(_word(rng) for _ in range(rng.choice((1, 1, 2, 3, 5))))
+                basename = f"{stem}_{index:07d}"
+                if not is_dir:
+                    basename += rng.choice(EXTENSIONS)
+                filepath = f"{rng.choice(dirs)}\\{basename}"
+                entries.append((basename, filepath, *_info(rng, now, is_dir)))
+                memos.append(_memo(rng))
+                count = rng.choices(range(7), weights=(10, 30, 25, 15, 10, 6, 4))[0]
+                links.append(
+                    list(
+                        dict.fromkeys(
+                            rng.choices(ranked_tag_ids, cum_weights=tag_weights, k=count)
+                        )
+                    )
+                )
+            with file_manager.write_session() as cursor:
+                cursor.execute("SELECT IFNULL(MAX(id), 0) FROM file_entries")
+                last_id = cursor.fetchone()[0]
+                util_query.register_files(cursor, entries)
+                cursor.execute(
+                    "SELECT id FROM file_entries WHERE id > ? ORDER BY id", (last_id,)
+                )
+                file_ids = [row[0] for row in cursor.fetchall()]
+                cursor.executemany(
+                    "UPDATE file_entries SET memo = ? WHERE id = ?",
+                    [(memo, file_id) for file_id, memo in zip(file_ids, memos) if memo],
+                )
+                cursor.executemany(
+                    "INSERT INTO file_tags (file_id, tag_id, number_of) VALUES (?,?,?)",
+                    [
+                        (file_id, tag_id, number_of)
+                        for file_id, tag_ids_of in zip(file_ids, links)
+                        for number_of, tag_id in enumerate(tag_ids_of)
+                    ],
+                )
+            if on_progress:
+                on_progress(start + len(entries), files)
+
+        with file_manager.read_session() as cursor:
+            counts = dict(util_query.select_table_stats(cursor))
+    finally:
+        file_manager.close()
+
+    info = {
+        "files": files,
+        "tags": tags,
+        "seed": seed,
+        "tag_skew": tag_skew,
+        "counts": counts,
+        "size_bytes": os.path.getsize(db_path),
+        "elapsed": round(time.monotonic() - started, 2),
+    }
+    with open(dataset_info_path(db_path), "w", encoding="utf-8") as f:
+        json.dump(info, f, ensure_ascii=False, indent=2)
+    return info
+
+
+def print_progress(done: int, total: int):
+    print(f"\r登録済み: {done:,} / {total:,}", end="", file=sys.stderr)
+    if done >= total:
+        print(file=sys.stderr)
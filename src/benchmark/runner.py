@@ -0,0 +1,218 @@
+"""ベンチマークの計測・結果の保存・比較"""
+
+import datetime
+import gc
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+
+# 結果のJSONの形式のバージョン
+RESULT_FORMAT = 1
+DEFAULT_REPEAT = 20
+DEFAULT_WARMUP = 2
+# 比較で遅くなったと判定する割合(中央値が20%以上増えた場合)
+DEFAULT_THRESHOLD = 0.2
+# 比較で無視する差(秒)。数十マイクロ秒のケースの揺らぎを遅延と判定しないため
+DEFAULT_MIN_DELTA = 0.0005
+
+
+class Case:
+    """ベンチマークの1ケース
+
+    setup・teardownは計測に含めない。runの戻り値は使わない
+    """
+
+    def __init__(self, name: str, run, setup=None, teardown=None):
+        """
+        Args:
+            name (str): ケース名("グループ.対象[条件]")
+            run (function): 計測する処理
+            setup (function): 毎回の計測前の処理
+            teardown (function): 毎回の計測後の処理(ロールバックなど)
+        """
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.teardown = teardown
+
+    @property
+    def group(self) -> str:
+        return self.name.split(".", 1)[0]
+
+
+def measure(case: Case, repeat: int = DEFAULT_REPEAT, warmup: int = DEFAULT_WARMUP) -> list:
+    """ケースを繰り返し実行して1回ごとの所要時間(秒)を計測
+
+    計測中はGCを止める(timeitと同じ)
+    """
+    timings = []
+    for index in range(warmup + repeat):
+        if case.setup:
+            case.setup()
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            started = time.perf_counter()
+            case.run()
+            elapsed = time.perf_counter() - started
+        finally:
+            if gc_enabled:
+                gc.enable()
+            if case.teardown:
+                case.teardown()
+        if index >= warmup:
+            timings.append(elapsed)
+    return timings
+
+
+def summarize(name: str, timings: list) -> dict:
+    """所要時間の統計値(秒)"""
+    ordered = sorted(timings)
+    return {
+        "name": name,
+        "repeat": len(ordered),
+        "min": ordered[0],
+        "median": statistics.median(ordered),
+        "mean": statistics.fmean(ordered),
+        # 最近傍順位法
+        "p95": ordered[max(0, -(-len(ordered) * 95 // 100) - 1)],
+        "max": ordered[-1],
+        "stdev": statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+    }
+
+
+def _git_revision() -> str:
+    try:
+        result = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            timeout=5,
+        )
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return result.stdout.strip() or None
+
+
+def environment() -> dict:
+    """計測環境(結果を比較する際の確認用)"""
+    try:
+        from importlib.metadata import version
+
+        flet_version = version("flet")
+    except Exception:
+        flet_version = None
+    return {
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "flet": flet_version,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+    }
+
+
+def run_cases(
+    cases: list,
+    repeat: int = DEFAULT_REPEAT,
+    warmup: int = DEFAULT_WARMUP,
+    on_result=None,
+) -> list:
+    """ケースを順に計測
+
+    Args:
+        on_result (function): 計測結果(dict)を1件ずつ受け取る処理
+
+    Returns:
+        list: 計測結果のリスト
+    """
+    results = []
+    for case in cases:
+        result = summarize(case.name, measure(case, repeat, warmup))
+        results.append(result)
+        if on_result:
+            on_result(result)
+    return results
+
+
+def build_report(results: list, dataset: dict, skipped: dict = None) -> dict:
+    """保存する結果
+
+    Args:
+        results (list): 計測結果のリスト
+        dataset (dict): 計測したDBの情報
+        skipped (dict): 実行しなかったグループ -> 理由
+    """
+    return {
+        "format": RESULT_FORMAT,
+        "created_at": datetime.datetime.now().astimezone().isoformat(timespec="seconds"),
+        "environment": environment(),
+        "dataset": dataset,
+        "unit": "s",
+        "results": results,
+        "skipped": skipped or {},
+    }
+
+
+def load_report(path: str) -> dict:
+    with open(path, encoding="utf-8") as f:
+        report = json.load(f)
+    if report.get("format") != RESULT_FORMAT:
+        raise ValueError(f"結果の形式が異なります: {path}")
+    return report
+
+
+def compare_reports(
+    baseline: dict,
+    current: dict,
+    threshold: float = DEFAULT_THRESHOLD,
+    min_delta: float = DEFAULT_MIN_DELTA,
+) -> list:
+    """2つの結果を中央値で比較
+
+    Returns:
+        list: (ケース名, 比較元の中央値, 比較先の中央値, 比率, 遅くなった場合True)のリスト。
+            片方にしかないケースの中央値・比率はNone
+    """
+    base = {r["name"]: r["median"] for r in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        name = result["name"]
+        new = result["median"]
+        old = base.pop(name, None)
+        if old is None:
+            rows.append((name, None, new, None, False))
+            continue
+        ratio = new / old if old > 0 else None
+        regressed = (
+            ratio is not None and ratio > 1 + threshold and new - old > min_delta
+        )
+        rows.append((name, old, new, ratio, regressed))
+    rows.extend((name, old, None, None, False) for name, old in base.items())
+    return rows
+
+
+def _ms(value) -> str:
+    return "-" if value is None else f"{value * 1000:.3f}"
+
+
+def format_result(result: dict) -> str:
+    return (
+        f"{result['name']:<48} median {_ms(result['median']):>10} ms"
+        f"  p95 {_ms(result['p95']):>10} ms  (n={result['repeat']})"
+    )
+
+
+def print_comparison(rows: list, out=sys.stdout):
+    out.write(f"{'case':<48} {'base ms':>10} {'new ms':>10} {'ratio':>7}\n")
+    for name, old, new, ratio, regressed in rows:
+        mark = "  << 遅延" if regressed else ""
+        ratio_text = "-" if ratio is None else f"{ratio:.2f}"
+        out.write(f"{name:<48} {_ms(old):>10} {_ms(new):>10} {ratio_text:>7}{mark}\n")
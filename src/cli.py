@@ -0,0 +1,381 @@
+"""コマンドラインから検索・登録・タグ付け・出力・リンク切れ確認を行う
+
+GUI(flet)は読み込まない。srcフォルダで実行する
+
+    python -m cli search 報告書 --tag "work AND 2024" --format tsv
+    python -m cli register C:\\work\\a.txt --tag work --tag 2024
+    python -m cli tag C:\\work\\a.txt --add draft --remove 2024
+    python -m cli export --format jsonl > files.jsonl
+    python -m cli health --recheck
+    python -m cli serve --port 8765
+"""
+
+import argparse
+import json
+import sys
+
+DEFAULT_DB = "files.db"
+FORMATS = ("json", "jsonl", "tsv")
+
+# 終了コード
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_NOT_FOUND = 2
+
+
+def open_db(args, reader_count: int = 1):
+    """DBを開く(移行が必要な場合は進捗を標準エラーに出力)"""
+    from database.file_manager import FileManager
+
+    file_manager = FileManager(args.db, reader_count=reader_count, migrate=False)
+
+    def on_progress(description: str, done: int, total: int):
+        print(f"\r{description} ({done:,} / {total:,})", end="", file=sys.stderr)
+        if done >= total:
+            print(file=sys.stderr)
+
+    file_manager.migrate(on_progress)
+    return file_manager
+
+
+# ============================================
+# 出力
+# ============================================
+def _tsv_value(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        value = ",".join(value)
+    # パスの区切り文字(\)はそのまま出力する
+    return (
+        str(value)
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def write_records(records, fields: tuple, output_format: str, out=sys.stdout):
+    """辞書のレコードを出力(jsonl・tsvは1件ずつ書き出す)
+
+    Returns:
+        int: 出力した件数
+    """
+    count = 0
+    if output_format == "json":
+        out.write("[")
+        for record in records:
+            out.write(",\n" if count else "\n")
+            out.write(json.dumps(record, ensure_ascii=False))
+            count += 1
+        out.write("\n]\n" if count else "]\n")
+        return count
+    if output_format == "tsv":
+        out.write("\t".join(fields) + "\n")
+    for record in records:
+        if output_format == "jsonl":
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        else:
+            out.write("\t".join(_tsv_value(record.get(f)) for f in fields) + "\n")
+        count += 1
+    return count
+
+
+def _resolve_file(cursor, target: str):
+    """ファイルIDまたはパスから登録済みのファイル(id, filename, filepath, memo)"""
+    import util.util_query as util_query
+
+    if target.isdigit():
+        cursor.execute(
+            "SELECT id, filename, filepath, memo FROM files WHERE id = ?",
+            (int(target),),
+        )
+        return cursor.fetchone()
+    return util_query.find_file_by_path(cursor, target)
+
+
+# ============================================
+# コマンド
+# ============================================
+def _file_query(args):
+    from database.file_search import FileQuery
+
+    return FileQuery(
+        text=args.text or "",
+        targets=tuple(args.target or ("filename",)),
+        tag_expression=args.tag or "",
+        sort_key=args.sort,
+        ascending=not args.desc,
+        link_status=args.link or "",
+    )
+
+
+def cmd_search(args) -> int:
+    from itertools import islice
+
+    from database.file_search import FILE_FIELDS, file_record, iter_files
+
+    file_manager = open_db(args)
+    try:
+        with file_manager.read_session() as cursor:
+            page_size = min(args.limit, 1000) if args.limit else 1000
+            rows = iter_files(
+                cursor, _file_query(args), page_size, file_manager.fts_enabled
+            )
+            if args.limit:
+                rows = islice(rows, args.limit)
+            write_records(
+                (file_record(row) for row in rows), FILE_FIELDS, args.format
+            )
+    finally:
+        file_manager.close()
+    return EXIT_OK
+
+
+def cmd_export(args) -> int:
+    args.text = ""
+    args.target = None
+    args.link = ""
+    args.limit = 0
+    return cmd_search(args)
+
+
+def cmd_register(args) -> int:
+    import os
+
+    import util.util_query as util_query
+    from util.path_info import stat_path
+
+    file_manager = open_db(args)
+    results = []
+    try:
+        for filepath in args.paths:
+            if not args.no_abspath:
+                filepath = os.path.abspath(filepath)
+            # パス情報はトランザクションの外で取得
+            info = stat_path(filepath)
+            filename = args.name or os.path.basename(filepath.rstrip("/\\")) or filepath
+            with file_manager.write_session() as cursor:
+                file_id, created = util_query.register_file(
+                    cursor, filename, filepath, args.memo or "", info
+                )
+                if created:
+                    util_query.link_tags(cursor, file_id, args.tag or [])
+            results.append(
+                {"id": file_id, "filepath": filepath, "created": created}
+            )
+    finally:
+        file_manager.close()
+    write_records(results, ("id", "filepath", "created"), args.format)
+    return EXIT_OK
+
+
+def cmd_tag(args) -> int:
+    import util.util_query as util_query
+
+    file_manager = open_db(args)
+    try:
+        with file_manager.write_session() as cursor:
+            file = _resolve_file(cursor, args.file)
+            if file is None:
+                print(f"登録されていません: {args.file}", file=sys.stderr)
+                return EXIT_NOT_FOUND
+            file_id = file[0]
+            removed = util_query.unlink_tags(cursor, file_id, args.remove or [])
+            cursor.execute(
+                "SELECT IFNULL(MAX(number_of), -1) + 1 FROM file_tags WHERE file_id = ?",
+                (file_id,),
+            )
+            util_query.link_tags(
+                cursor, file_id, args.add or [], cursor.fetchone()[0]
+            )
+            cursor.execute(
+                """
+                SELECT t.tag_name FROM file_tags j
+                JOIN tag_mng t ON t.id = j.tag_id
+                WHERE j.file_id = ?
+                ORDER BY j.number_of
+                """,
+                (file_id,),
+            )
+            tags = [row[0] for row in cursor.fetchall()]
+    finally:
+        file_manager.close()
+    write_records(
+        [{"id": file_id, "filepath": file[2], "tags": tags, "removed": removed}],
+        ("id", "filepath", "tags", "removed"),
+        args.format,
+    )
+    return EXIT_OK
+
+
+def cmd_tags(args) -> int:
+    import util.util_query as util_query
+
+    file_manager = open_db(args)
+    try:
+        with file_manager.read_session() as cursor:
+            tags = util_query.select_tag_counts(cursor)
+    finally:
+        file_manager.close()
+    write_records(
+        ({"id": i, "tag": name, "count": count} for i, name, count in tags),
+        ("id", "tag", "count"),
+        args.format,
+    )
+    return EXIT_OK
+
+
+def cmd_health(args) -> int:
+    import util.util_query as util_query
+
+    file_manager = open_db(args)
+    try:
+        if args.recheck or args.refresh:
+            from database.path_refresher import PathRefresher
+
+            refresher = PathRefresher(file_manager)
+            if args.recheck:
+                refresher.recheck_all()
+            try:
+                while refresher.refresh_once():
+                    print(f"\r確認済み: {refresher.checked:,}", end="", file=sys.stderr)
+            finally:
+                refresher.stop()
+            if refresher.checked:
+                print(file=sys.stderr)
+        with file_manager.read_session() as cursor:
+            counts, oldest = util_query.select_link_summary(cursor)
+    finally:
+        file_manager.close()
+    records = [
+        {"link_status": status or "unchecked", "count": count}
+        for status, count in sorted(counts.items(), key=lambda item: item[0] or "")
+    ]
+    if args.format == "tsv":
+        write_records(records, ("link_status", "count"), args.format)
+    else:
+        summary = {"counts": {r["link_status"]: r["count"] for r in records}}
+        summary["oldest_checked_at"] = oldest
+        print(json.dumps(summary, ensure_ascii=False))
+    # リンク切れがある場合はcron等で検知できるよう終了コードで知らせる
+    return EXIT_NOT_FOUND if args.fail_on_missing and counts.get("missing") else EXIT_OK
+
+
+def cmd_serve(args) -> int:
+    from database.file_manager import READER_COUNT
+    from database.query_server import run_server
+
+    file_manager = open_db(args, reader_count=args.readers or READER_COUNT)
+    try:
+        run_server(file_manager, args.host, args.port)
+    finally:
+        file_manager.close()
+    return EXIT_OK
+
+
+# ============================================
+# 引数
+# ============================================
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m cli", description=__doc__.splitlines()[0])
+    parser.add_argument("--db", default=DEFAULT_DB, help="DBファイルのパス")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_format(sub, default="jsonl"):
+        sub.add_argument("--format", "-f", choices=FORMATS, default=default)
+
+    def add_query(sub):
+        sub.add_argument("--tag", "-t", help="タグ条件式 例: work AND (2024 OR draft)")
+        sub.add_argument(
+            "--sort",
+            default="filename",
+            choices=("filename", "filepath", "tags", "memo", "created_at", "size", "mtime"),
+        )
+        sub.add_argument("--desc", action="store_true", help="降順")
+
+    search = commands.add_parser("search", help="ファイルを検索")
+    search.add_argument("text", nargs="?", default="", help="キーワード")
+    search.add_argument(
+        "--target",
+        action="append",
+        choices=("filename", "filepath", "memo"),
+        help="キーワードの検索対象(複数指定可、省略時は名称)",
+    )
+    search.add_argument(
+        "--link", help="リンク状態 ok / missing / error / timeout / unchecked"
+    )
+    search.add_argument("--limit", "-n", type=int, default=100, help="0は無制限")
+    add_query(search)
+    add_format(search)
+    search.set_defaults(func=cmd_search)
+
+    export = commands.add_parser("export", help="登録済みのファイルをすべて出力")
+    add_query(export)
+    add_format(export)
+    export.set_defaults(func=cmd_export)
+
+    register = commands.add_parser("register", help="パスを登録")
+    register.add_argument("paths", nargs="+")
+    register.add_argument("--name", help="名称(省略時はファイル名)")
+    register.add_argument("--memo")
+    register.add_argument("--tag", "-t", action="append", help="タグ(複数指定可)")
+    register.add_argument(
+        "--no-abspath", action="store_true", help="パスを絶対パスに変換しない"
+    )
+    add_format(register)
+    register.set_defaults(func=cmd_register)
+
+    tag = commands.add_parser("tag", help="登録済みのファイルのタグを追加・解除")
+    tag.add_argument("file", help="ファイルIDまたはパス")
+    tag.add_argument("--add", "-a", action="append", help="追加するタグ(複数指定可)")
+    tag.add_argument("--remove", "-r", action="append", help="解除するタグ(複数指定可)")
+    add_format(tag)
+    tag.set_defaults(func=cmd_tag)
+
+    tags = commands.add_parser("tags", help="タグ一覧とファイル数")
+    add_format(tags)
+    tags.set_defaults(func=cmd_tags)
+
+    health = commands.add_parser("health", help="リンク切れ確認の集計")
+    health.add_argument(
+        "--refresh", action="store_true", help="未確認・確認日時の古いパスを確認してから集計"
+    )
+    health.add_argument(
+        "--recheck", action="store_true", help="すべてのパスを確認してから集計"
+    )
+    health.add_argument(
+        "--fail-on-missing",
+        action="store_true",
+        help=f"リンク切れがある場合は終了コード{EXIT_NOT_FOUND}",
+    )
+    add_format(health, default="json")
+    health.set_defaults(func=cmd_health)
+
+    serve = commands.add_parser("serve", help="HTTP/JSONで問い合わせを受け付ける")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", "-p", type=int, default=8765)
+    serve.add_argument("--readers", type=int, help="読み取り用コネクション数")
+    serve.set_defaults(func=cmd_serve)
+    return parser
+
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    if not sys.stdout.isatty():
+        # パイプ・リダイレクト先にはOSの既定によらずUTF-8で出力
+        sys.stdout.reconfigure(encoding="utf-8")
+    try:
+        return args.func(args)
+    except BrokenPipeError:
+        # headなどで出力を途中で閉じられた場合
+        sys.stderr.close()
+        return EXIT_OK
+    except ValueError as ex:
+        # タグ条件式の誤りなど
+        print(f"エラー: {ex}", file=sys.stderr)
+        return EXIT_ERROR
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,16 +1,16 @@
-# CONFIGファイル設定
-# ===========================
-# セクション：FILE_LIST
-# ===========================
-SECTION_FILE_LIST = "FILE_LIST"
-# キー
-KEY_FILE_OPEN = "file_open"
-
-
-# 定数設定
-# ファイルオープン設定
-FILE_OPEN = {
-    "NONE": {"text": "フォルダのみ", "type": "NONE"},
-    "ONLY": {"text": "ファイルのみ", "type": "ONLY"},
-    "BOTH": {"text": "ファイルとフォルダ", "type": "BOTH"},
-}
+# CONFIGファイル設定
+# ===========================
+# セクション：FILE_LIST
+# ===========================
+SECTION_FILE_LIST = "FILE_LIST"
+# キー
+KEY_FILE_OPEN = "file_open"
+
+
+# 定数設定
+# ファイルオープン設定
+FILE_OPEN = {
+    "NONE": {"text": "フォルダのみ", "type": "NONE"},
+    "ONLY": {"text": "ファイルのみ", "type": "ONLY"},
+    "BOTH": {"text": "ファイルとフォルダ", "type": "BOTH"},
+}
@@ -0,0 +1,118 @@
+import threading
+import time
+
+import util.util_query as util_query
+from util.crawler import DEFAULT_WORKERS, crawl_entries
+from util.file_walker import walk_entries
+
+# 1トランザクションで登録する件数
+BATCH_SIZE = 5000
+
+
+class BulkProgress:
+    """一括登録の進捗"""
+
+    def __init__(self):
+        self.scanned = 0
+        self.registered = 0
+        self.skipped = 0
+        self.cancelled = False
+        self.finished = False
+        self.started_at = time.monotonic()
+        self.elapsed = 0.0
+
+    def files_per_second(self) -> float:
+        return self.scanned / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class BulkRegister:
+    """フォルダ配下の一括登録
+
+    走査スレッドの結果をBATCH_SIZE件ずつ1トランザクションで登録する。
+    runは呼び出し元のスレッドで実行するため、UIからは別スレッドで呼ぶ
+    """
+
+    def __init__(
+        self, file_manager, batch_size: int = BATCH_SIZE, workers: int = DEFAULT_WORKERS
+    ):
+        """
+        Args:
+            file_manager (FileManager): DB管理
+            batch_size (int): 1トランザクションで登録する件数
+            workers (int): 走査スレッド数(1の場合は呼び出し元のスレッドで名前順に走査)
+        """
+        self.file_manager = file_manager
+        self.batch_size = batch_size
+        self.workers = workers
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        """登録を中断(登録済みのバッチは残る)"""
+        self._cancel.set()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancel.is_set()
+
+    def run(
+        self,
+        root: str,
+        max_depth: int = None,
+        include: list = (),
+        exclude: list = (),
+        include_dirs: bool = True,
+        tags: list = (),
+        on_progress=None,
+    ) -> BulkProgress:
+        """フォルダを走査して登録
+
+        Args:
+            root (str): 起点のフォルダ
+            max_depth (int): 読み込む階層の深さ(Noneは無制限)
+            include (list): 登録対象の名称パターン
+            exclude (list): 除外する名称パターン
+            include_dirs (bool): フォルダも登録する場合True
+            tags (list): 新規登録したファイルに紐づけるタグ名
+            on_progress (function): バッチ登録ごとにBulkProgressを受け取る処理
+
+        Returns:
+            BulkProgress: 登録結果
+        """
+        progress = BulkProgress()
+        # タグは新規登録したファイルがあるバッチで登録する
+        tags = list(dict.fromkeys(tag.strip() for tag in tags if tag.strip()))
+
+        args = (root, max_depth, include, exclude, include_dirs, self._cancel)
+        if self.workers > 1:
+            entries = crawl_entries(*args, workers=self.workers)
+        else:
+            entries = walk_entries(*args)
+
+        # 書き込みは呼び出し元のスレッドのみで行う
+        batch = []
+        for name, path, _, info in entries:
+            if self.cancelled:
+                break
+            batch.append((name, path, *info))
+            if len(batch) >= self.batch_size:
+                self._flush(batch, tags, progress, on_progress)
+                batch = []
+        if batch and not self.cancelled:
+            self._flush(batch, tags, progress, on_progress)
+
+        progress.cancelled = self.cancelled
+        progress.finished = True
+        progress.elapsed = time.monotonic() - progress.started_at
+        if on_progress:
+            on_progress(progress)
+        return progress
+
+    def _flush(self, batch: list, tags: list, progress: BulkProgress, on_progress):
+        with self.file_manager.write_session() as cursor:
+            count = util_query.register_files(cursor, batch, tags)
+        progress.scanned += len(batch)
+        progress.registered += count
+        progress.skipped += len(batch) - count
+        progress.elapsed = time.monotonic() - progress.started_at
+        if on_progress:
+            on_progress(progress)
@@ -0,0 +1,260 @@
+import traceback
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import util.util_query as util_query
+from database.file_search import PAGE_SIZE, FileQuery, fetch_file_page
+from database.record_browser import RECORD_PAGE_SIZE, fetch_record_page
+from util.path_info import stat_path
+
+# パス情報を取得するスレッド数
+STAT_WORKERS = 4
+
+
+def on_complete(future: Future, on_result, on_error=None):
+    """処理完了時のコールバックを登録
+
+    コールバックはワーカースレッドから呼ばれる
+
+    Args:
+        future (Future): DbExecutorが返したFuture
+        on_result (function): 結果を受け取る処理
+        on_error (function): 例外を受け取る処理(省略時は標準エラーに出力)
+    """
+
+    def done(f: Future):
+        ex = f.exception()
+        if ex is None:
+            on_result(f.result())
+        elif on_error:
+            on_error(ex)
+        else:
+            traceback.print_exception(ex)
+
+    future.add_done_callback(done)
+
+
+def _copy_result(source: Future, target: Future):
+    """sourceの結果(例外)をtargetに設定"""
+    ex = source.exception()
+    if ex is None:
+        target.set_result(source.result())
+    else:
+        target.set_exception(ex)
+
+
+class DbExecutor:
+    """DB処理をUIのイベントハンドラから切り離して実行する
+
+    書き込みは専用スレッド1本で直列に、読み取りはスレッドプールで並行に実行する。
+    書き込みに使うパス情報(ファイルシステムへのアクセス)は別のスレッドプールで取得する。
+    各メソッドはFutureを返す
+    """
+
+    def __init__(self, file_manager):
+        self.file_manager = file_manager
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-writer")
+        self._readers = ThreadPoolExecutor(
+            max_workers=file_manager.reader_count, thread_name_prefix="db-reader"
+        )
+        # 応答のないボリュームで読み取り・書き込みのスレッドを塞がないため分ける
+        self._stat = ThreadPoolExecutor(
+            max_workers=STAT_WORKERS, thread_name_prefix="db-stat"
+        )
+
+    def submit_read(self, fn, *args) -> Future:
+        """読み取り用スレッドで関数を実行(セッションは関数側で開く)"""
+        return self._readers.submit(fn, *args)
+
+    def read(self, func, *args) -> Future:
+        """読み取りセッションのカーソルを渡して実行"""
+
+        def run():
+            with self.file_manager.read_session() as cursor:
+                return func(cursor, *args)
+
+        return self._readers.submit(run)
+
+    def write(self, func, *args) -> Future:
+        """書き込みセッション(1トランザクション)のカーソルを渡して実行"""
+
+        def run():
+            with self.file_manager.write_session() as cursor:
+                return func(cursor, *args)
+
+        return self._writer.submit(run)
+
+    def write_with_info(self, func, filepath: str, *args) -> Future:
+        """パス情報を取得してから書き込みセッションで実行
+
+        パス情報(path_info.stat_pathの戻り値)は最後の引数として渡す。
+        取得は呼び出し元・書き込みスレッドでは行わないため、すぐに戻る
+        """
+        result = Future()
+
+        def stated(f: Future):
+            try:
+                write = self.write(func, *args, f.result())
+            except Exception as ex:
+                result.set_exception(ex)
+                return
+            write.add_done_callback(lambda w: _copy_result(w, result))
+
+        self._stat.submit(stat_path, filepath).add_done_callback(stated)
+        return result
+
+    def stat(self, filepath: str) -> Future:
+        """パス情報を取得
+
+        取得は呼び出し元のスレッドでは行わないため、応答のないパスでもすぐに戻る
+
+        Returns:
+            Future: パス情報(path_info.stat_pathの戻り値)
+        """
+        return self._stat.submit(stat_path, filepath)
+
+    def shutdown(self, wait: bool = True):
+        self._writer.shutdown(wait=wait)
+        self._readers.shutdown(wait=wait)
+        self._stat.shutdown(wait=wait)
+
+    # ============================================
+    # 読み取り
+    # ============================================
+    def search_files(
+        self, query: FileQuery, after: tuple = None, limit: int = PAGE_SIZE
+    ) -> Future:
+        """ファイル一覧を1ページ分取得
+
+        Returns:
+            Future: (行のリスト, 次ページのカーソル)
+        """
+        return self.read(
+            fetch_file_page, query, after, limit, self.file_manager.fts_enabled
+        )
+
+    def list_tags(self) -> Future:
+        """タグ一覧 (id, tag_name)"""
+        return self.read(util_query.select_tags)
+
+    def list_tag_counts(self) -> Future:
+        """タグごとのファイル数 (id, tag_name, count)"""
+        return self.read(util_query.select_tag_counts)
+
+    def link_summary(self) -> Future:
+        """リンク状態ごとの件数
+
+        Returns:
+            Future: ({リンク状態(未確認はNone): 件数}, 最も古い確認日時)
+        """
+        return self.read(util_query.select_link_summary)
+
+    def table_stats(self) -> Future:
+        """テーブルごとのレコード数 (テーブル名, レコード数)"""
+        return self.read(util_query.select_table_stats)
+
+    def table_columns(self, table_name: str) -> Future:
+        return self.read(util_query.select_table_columns, table_name)
+
+    def record_page(
+        self,
+        table_name: str,
+        filters: dict = None,
+        after=None,
+        start_key=None,
+        limit: int = RECORD_PAGE_SIZE,
+    ) -> Future:
+        """テーブルのレコードを1ページ分取得
+
+        Returns:
+            Future: (カラム名のリスト, 行のリスト, 次ページのキー)
+        """
+        return self.read(
+            fetch_record_page, table_name, filters, after, start_key, limit
+        )
+
+    # ============================================
+    # 書き込み
+    # ============================================
+    def register_file(
+        self, filename: str, filepath: str, memo: str, tags: list, info: tuple = None
+    ):
+        """ファイル登録
+
+        パス情報(statの結果)を渡した場合はパス情報を取得し直さない
+
+        Returns:
+            Future: (ファイルID, 新規登録の場合True, 登録済みの(名称, パス))
+        """
+
+        def run(cursor, info):
+            file_id, created = util_query.register_file(
+                cursor, filename, filepath, memo, info
+            )
+            if created:
+                util_query.link_tags(cursor, file_id, tags)
+                return file_id, True, None
+            cursor.execute(
+                "SELECT filename, filepath FROM files WHERE id = ?", (file_id,)
+            )
+            return file_id, False, cursor.fetchone()
+
+        if info is not None:
+            return self.write(run, info)
+        return self.write_with_info(run, filepath)
+
+    def update_file(
+        self, file_id: int, filename: str, filepath: str, memo: str, tags: list
+    ) -> Future:
+        """ファイル情報とタグの更新
+
+        変更後のパスが登録済みの場合はsqlite3.IntegrityErrorになる
+        """
+        return self.write_with_info(
+            util_query.update_file, filepath, file_id, filename, filepath, memo, tags
+        )
+
+    def delete_file(self, file_id: int) -> Future:
+        return self.write(util_query.delete_file, file_id)
+
+    def preview_path_prefix(self, old_prefix: str, new_prefix: str) -> Future:
+        """パスの前方一致置換のプレビュー
+
+        Returns:
+            Future: (対象件数, 競合件数, (変更前, 変更後)の例, 競合するパスの例)
+        """
+        return self.read(util_query.preview_path_prefix, old_prefix, new_prefix)
+
+    def rewrite_path_prefix(self, old_prefix: str, new_prefix: str) -> Future:
+        """パスの前方一致置換(1トランザクション)
+
+        Returns:
+            Future: 更新した件数
+        """
+        return self.write(util_query.rewrite_path_prefix, old_prefix, new_prefix)
+
+    def rebuild_counters(self) -> Future:
+        """レコード数・タグごとのファイル数・並び替え用のタグ列の再集計
+
+        ファイル・子フォルダのないフォルダは削除してから集計する
+
+        Returns:
+            Future: 集計結果と異なっていた件数と削除したフォルダの数の合計
+        """
+
+        def run(cursor):
+            deleted = util_query.delete_orphan_dirs(cursor)
+            return (
+                deleted
+                + util_query.rebuild_counters(cursor)
+                + util_query.rebuild_tags_keys(cursor)
+            )
+
+        return self.write(run)
+
+    def delete_tag(self, tag: str) -> Future:
+        """タグ削除
+
+        Returns:
+            Future: 削除した場合True
+        """
+        return self.write(util_query.delete_tag, tag)
@@ -1,109 +1,637 @@
-import sqlite3
-
-NOW_VERSION = 1
-
-
-class FileManager:
-    def __init__(self):
-        self.db_path = "files.db"
-        self.create_tables()
-
-    def create_tables(self):
-        conn = self.create_connection()
-        with conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                CREATE TABLE IF NOT EXISTS version (
-                    version INTEGER,
-                    PRIMARY KEY (version)
-                )
-            """
-            )
-            self.query_create_files(cursor)
-            self.query_create_tag_mng(cursor)
-            self.query_create_file_tags(cursor)
-            cursor.execute(
-                "CREATE INDEX IF NOT EXISTS idx_tags_join_file_id ON file_tags(file_id)"
-            )
-            cursor.execute(
-                "CREATE INDEX IF NOT EXISTS idx_tags_join_tag_id ON file_tags(tag_id)"
-            )
-            self.version()
-
-    def create_connection(self):
-        return sqlite3.connect(self.db_path)
-
-    def version(self):
-        conn = self.create_connection()
-        version_no = 0
-        with conn:
-            cursor = conn.cursor()
-            query = """
-                SELECT * FROM version
-            """
-            cursor.execute(
-                query,
-            )
-            version = cursor.fetchone()
-            version_no = version[0] if version else 0
-            # バージョン更新
-            if version_no != NOW_VERSION:
-                cursor.execute("DELETE FROM version ")
-                cursor.execute(
-                    "INSERT INTO version (version) VALUES (?)",
-                    (NOW_VERSION,),
-                )
-            # バージョンごとの対応
-            if version_no == 0:
-                cursor.execute("CREATE TABLE files_BK AS SELECT * FROM files")
-                cursor.execute("DROP TABLE files")
-                self.query_create_files(cursor)
-                cursor.execute(
-                    """
-                        INSERT INTO files 
-                        SELECT id, filename, filepath ,"", created_at FROM files_BK
-                    """
-                )
-                cursor.execute("DROP TABLE files_BK")
-
-    # ============================================
-    def query_create_files(self, conn: sqlite3.Cursor) -> str:
-        conn.execute(
-            """
-                CREATE TABLE IF NOT EXISTS files (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    filename TEXT NOT NULL,
-                    filepath TEXT NOT NULL,
-                    memo TEXT,
-                    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime'))
-                )
-            """
-        )
-
-    def query_create_tag_mng(self, conn: sqlite3.Cursor) -> str:
-        conn.execute(
-            """
-                CREATE TABLE IF NOT EXISTS tag_mng (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    tag_name TEXT,
-                    created_at TIMESTAMP DEFAULT  (datetime('now', 'localtime')),
-                    updated_at TIMESTAMP DEFAULT  (datetime('now', 'localtime'))
-                )
-            """
-        )
-
-    def query_create_file_tags(self, conn: sqlite3.Cursor) -> str:
-        conn.execute(
-            """
-                CREATE TABLE IF NOT EXISTS file_tags (
-                    file_id INTEGER,
-                    tag_id INTEGER,
-                    number_of INTEGER,
-                    created_at TIMESTAMP DEFAULT  (datetime('now', 'localtime')),
-                    PRIMARY KEY (file_id, tag_id),
-                    FOREIGN KEY (file_id) REFERENCES files(id),
-                    FOREIGN KEY (tag_id) REFERENCES tag_mng(id)
-                )
-            """
-        )
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from database.migration import Migrator
+from util.util_query import COUNTED_TABLES, tags_key_sql
+
+# 接続設定
+# 読み取り用コネクション数
+READER_COUNT = 4
+# ロック待ち時間(ミリ秒)
+BUSY_TIMEOUT_MS = 5000
+# ページキャッシュサイズ(KiB)
+CACHE_SIZE_KB = 64 * 1024
+# コネクションごとのプリペアドステートメントキャッシュ数
+STATEMENT_CACHE_SIZE = 256
+
+
+class FileManager:
+    def __init__(
+        self,
+        db_path: str = "files.db",
+        reader_count: int = READER_COUNT,
+        migrate: bool = True,
+    ):
+        """
+        Args:
+            db_path (str): DBファイルのパス
+            reader_count (int): 読み取り用コネクション数
+            migrate (bool): Falseの場合は移行しない(進捗を表示して移行する場合はmigrateを呼ぶ)
+        """
+        self.db_path = db_path
+        self.reader_count = max(1, reader_count)
+        # 書き込み用コネクション(1本)
+        self._writer = None
+        self._writer_lock = threading.RLock()
+        self._write_depth = 0
+        # 読み取り用コネクションプール
+        self._readers = queue.LifoQueue()
+        self._reader_total = 0
+        self._reader_lock = threading.Lock()
+        self._all_connections = []
+        # FTS5(trigram)が利用可能か
+        self.fts_enabled = False
+        self._executor = None
+        # 書き込みをコミットするたびに増える番号(画面の再読み込み要否の判定用)
+        self.generation = 0
+        if migrate:
+            self.migrate()
+
+    def create_schema(self, cursor: sqlite3.Cursor) -> bool:
+        """最新のテーブル・インデックスを作成(作成済みのものはそのまま)
+
+        Returns:
+            bool: FTS5(trigram)が利用可能な場合True
+        """
+        self.query_create_tag_mng(cursor)
+        self.query_create_file_tags(cursor)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_tags_join_file_id ON file_tags(file_id)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_tags_join_tag_id ON file_tags(tag_id)"
+        )
+        cursor.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_tag_mng_tag_name ON tag_mng(tag_name)"
+        )
+        # タグ条件式のタグ名の検索(大文字小文字を区別しない、tag_queryと同じ式)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_tag_mng_tag_name_lower "
+            "ON tag_mng(LOWER(tag_name))"
+        )
+        self.query_create_dirs(cursor)
+        self.query_create_file_entries(cursor)
+        self.query_create_files_view(cursor)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_file_entries_filename "
+            "ON file_entries(filename)"
+        )
+        self.query_create_sort_indexes(cursor)
+        # 確認日時の古い順に再確認するため
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_file_entries_checked_at "
+            "ON file_entries(checked_at)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_file_entries_link_status "
+            "ON file_entries(link_status)"
+        )
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_file_entries_fingerprint "
+            "ON file_entries(fp_ino, fp_dev)"
+        )
+        self.query_create_counters(cursor)
+        self.query_create_tags_key(cursor)
+        return self.query_create_files_fts(cursor)
+
+    def query_create_sort_indexes(self, conn: sqlite3.Cursor):
+        """メモ・作成日時・サイズ・更新日時の並び替え(file_searchの並び替え式と同じ式)"""
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_file_entries_memo "
+            "ON file_entries(IFNULL(memo, ''))"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_file_entries_created_at "
+            "ON file_entries(IFNULL(created_at, ''))"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_file_entries_size "
+            "ON file_entries(IFNULL(size, -1))"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_file_entries_mtime "
+            "ON file_entries(IFNULL(mtime, 0))"
+        )
+
+    def pending_migrations(self) -> list:
+        """未適用の移行(database.migration.Migration)のリスト"""
+        return Migrator(self).pending()
+
+    def migrate(self, on_progress=None) -> int:
+        """未適用の移行を適用
+
+        移行済みの場合は適用済みの番号を確認するだけで終わる。
+        件数の多い移行は分割してコミットするため、中断しても次回続きから再開する
+
+        Args:
+            on_progress (function): (説明, 完了件数, 全体の件数)を受け取る処理
+
+        Returns:
+            int: 適用した移行の数
+        """
+        count = Migrator(self).run(on_progress)
+        with self.read_session() as cursor:
+            cursor.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'files_fts'"
+            )
+            self.fts_enabled = cursor.fetchone() is not None
+        if not self.fts_enabled:
+            # FTS5に対応したSQLiteで開き直した場合に作成
+            with self.write_session() as cursor:
+                self.fts_enabled = self.query_create_files_fts(cursor)
+        return count
+
+    def create_connection(self) -> sqlite3.Connection:
+        """設定済みの新しいコネクションを作成
+
+        プール外で使う場合は呼び出し側でcloseすること
+        """
+        conn = sqlite3.connect(
+            self.db_path,
+            timeout=BUSY_TIMEOUT_MS / 1000,
+            check_same_thread=False,
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+        conn.execute("PRAGMA synchronous = NORMAL")
+        conn.execute(f"PRAGMA cache_size = -{CACHE_SIZE_KB}")
+        conn.execute("PRAGMA temp_store = MEMORY")
+        return conn
+
+    # ============================================
+    # コネクションプール
+    # ============================================
+    def _get_writer(self) -> sqlite3.Connection:
+        if self._writer is None:
+            conn = self.create_connection()
+            conn.isolation_level = None
+            conn.execute("PRAGMA journal_mode = WAL")
+            self._writer = conn
+            self._all_connections.append(conn)
+        return self._writer
+
+    def _acquire_reader(self) -> sqlite3.Connection:
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            pass
+        with self._reader_lock:
+            if self._reader_total < self.reader_count:
+                self._reader_total += 1
+                conn = self.create_connection()
+                conn.isolation_level = None
+                conn.execute("PRAGMA query_only = ON")
+                self._all_connections.append(conn)
+                return conn
+        # 上限に達している場合は返却を待つ
+        return self._readers.get()
+
+    @contextmanager
+    def read_session(self):
+        """読み取り用セッション
+
+        セッション内のSELECTは同一スナップショットを参照する
+
+        Yields:
+            sqlite3.Cursor: 読み取り用カーソル
+        """
+        conn = self._acquire_reader()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            yield cursor
+        finally:
+            cursor.close()
+            if conn.in_transaction:
+                conn.rollback()
+            self._readers.put(conn)
+
+    @contextmanager
+    def write_session(self):
+        """書き込み用セッション
+
+        正常終了でコミット、例外発生時はロールバックする。
+        同一スレッド内で入れ子にした場合は外側のトランザクションに参加する
+
+        Yields:
+            sqlite3.Cursor: 書き込み用カーソル
+        """
+        with self._writer_lock:
+            conn = self._get_writer()
+            cursor = conn.cursor()
+            outermost = self._write_depth == 0
+            self._write_depth += 1
+            changes = conn.total_changes
+            try:
+                if outermost:
+                    cursor.execute("BEGIN IMMEDIATE")
+                yield cursor
+            except BaseException:
+                if outermost and conn.in_transaction:
+                    conn.rollback()
+                raise
+            else:
+                if outermost:
+                    conn.commit()
+                    if conn.total_changes != changes:
+                        self.generation += 1
+            finally:
+                self._write_depth -= 1
+                cursor.close()
+
+    @property
+    def executor(self):
+        """バックグラウンドでDB処理を実行するDbExecutor"""
+        if self._executor is None:
+            from database.db_executor import DbExecutor
+
+            self._executor = DbExecutor(self)
+        return self._executor
+
+    def close(self):
+        """プール内の全コネクションを閉じる"""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+        with self._writer_lock, self._reader_lock:
+            for conn in self._all_connections:
+                conn.close()
+            self._all_connections = []
+            self._writer = None
+            self._readers = queue.LifoQueue()
+            self._reader_total = 0
+
+    # ============================================
+    def query_create_dirs(self, conn: sqlite3.Cursor) -> str:
+        """フォルダ(パスは末尾の区切り文字を含む)"""
+        conn.execute(
+            """
+                CREATE TABLE IF NOT EXISTS dirs (
+                    id INTEGER PRIMARY KEY,
+                    parent_id INTEGER,
+                    name TEXT NOT NULL,
+                    path TEXT NOT NULL,
+                    path_key TEXT NOT NULL,
+                    moved_at REAL
+                )
+            """
+        )
+        # 正規化パスでの検索・配下の範囲検索
+        conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_dirs_path_key ON dirs(path_key)"
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_dirs_parent_id ON dirs(parent_id)"
+        )
+        # 移動後に配下を再確認するフォルダ(印のあるフォルダのみ)
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_dirs_moved_at ON dirs(moved_at) "
+            "WHERE moved_at IS NOT NULL"
+        )
+
+    def query_create_file_entries(self, conn: sqlite3.Cursor) -> str:
+        """ファイル(パスはフォルダID + ファイル名)"""
+        conn.execute(
+            """
+                CREATE TABLE IF NOT EXISTS file_entries (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    dir_id INTEGER NOT NULL,
+                    basename TEXT NOT NULL,
+                    name_key TEXT NOT NULL,
+                    filename TEXT NOT NULL,
+                    memo TEXT,
+                    created_at TIMESTAMP DEFAULT (datetime('now', 'localtime')),
+                    kind TEXT,
+                    size INTEGER,
+                    mtime REAL,
+                    exists_flag INTEGER,
+                    checked_at REAL,
+                    link_status TEXT,
+                    nearest_ancestor TEXT,
+                    fp_dev INTEGER,
+                    fp_ino INTEGER,
+                    tags_key TEXT NOT NULL DEFAULT '',
+                    FOREIGN KEY (dir_id) REFERENCES dirs(id)
+                )
+            """
+        )
+        # 同じパスの重複登録を防ぐ(フォルダ内のファイル一覧にも使用)
+        conn.execute(
+            """
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_file_entries_location
+                ON file_entries(dir_id, name_key)
+            """
+        )
+
+    def query_create_files_view(self, conn: sqlite3.Cursor) -> str:
+        """フォルダのパスとファイル名を結合したパスで参照するビュー(読み取り専用)"""
+        conn.execute(
+            """
+                CREATE VIEW IF NOT EXISTS files AS
+                SELECT
+                    f.id,
+                    f.filename,
+                    d.path || f.basename AS filepath,
+                    f.memo,
+                    f.created_at,
+                    f.kind,
+                    f.size,
+                    f.mtime,
+                    f.exists_flag,
+                    f.checked_at,
+                    f.link_status,
+                    f.nearest_ancestor,
+                    f.fp_dev,
+                    f.fp_ino,
+                    f.dir_id,
+                    f.basename,
+                    f.name_key,
+                    f.tags_key,
+                    d.path_key AS dir_key
+                FROM file_entries f
+                JOIN dirs d ON d.id = f.dir_id
+            """
+        )
+
+    def query_create_tag_mng(self, conn: sqlite3.Cursor) -> str:
+        conn.execute(
+            """
+                CREATE TABLE IF NOT EXISTS tag_mng (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    tag_name TEXT,
+                    file_count INTEGER NOT NULL DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT  (datetime('now', 'localtime')),
+                    updated_at TIMESTAMP DEFAULT  (datetime('now', 'localtime'))
+                )
+            """
+        )
+
+    def query_create_file_tags(self, conn: sqlite3.Cursor) -> str:
+        conn.execute(
+            """
+                CREATE TABLE IF NOT EXISTS file_tags (
+                    file_id INTEGER,
+                    tag_id INTEGER,
+                    number_of INTEGER,
+                    created_at TIMESTAMP DEFAULT  (datetime('now', 'localtime')),
+                    PRIMARY KEY (file_id, tag_id),
+                    FOREIGN KEY (file_id) REFERENCES file_entries(id),
+                    FOREIGN KEY (tag_id) REFERENCES tag_mng(id)
+                )
+            """
+        )
+
+    def query_create_counters(self, conn: sqlite3.Cursor):
+        """レコード数(table_stats)とタグごとのファイル数(tag_mng.file_count)を
+        トリガーで更新する
+
+        件数はutil_query.rebuild_countersで集計し直せる
+        """
+        conn.execute(
+            """
+                CREATE TABLE IF NOT EXISTS table_stats (
+                    name TEXT PRIMARY KEY,
+                    row_count INTEGER NOT NULL DEFAULT 0
+                )
+            """
+        )
+        for table in COUNTED_TABLES:
+            conn.execute(
+                f"""
+                    INSERT OR IGNORE INTO table_stats (name, row_count)
+                    SELECT '{table}', COUNT(*) FROM {table}
+                """
+            )
+            conn.execute(
+                f"""
+                    CREATE TRIGGER IF NOT EXISTS {table}_count_insert
+                    AFTER INSERT ON {table}
+                    BEGIN
+                        UPDATE table_stats SET row_count = row_count + 1
+                        WHERE name = '{table}';
+                    END
+                """
+            )
+            conn.execute(
+                f"""
+                    CREATE TRIGGER IF NOT EXISTS {table}_count_delete
+                    AFTER DELETE ON {table}
+                    BEGIN
+                        UPDATE table_stats SET row_count = row_count - 1
+                        WHERE name = '{table}';
+                    END
+                """
+            )
+        conn.execute(
+            """
+                CREATE TRIGGER IF NOT EXISTS file_tags_tag_count_insert
+                AFTER INSERT ON file_tags
+                BEGIN
+                    UPDATE tag_mng SET file_count = file_count + 1
+                    WHERE id = new.tag_id;
+                END
+            """
+        )
+        conn.execute(
+            """
+                CREATE TRIGGER IF NOT EXISTS file_tags_tag_count_delete
+                AFTER DELETE ON file_tags
+                BEGIN
+                    UPDATE tag_mng SET file_count = file_count - 1
+                    WHERE id = old.tag_id;
+                END
+            """
+        )
+        conn.execute(
+            """
+                CREATE TRIGGER IF NOT EXISTS file_tags_tag_count_update
+                AFTER UPDATE OF tag_id ON file_tags
+                BEGIN
+                    UPDATE tag_mng SET file_count = file_count - 1
+                    WHERE id = old.tag_id;
+                    UPDATE tag_mng SET file_count = file_count + 1
+                    WHERE id = new.tag_id;
+                END
+            """
+        )
+
+    def query_create_tags_key(self, conn: sqlite3.Cursor):
+        """タグの並び替え用の列(file_entries.tags_key)をトリガーで更新する
+
+        紐づけの追加・削除・変更とタグ名の変更・削除で、対象のファイルの値を
+        util_query.tags_key_sqlで作り直す。タグの削除では連結済みの値からタグ名を
+        取り除き、続く紐づけの削除では作り直さない。
+        値はutil_query.rebuild_tags_keysで作り直せる
+        """
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_file_entries_tags_key "
+            "ON file_entries(tags_key)"
+        )
+        conn.execute(
+            f"""
+                CREATE TRIGGER IF NOT EXISTS file_tags_tags_key_insert
+                AFTER INSERT ON file_tags
+                BEGIN
+                    UPDATE file_entries SET tags_key = {tags_key_sql("new.file_id")}
+                    WHERE id = new.file_id;
+                END
+            """
+        )
+        conn.execute(
+            f"""
+                CREATE TRIGGER IF NOT EXISTS file_tags_tags_key_delete
+                AFTER DELETE ON file_tags
+                -- 削除済みのタグの紐づけはタグ名に含まれないため更新しない
+                WHEN EXISTS (SELECT 1 FROM tag_mng WHERE id = old.tag_id)
+                BEGIN
+                    UPDATE file_entries SET tags_key = {tags_key_sql("old.file_id")}
+                    WHERE id = old.file_id;
+                END
+            """
+        )
+        conn.execute(
+            f"""
+                CREATE TRIGGER IF NOT EXISTS file_tags_tags_key_update
+                AFTER UPDATE OF file_id, tag_id, number_of ON file_tags
+                BEGIN
+                    UPDATE file_entries SET tags_key = {tags_key_sql("old.file_id")}
+                    WHERE id = old.file_id;
+                    UPDATE file_entries SET tags_key = {tags_key_sql("new.file_id")}
+                    WHERE id = new.file_id;
+                END
+            """
+        )
+        conn.execute(
+            f"""
+                CREATE TRIGGER IF NOT EXISTS tag_mng_tags_key_update
+                AFTER UPDATE OF tag_name ON tag_mng
+                BEGIN
+                    UPDATE file_entries SET tags_key = {tags_key_sql("file_entries.id")}
+                    WHERE id IN (SELECT file_id FROM file_tags WHERE tag_id = new.id);
+                END
+            """
+        )
+        conn.execute(
+            f"""
+                CREATE TRIGGER IF NOT EXISTS tag_mng_tags_key_delete
+                AFTER DELETE ON tag_mng
+                BEGIN
+                    -- タグ名はカンマを含まないため、連結済みの値から取り除く
+                    UPDATE file_entries
+                    SET tags_key = TRIM(
+                        REPLACE(',' || tags_key || ',', ',' || old.tag_name || ',', ','),
+                        ','
+                    )
+                    WHERE id IN (SELECT file_id FROM file_tags WHERE tag_id = old.id);
+                END
+            """
+        )
+
+    def query_create_files_fts(self, conn: sqlite3.Cursor) -> bool:
+        """全文検索用のFTS5テーブルと同期トリガーを作成
+
+        ファイル(名称・ファイル名・メモ)とフォルダのパスを別々に索引するため、
+        フォルダの移動でファイルの索引は更新されない
+
+        Returns:
+            bool: FTS5(trigram)が利用可能な場合True
+        """
+        conn.execute(
+            """
+                SELECT name FROM sqlite_master
+                WHERE type = 'table' AND name IN ('files_fts', 'dirs_fts')
+            """
+        )
+        exists = [row[0] for row in conn.fetchall()]
+        try:
+            conn.execute(
+                """
+                    CREATE VIRTUAL TABLE IF NOT EXISTS files_fts USING fts5(
+                        filename,
+                        basename,
+                        memo,
+                        content = 'file_entries',
+                        content_rowid = 'id',
+                        tokenize = 'trigram'
+                    )
+                """
+            )
+            conn.execute(
+                """
+                    CREATE VIRTUAL TABLE IF NOT EXISTS dirs_fts USING fts5(
+                        path,
+                        content = 'dirs',
+                        content_rowid = 'id',
+                        tokenize = 'trigram'
+                    )
+                """
+            )
+        except sqlite3.OperationalError:
+            # FTS5またはtrigramトークナイザ未対応のSQLite
+            return False
+        conn.execute(
+            """
+                CREATE TRIGGER IF NOT EXISTS files_fts_insert
+                AFTER INSERT ON file_entries
+                BEGIN
+                    INSERT INTO files_fts (rowid, filename, basename, memo)
+                    VALUES (new.id, new.filename, new.basename, new.memo);
+                END
+            """
+        )
+        conn.execute(
+            """
+                CREATE TRIGGER IF NOT EXISTS files_fts_delete
+                AFTER DELETE ON file_entries
+                BEGIN
+                    INSERT INTO files_fts (files_fts, rowid, filename, basename, memo)
+                    VALUES ('delete', old.id, old.filename, old.basename, old.memo);
+                END
+            """
+        )
+        conn.execute(
+            """
+                CREATE TRIGGER IF NOT EXISTS files_fts_update
+                AFTER UPDATE OF filename, basename, memo ON file_entries
+                BEGIN
+                    INSERT INTO files_fts (files_fts, rowid, filename, basename, memo)
+                    VALUES ('delete', old.id, old.filename, old.basename, old.memo);
+                    INSERT INTO files_fts (rowid, filename, basename, memo)
+                    VALUES (new.id, new.filename, new.basename, new.memo);
+                END
+            """
+        )
+        conn.execute(
+            """
+                CREATE TRIGGER IF NOT EXISTS dirs_fts_insert AFTER INSERT ON dirs
+                BEGIN
+                    INSERT INTO dirs_fts (rowid, path) VALUES (new.id, new.path);
+                END
+            """
+        )
+        conn.execute(
+            """
+                CREATE TRIGGER IF NOT EXISTS dirs_fts_delete AFTER DELETE ON dirs
+                BEGIN
+                    INSERT INTO dirs_fts (dirs_fts, rowid, path)
+                    VALUES ('delete', old.id, old.path);
+                END
+            """
+        )
+        conn.execute(
+            """
+                CREATE TRIGGER IF NOT EXISTS dirs_fts_update AFTER UPDATE OF path ON dirs
+                BEGIN
+                    INSERT INTO dirs_fts (dirs_fts, rowid, path)
+                    VALUES ('delete', old.id, old.path);
+                    INSERT INTO dirs_fts (rowid, path) VALUES (new.id, new.path);
+                END
+            """
+        )
+        # 既存レコードからインデックスを構築
+        for table in ("files_fts", "dirs_fts"):
+            if table not in exists:
+                conn.execute(f"INSERT INTO {table} ({table}) VALUES ('rebuild')")
+        return True
@@ -0,0 +1,419 @@
+import sqlite3
+from database.tag_query import tag_condition
+from util.util_conversion import location_key
+
+# 検索対象
+TARGET_NAME = "filename"
+TARGET_PATH = "filepath"
+TARGET_MEMO = "memo"
+SEARCH_TARGETS = {
+    TARGET_NAME: "名称",
+    TARGET_PATH: "パス",
+    TARGET_MEMO: "メモ",
+}
+
+# 検索対象 -> files_ftsのカラム(パスのフォルダ部分はdirs_ftsで検索する)
+FTS_COLUMNS = {
+    TARGET_NAME: "filename",
+    TARGET_PATH: "basename",
+    TARGET_MEMO: "memo",
+}
+
+# trigramトークナイザで検索できる最小文字数
+MIN_FTS_LENGTH = 3
+
+
+def fts_expression(text: str, targets: tuple) -> str:
+    """FTS5のMATCH式を作成
+
+    入力文字列は1つのフレーズとして扱い、演算子として解釈させない
+
+    Args:
+        text (str): 検索文字列
+        targets (tuple): 検索対象カラム
+
+    Returns:
+        str: MATCH式
+    """
+    phrase = '"' + text.replace('"', '""') + '"'
+    return "{" + " ".join(targets) + "} : " + phrase
+
+
+def escape_like(text: str) -> str:
+    """LIKE検索用にワイルドカードをエスケープ"""
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+def match_condition(
+    text: str, targets: tuple = (TARGET_NAME,), fts: bool = True, alias: str = "f"
+) -> tuple:
+    """filesの絞り込み条件を作成
+
+    FTS5が使えない場合やtrigramで検索できない短い文字列はLIKEで検索する。
+    パスはフォルダ部分(dirs_fts)とファイル名部分(files_fts)をそれぞれ検索し、
+    区切り文字を含む文字列は両方にまたがる場合があるためLIKEでも検索する
+
+    Args:
+        text (str): 検索文字列
+        targets (tuple): 検索対象カラム
+        fts (bool): FTS5を使用するか
+        alias (str): filesテーブルの別名
+
+    Returns:
+        tuple: (WHERE句に使う条件, パラメータ)
+    """
+    targets = tuple(t for t in targets if t in SEARCH_TARGETS) or (TARGET_NAME,)
+    pattern = f"%{escape_like(text)}%"
+    if fts and len(text) >= MIN_FTS_LENGTH:
+        conditions = [
+            f"{alias}.id IN (SELECT rowid FROM files_fts WHERE files_fts MATCH ?)"
+        ]
+        params = [fts_expression(text, tuple(FTS_COLUMNS[t] for t in targets))]
+        if TARGET_PATH in targets:
+            conditions.append(
+                f"{alias}.dir_id IN (SELECT rowid FROM dirs_fts WHERE dirs_fts MATCH ?)"
+            )
+            params.append(fts_expression(text, ("path",)))
+            if "/" in text or "\\" in text:
+                conditions.append(f"{alias}.filepath LIKE ? ESCAPE '\\'")
+                params.append(pattern)
+        return "(" + " OR ".join(conditions) + ")", params
+    return (
+        "("
+        + " OR ".join(f"{alias}.{t} LIKE ? ESCAPE '\\'" for t in targets)
+        + ")",
+        [pattern] * len(targets),
+    )
+
+
+def search_file_ids(
+    cursor: sqlite3.Cursor,
+    text: str,
+    targets: tuple = (TARGET_NAME,),
+    limit: int = -1,
+    fts: bool = True,
+) -> list:
+    """文字列に一致するファイルIDを関連度順で取得
+
+    Args:
+        cursor (sqlite3.Cursor): カーソル
+        text (str): 検索文字列
+        targets (tuple): 検索対象カラム
+        limit (int): 最大件数(-1で無制限)
+        fts (bool): FTS5を使用するか
+
+    Returns:
+        list: ファイルIDのリスト
+    """
+    if not text:
+        return []
+    targets = tuple(t for t in targets if t in SEARCH_TARGETS) or (TARGET_NAME,)
+    if fts and len(text) >= MIN_FTS_LENGTH and TARGET_PATH not in targets:
+        cursor.execute(
+            """
+            SELECT rowid FROM files_fts
+            WHERE files_fts MATCH ?
+            ORDER BY rank
+            LIMIT ?
+            """,
+            (fts_expression(text, tuple(FTS_COLUMNS[t] for t in targets)), limit),
+        )
+    else:
+        # パスはフォルダとファイル名に分かれるため関連度順にできない
+        condition, params = match_condition(text, targets, fts=fts)
+        cursor.execute(
+            f"""
+            SELECT f.id FROM files f
+            WHERE {condition}
+            ORDER BY length(f.filename), f.id
+            LIMIT ?
+            """,
+            (*params, limit),
+        )
+    return [row[0] for row in cursor.fetchall()]
+
+
+# タグは登録順(number_of)で連結する
+TAGS_COLUMN = """
+    (
+        SELECT GROUP_CONCAT(tag_name)
+        FROM (
+            SELECT t.tag_name
+            FROM file_tags j
+            JOIN tag_mng t ON j.tag_id = t.id
+            WHERE j.file_id = f.id
+            ORDER BY j.number_of
+        )
+    )
+"""
+
+# 1ページの件数
+PAGE_SIZE = 100
+
+# 並び替え項目 -> 並び替えに使う式(複数の式の場合はタプル)
+SORT_NAME = "filename"
+SORT_TAGS = "tags"
+SORT_PATH = "filepath"
+SORT_MEMO = "memo"
+SORT_CREATED = "created_at"
+SORT_SIZE = "size"
+SORT_MTIME = "mtime"
+SORT_EXPRESSIONS = {
+    SORT_NAME: "f.filename",
+    # タグはトリガーで更新する連結済みの列(インデックスあり)で並べる
+    SORT_TAGS: "f.tags_key",
+    # パスは正規化したフォルダのパス・ファイル名の順(それぞれ一意インデックス)で並べる
+    SORT_PATH: ("f.dir_key", "f.name_key"),
+    # メモ・作成日時・サイズ・更新日時は式インデックスと同じ式にすること。
+    # サイズ・更新日時の未確認(NULL)は先頭に並べる
+    SORT_MEMO: "IFNULL(f.memo, '')",
+    SORT_CREATED: "IFNULL(f.created_at, '')",
+    SORT_SIZE: "IFNULL(f.size, -1)",
+    SORT_MTIME: "IFNULL(f.mtime, 0)",
+}
+
+# 未確認のリンク状態を絞り込む場合の指定値
+LINK_UNCHECKED = "unchecked"
+
+
+class FileQuery:
+    """ファイル一覧の検索条件"""
+
+    def __init__(
+        self,
+        text: str = "",
+        targets: tuple = (TARGET_NAME,),
+        tag_expression: str = "",
+        sort_key: str = SORT_NAME,
+        ascending: bool = True,
+        size_range: tuple = (None, None),
+        mtime_range: tuple = (None, None),
+        link_status: str = "",
+    ):
+        """
+        Args:
+            size_range (tuple): サイズの(下限, 上限未満)。Noneは指定なし
+            mtime_range (tuple): 更新日時の(下限, 上限未満)。Noneは指定なし
+            link_status (str): リンク状態(空文字は指定なし、LINK_UNCHECKEDは未確認)
+        """
+        self.text = text
+        self.targets = targets
+        self.tag_expression = tag_expression.strip()
+        self.sort_key = sort_key if sort_key in SORT_EXPRESSIONS else SORT_NAME
+        self.ascending = ascending
+        self.size_range = size_range
+        self.mtime_range = mtime_range
+        self.link_status = link_status
+
+    def sort_expressions(self) -> tuple:
+        """並び替えの式(次ページのカーソルはこの式の値とIDの組)"""
+        expressions = SORT_EXPRESSIONS[self.sort_key]
+        return expressions if isinstance(expressions, tuple) else (expressions,)
+
+    def conditions(self, cursor: sqlite3.Cursor, fts: bool = True) -> tuple:
+        """WHERE句の条件を作成
+
+        Raises:
+            TagQuerySyntaxError: タグ条件式が不正な場合
+
+        Returns:
+            tuple: (条件のリスト, パラメータ)
+        """
+        conditions = []
+        params = []
+        if self.text:
+            condition, condition_params = match_condition(
+                self.text, self.targets, fts=fts
+            )
+            conditions.append(condition)
+            params.extend(condition_params)
+        if self.tag_expression:
+            condition, condition_params = tag_condition(cursor, self.tag_expression)
+            conditions.append(condition)
+            params.extend(condition_params)
+        for column, (lower, upper) in (
+            ("f.size", self.size_range),
+            ("f.mtime", self.mtime_range),
+        ):
+            if lower is not None:
+                conditions.append(f"{column} >= ?")
+                params.append(lower)
+            if upper is not None:
+                conditions.append(f"{column} < ?")
+                params.append(upper)
+        if self.link_status == LINK_UNCHECKED:
+            conditions.append("f.link_status IS NULL")
+        elif self.link_status:
+            conditions.append("f.link_status = ?")
+            params.append(self.link_status)
+        return conditions, params
+
+
+def fetch_file_page(
+    cursor: sqlite3.Cursor,
+    query: FileQuery,
+    after: tuple = None,
+    limit: int = PAGE_SIZE,
+    fts: bool = True,
+) -> tuple:
+    """ファイル一覧を1ページ分取得(キーセットページング)
+
+    (並び替えキー, id)をカーソルとして次ページを取得するため、
+    OFFSETと異なり後ろのページでも読み飛ばしが発生しない
+
+    Args:
+        cursor (sqlite3.Cursor): カーソル
+        query (FileQuery): 検索条件
+        after (tuple): 前ページの最終行のカーソル(先頭ページはNone)
+        limit (int): 取得件数
+        fts (bool): FTS5を使用するか
+
+    Raises:
+        TagQuerySyntaxError: タグ条件式が不正な場合
+
+    Returns:
+        tuple: (行のリスト, 次ページのカーソル。最終ページの場合None)
+            行は(id, filename, filepath, tags, memo, created_at,
+                 kind, size, mtime, exists_flag, link_status, nearest_ancestor,
+                 並び替えキーの各値)
+    """
+    sql, params = _file_page_sql(cursor, query, after, limit, fts)
+    cursor.execute(sql, params)
+    rows = cursor.fetchall()
+    next_after = (*rows[-1][12:], rows[-1][0]) if len(rows) == limit else None
+    return rows, next_after
+
+
+def explain_file_page(
+    cursor: sqlite3.Cursor,
+    query: FileQuery,
+    after: tuple = None,
+    limit: int = PAGE_SIZE,
+    fts: bool = True,
+) -> list:
+    """fetch_file_pageのクエリの実行計画
+
+    Returns:
+        list: EXPLAIN QUERY PLANの各行の説明(SCAN/SEARCH ...)
+    """
+    sql, params = _file_page_sql(cursor, query, after, limit, fts)
+    cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+    return [row[-1] for row in cursor.fetchall()]
+
+
+def _file_page_sql(
+    cursor: sqlite3.Cursor, query: FileQuery, after: tuple, limit: int, fts: bool
+) -> tuple:
+    """fetch_file_pageのクエリとパラメータ"""
+    conditions, params = query.conditions(cursor, fts=fts)
+    sort_expressions = query.sort_expressions()
+    if after is not None:
+        op = ">" if query.ascending else "<"
+        # 先頭の式でインデックスの範囲検索にする
+        # (式の行値比較だけでは範囲検索にならず、インデックスを先頭から読み飛ばす)
+        conditions.append(f"{sort_expressions[0]} {op}= ?")
+        params.append(after[0])
+        placeholders = ", ".join("?" * len(after))
+        conditions.append(
+            f"({', '.join(sort_expressions)}, f.id) {op} ({placeholders})"
+        )
+        params.extend(after)
+    direction = "ASC" if query.ascending else "DESC"
+    sort_values = [f"sort_value{index}" for index in range(len(sort_expressions))]
+    sort_columns = ", ".join(
+        f"{expression} AS {value}"
+        for expression, value in zip(sort_expressions, sort_values)
+    )
+    inner_order = ", ".join(f"{e} {direction}" for e in sort_expressions)
+    outer_order = ", ".join(f"{v} {direction}" for v in sort_values)
+    sql = f"""
+        SELECT
+            id, filename, filepath, {TAGS_COLUMN} AS tags, memo, created_at,
+            kind, size, mtime, exists_flag, link_status, nearest_ancestor,
+            {", ".join(sort_values)}
+        FROM (
+            SELECT
+                f.id,
+                f.filename,
+                f.filepath,
+                f.memo,
+                f.created_at,
+                f.kind,
+                f.size,
+                f.mtime,
+                f.exists_flag,
+                f.link_status,
+                f.nearest_ancestor,
+                {sort_columns}
+            FROM files f
+            WHERE {" AND ".join(conditions) if conditions else "1"}
+            ORDER BY {inner_order}, f.id {direction}
+            LIMIT ?
+        ) f
+        ORDER BY {outer_order}, id {direction}
+        """
+    return sql, (*params, limit)
+
+
+def find_file(cursor: sqlite3.Cursor, filepath: str):
+    """パスから登録済みのファイルを取得
+
+    Returns:
+        tuple: fetch_file_pageと同じ形式の行(並び替えキーなし)。未登録の場合None
+    """
+    cursor.execute(
+        f"""
+        SELECT
+            id, filename, filepath, {TAGS_COLUMN} AS tags, memo, created_at,
+            kind, size, mtime, exists_flag, link_status, nearest_ancestor
+        FROM files f
+        WHERE dir_key = ? AND name_key = ?
+        """,
+        location_key(filepath),
+    )
+    return cursor.fetchone()
+
+
+def iter_files(
+    cursor: sqlite3.Cursor,
+    query: FileQuery,
+    page_size: int = PAGE_SIZE,
+    fts: bool = True,
+):
+    """検索結果を先頭からすべて取得(1ページずつ読み込む)
+
+    Yields:
+        tuple: fetch_file_pageと同じ形式の行
+    """
+    after = None
+    while True:
+        rows, after = fetch_file_page(cursor, query, after, page_size, fts)
+        yield from rows
+        if after is None:
+            return
+
+
+# 外部に出力する項目(fetch_file_pageの行の先頭から)
+FILE_FIELDS = (
+    "id",
+    "filename",
+    "filepath",
+    "tags",
+    "memo",
+    "created_at",
+    "kind",
+    "size",
+    "mtime",
+    "exists",
+    "link_status",
+    "nearest_ancestor",
+)
+
+
+def file_record(row: tuple) -> dict:
+    """fetch_file_pageの行を出力用の辞書に変換(タグはリスト)"""
+    record = dict(zip(FILE_FIELDS, row))
+    record["tags"] = record["tags"].split(",") if record["tags"] else []
+    if record["exists"] is not None:
+        record["exists"] = bool(record["exists"])
+    return record
@@ -0,0 +1,568 @@
+import sqlite3
+import time
+
+import util.util_query as util_query
+from util.util_conversion import path_key, split_path
+
+# 1回のトランザクションで移行する件数
+MIGRATE_BATCH = 10000
+
+# パス情報のキャッシュ列 (列名, 型)
+FILES_INFO_COLUMNS = [
+    ("kind", "TEXT"),
+    ("size", "INTEGER"),
+    ("mtime", "REAL"),
+    ("exists_flag", "INTEGER"),
+    ("checked_at", "REAL"),
+]
+# リンク切れ確認の結果列 (列名, 型)
+LINK_HEALTH_COLUMNS = [
+    ("link_status", "TEXT"),
+    ("nearest_ancestor", "TEXT"),
+]
+# 移動・名前変更の追跡に使うフィンガープリント列 (列名, 型)
+FINGERPRINT_COLUMNS = [
+    ("fp_dev", "INTEGER"),
+    ("fp_ino", "INTEGER"),
+]
+
+
+class Migration:
+    """番号付きの移行手順
+
+    applyは1トランザクションで実行する。
+    件数の多い移行はprepare・batch・finishに分けて、batchを
+    MIGRATE_BATCH件ずつ別のトランザクションで実行する。
+    batchごとに進捗(checkpoint)を記録するため、中断しても続きから再開できる
+    """
+
+    def __init__(
+        self,
+        version: int,
+        description: str,
+        apply=None,
+        prepare=None,
+        batch=None,
+        finish=None,
+        remaining=None,
+    ):
+        """
+        Args:
+            version (int): 移行番号
+            description (str): 進捗表示用の説明
+            apply (function): (file_manager, cursor) 1トランザクションで行う移行
+            prepare (function): (file_manager, cursor) 分割して行う移行の準備
+            batch (function): (cursor, checkpoint) 1回分の移行。
+                (次のcheckpoint, 件数)を返し、完了した場合はNoneを返す
+            finish (function): (file_manager, cursor) 分割して行う移行の後処理
+            remaining (function): (cursor, checkpoint) 残りの件数
+        """
+        self.version = version
+        self.description = description
+        self.apply = apply
+        self.prepare = prepare
+        self.batch = batch
+        self.finish = finish
+        self.remaining = remaining
+
+    @property
+    def batched(self) -> bool:
+        return self.batch is not None
+
+
+def _columns(cursor: sqlite3.Cursor, table: str) -> list:
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [col[1] for col in cursor.fetchall()]
+
+
+def _add_columns(cursor: sqlite3.Cursor, table: str, columns: list):
+    """未追加の列を追加(ALTER TABLEのため既存レコードは書き換えない)"""
+    existing = _columns(cursor, table)
+    for column, column_type in columns:
+        if column not in existing:
+            cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+
+# ============================================
+# 1: メモ列の追加
+# ============================================
+def _add_memo(file_manager, cursor: sqlite3.Cursor):
+    _add_columns(cursor, "files", [("memo", "TEXT DEFAULT ''")])
+
+
+# ============================================
+# 2: 重複したタグ名の統合
+# ============================================
+def _merge_tags(file_manager, cursor: sqlite3.Cursor):
+    # 重複したタグ名を最小IDのタグに統合(一意インデックス作成のため)
+    cursor.execute(
+        """
+            CREATE TEMP TABLE tag_merge AS
+            SELECT t.id AS old_id, k.keep_id AS new_id
+            FROM tag_mng t
+            JOIN (
+                SELECT tag_name, MIN(id) AS keep_id
+                FROM tag_mng
+                WHERE tag_name IS NOT NULL
+                GROUP BY tag_name
+                HAVING COUNT(*) > 1
+            ) k ON t.tag_name = k.tag_name AND t.id <> k.keep_id
+        """
+    )
+    cursor.execute(
+        """
+            INSERT OR IGNORE INTO file_tags (file_id, tag_id, number_of, created_at)
+            SELECT j.file_id, m.new_id, j.number_of, j.created_at
+            FROM file_tags j
+            JOIN tag_merge m ON j.tag_id = m.old_id
+        """
+    )
+    cursor.execute(
+        "DELETE FROM file_tags WHERE tag_id IN (SELECT old_id FROM tag_merge)"
+    )
+    cursor.execute("DELETE FROM tag_mng WHERE id IN (SELECT old_id FROM tag_merge)")
+    cursor.execute("DROP TABLE tag_merge")
+    cursor.execute(
+        "CREATE UNIQUE INDEX IF NOT EXISTS idx_tag_mng_tag_name ON tag_mng(tag_name)"
+    )
+
+
+# ============================================
+# 3: 正規化パス列の追加と重複したパスの統合
+# ============================================
+def _prepare_filepath_key(file_manager, cursor: sqlite3.Cursor):
+    _add_columns(cursor, "files", [("filepath_key", "TEXT")])
+    cursor.execute("DROP INDEX IF EXISTS idx_files_filepath_key")
+
+
+def _remaining_files(cursor: sqlite3.Cursor, checkpoint: int) -> int:
+    cursor.execute("SELECT COUNT(*) FROM files WHERE id > ?", (checkpoint,))
+    return cursor.fetchone()[0]
+
+
+def _fill_filepath_key(cursor: sqlite3.Cursor, checkpoint: int):
+    cursor.execute(
+        "SELECT id, filepath FROM files WHERE id > ? ORDER BY id LIMIT ?",
+        (checkpoint, MIGRATE_BATCH),
+    )
+    rows = cursor.fetchall()
+    if not rows:
+        return None
+    cursor.executemany(
+        "UPDATE files SET filepath_key = ? WHERE id = ?",
+        [(path_key(filepath), file_id) for file_id, filepath in rows],
+    )
+    return rows[-1][0], len(rows)
+
+
+def _merge_files(file_manager, cursor: sqlite3.Cursor):
+    # 同じパスの重複登録を最小IDのレコードに統合(タグは引き継ぐ)
+    cursor.execute(
+        """
+            CREATE TEMP TABLE file_merge AS
+            SELECT f.id AS old_id, k.keep_id AS new_id
+            FROM files f
+            JOIN (
+                SELECT filepath_key, MIN(id) AS keep_id
+                FROM files
+                GROUP BY filepath_key
+                HAVING COUNT(*) > 1
+            ) k ON f.filepath_key = k.filepath_key AND f.id <> k.keep_id
+        """
+    )
+    cursor.execute(
+        """
+            INSERT OR IGNORE INTO file_tags (file_id, tag_id, number_of, created_at)
+            SELECT m.new_id, j.tag_id, j.number_of, j.created_at
+            FROM file_tags j
+            JOIN file_merge m ON j.file_id = m.old_id
+        """
+    )
+    cursor.execute(
+        "DELETE FROM file_tags WHERE file_id IN (SELECT old_id FROM file_merge)"
+    )
+    cursor.execute("DELETE FROM files WHERE id IN (SELECT old_id FROM file_merge)")
+    cursor.execute("DROP TABLE file_merge")
+
+
+# ============================================
+# 4-6: パス情報・リンク切れ確認・フィンガープリントの列
+# ============================================
+def _add_info_columns(file_manager, cursor: sqlite3.Cursor):
+    # 値はバックグラウンドの再確認で設定
+    _add_columns(cursor, "files", FILES_INFO_COLUMNS)
+
+
+def _add_link_health_columns(file_manager, cursor: sqlite3.Cursor):
+    _add_columns(cursor, "files", LINK_HEALTH_COLUMNS)
+    # 確認済みの結果からリンク状態を設定
+    cursor.execute(
+        """
+            UPDATE files
+            SET link_status = CASE exists_flag WHEN 1 THEN 'ok' ELSE 'missing' END
+            WHERE exists_flag IS NOT NULL AND link_status IS NULL
+        """
+    )
+
+
+def _add_fingerprint_columns(file_manager, cursor: sqlite3.Cursor):
+    _add_columns(cursor, "files", FINGERPRINT_COLUMNS)
+    # 存在するパスは次の確認でフィンガープリントを取得するため未確認に戻す
+    cursor.execute("UPDATE files SET checked_at = NULL WHERE exists_flag = 1")
+
+
+# ============================================
+# 7: フォルダ(dirs)とファイル(file_entries)への分割
+# ============================================
+# filesからfile_entriesに引き継ぐ列
+_COPY_COLUMNS = ["filename", "memo", "created_at"] + [
+    column
+    for column, _ in FILES_INFO_COLUMNS + LINK_HEALTH_COLUMNS + FINGERPRINT_COLUMNS
+]
+
+
+def _prepare_dirs(file_manager, cursor: sqlite3.Cursor):
+    # 旧テーブルのFTSは移行後に作り直す(トリガーは移行中の削除で動かないよう先に削除)
+    for trigger in ("files_fts_insert", "files_fts_delete", "files_fts_update"):
+        cursor.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+    cursor.execute("DROP TABLE IF EXISTS files_fts")
+    # 移した分の削除でインデックスを更新しないよう先に削除
+    cursor.execute(
+        """
+            SELECT name FROM sqlite_master
+            WHERE type = 'index' AND tbl_name = 'files' AND sql IS NOT NULL
+        """
+    )
+    for (index,) in cursor.fetchall():
+        cursor.execute(f"DROP INDEX IF EXISTS {index}")
+    file_manager.query_create_dirs(cursor)
+    file_manager.query_create_file_entries(cursor)
+
+
+def _copy_to_file_entries(cursor: sqlite3.Cursor, checkpoint: int):
+    """filesの先頭からfile_entriesに移してfilesから削除
+
+    移した分を削除するため、移行中もファイルサイズは元の大きさ程度に収まる
+    """
+    columns = ", ".join(_COPY_COLUMNS)
+    cursor.execute(
+        f"SELECT id, filepath, {columns} FROM files WHERE id > ? ORDER BY id LIMIT ?",
+        (checkpoint, MIGRATE_BATCH),
+    )
+    rows = cursor.fetchall()
+    if not rows:
+        return None
+    splitted = [split_path(row[1]) for row in rows]
+    dir_ids = util_query.intern_dirs(cursor, [dir_path for dir_path, _ in splitted])
+    placeholders = ",".join("?" * (len(_COPY_COLUMNS) + 4))
+    # IDは引き継ぐためタグの紐づけはそのまま使える。
+    # 正規化の違いで重複するパスは先に登録したものを残す
+    cursor.executemany(
+        f"""
+            INSERT OR IGNORE INTO file_entries
+                (id, dir_id, basename, name_key, {columns})
+            VALUES ({placeholders})
+        """,
+        [
+            (
+                row[0],
+                dir_ids[path_key(dir_path)],
+                basename,
+                path_key(basename),
+                *row[2:],
+            )
+            for row, (dir_path, basename) in zip(rows, splitted)
+        ],
+    )
+    cursor.execute(
+        "DELETE FROM files WHERE id > ? AND id <= ?", (checkpoint, rows[-1][0])
+    )
+    return rows[-1][0], len(rows)
+
+
+def _finish_dirs(file_manager, cursor: sqlite3.Cursor):
+    # 削除済みのIDを再利用しないよう採番を引き継ぐ
+    cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = 'files'")
+    row = cursor.fetchone()
+    cursor.execute("SELECT IFNULL(MAX(id), 0) FROM file_entries")
+    seq = max(row[0] if row else 0, cursor.fetchone()[0])
+    cursor.execute("DELETE FROM sqlite_sequence WHERE name = 'file_entries'")
+    cursor.execute(
+        "INSERT INTO sqlite_sequence (name, seq) VALUES ('file_entries', ?)", (seq,)
+    )
+    cursor.execute(
+        "DELETE FROM file_tags WHERE file_id NOT IN (SELECT id FROM file_entries)"
+    )
+    cursor.execute("DROP TABLE files")
+    file_manager.create_schema(cursor)
+
+
+# ============================================
+# 8: レコード数・タグごとのファイル数のカウンタ
+# ============================================
+def _add_counters(file_manager, cursor: sqlite3.Cursor):
+    _add_columns(cursor, "tag_mng", [("file_count", "INTEGER NOT NULL DEFAULT 0")])
+    file_manager.query_create_counters(cursor)
+    util_query.rebuild_counters(cursor)
+
+
+# ============================================
+# 9: 並び替え用のタグ列・メモと作成日時の並び替えインデックス
+# ============================================
+def _prepare_tags_key(file_manager, cursor: sqlite3.Cursor):
+    _add_columns(cursor, "file_entries", [("tags_key", "TEXT NOT NULL DEFAULT ''")])
+    # 列を追加したビューに作り直す
+    cursor.execute("DROP VIEW IF EXISTS files")
+    file_manager.query_create_files_view(cursor)
+
+
+def _fill_tags_key(cursor: sqlite3.Cursor, checkpoint: int):
+    """タグが紐づいたファイルのtags_keyを設定(インデックスは完了後に作成)"""
+    cursor.execute(
+        "SELECT id FROM file_entries WHERE id > ? ORDER BY id LIMIT ?",
+        (checkpoint, MIGRATE_BATCH),
+    )
+    ids = [row[0] for row in cursor.fetchall()]
+    if not ids:
+        return None
+    cursor.execute(
+        f"""
+            UPDATE file_entries
+            SET tags_key = {util_query.tags_key_sql("file_entries.id")}
+            WHERE id > ? AND id <= ?
+            AND id IN (SELECT file_id FROM file_tags)
+        """,
+        (checkpoint, ids[-1]),
+    )
+    return ids[-1], len(ids)
+
+
+def _remaining_entries(cursor: sqlite3.Cursor, checkpoint: int) -> int:
+    cursor.execute("SELECT COUNT(*) FROM file_entries WHERE id > ?", (checkpoint,))
+    return cursor.fetchone()[0]
+
+
+def _finish_tags_key(file_manager, cursor: sqlite3.Cursor):
+    # 並び替えのインデックスとtags_keyを更新するトリガー
+    # (create_schemaは以降の移行で追加する列を参照するため使わない)
+    file_manager.query_create_sort_indexes(cursor)
+    file_manager.query_create_tags_key(cursor)
+
+
+# ============================================
+# 10: 移動したフォルダの再確認の印
+# ============================================
+def _add_moved_at(file_manager, cursor: sqlite3.Cursor):
+    _add_columns(cursor, "dirs", [("moved_at", "REAL")])
+    file_manager.query_create_dirs(cursor)
+
+
+# ============================================
+# 11: タグ名の検索インデックス(大文字小文字を区別しない)
+# ============================================
+def _add_tag_name_lower_index(file_manager, cursor: sqlite3.Cursor):
+    cursor.execute(
+        "CREATE INDEX IF NOT EXISTS idx_tag_mng_tag_name_lower "
+        "ON tag_mng(LOWER(tag_name))"
+    )
+
+
+MIGRATIONS = [
+    Migration(1, "メモ列の追加", apply=_add_memo),
+    Migration(2, "重複したタグの統合", apply=_merge_tags),
+    Migration(
+        3,
+        "正規化パスの設定",
+        prepare=_prepare_filepath_key,
+        batch=_fill_filepath_key,
+        finish=_merge_files,
+        remaining=_remaining_files,
+    ),
+    Migration(4, "パス情報列の追加", apply=_add_info_columns),
+    Migration(5, "リンク状態列の追加", apply=_add_link_health_columns),
+    Migration(6, "フィンガープリント列の追加", apply=_add_fingerprint_columns),
+    Migration(
+        7,
+        "フォルダとファイルへの分割",
+        prepare=_prepare_dirs,
+        batch=_copy_to_file_entries,
+        finish=_finish_dirs,
+        remaining=_remaining_files,
+    ),
+    Migration(8, "件数カウンタの追加", apply=_add_counters),
+    Migration(
+        9,
+        "並び替えインデックスの追加",
+        prepare=_prepare_tags_key,
+        batch=_fill_tags_key,
+        finish=_finish_tags_key,
+        remaining=_remaining_entries,
+    ),
+    Migration(10, "移動したフォルダの再確認の印", apply=_add_moved_at),
+    Migration(11, "タグ名の検索インデックスの追加", apply=_add_tag_name_lower_index),
+]
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+class Migrator:
+    """DBの移行
+
+    適用済みの移行はmigrationsテーブルに記録する。
+    最新の場合は適用済みの番号を確認するだけで移行処理は行わない
+    """
+
+    def __init__(self, file_manager, migrations: list = MIGRATIONS):
+        self.file_manager = file_manager
+        self.migrations = migrations
+
+    def applied(self) -> dict:
+        """適用済み・適用中の移行
+
+        Returns:
+            dict: 移行番号 -> 完了した場合True、途中の場合はcheckpoint
+                migrationsテーブルがない場合はNone
+        """
+        with self.file_manager.read_session() as cursor:
+            cursor.execute(
+                """
+                SELECT 1 FROM sqlite_master
+                WHERE type = 'table' AND name = 'migrations'
+                """
+            )
+            if cursor.fetchone() is None:
+                return None
+            cursor.execute("SELECT version, applied_at, checkpoint FROM migrations")
+            return {
+                version: True if applied_at else checkpoint or 0
+                for version, applied_at, checkpoint in cursor.fetchall()
+            }
+
+    def pending(self) -> list:
+        """未適用の移行(新規作成の場合は空)"""
+        applied = self.applied()
+        if applied is None:
+            applied = self._initial_versions()
+        return [m for m in self.migrations if applied.get(m.version) is not True]
+
+    def run(self, on_progress=None) -> int:
+        """未適用の移行を番号順に適用
+
+        Args:
+            on_progress (function): (説明, 完了件数, 全体の件数)を受け取る処理
+
+        Returns:
+            int: 適用した移行の数
+        """
+        applied = self.applied()
+        if applied is None:
+            applied = self._bootstrap()
+        count = 0
+        for migration in self.migrations:
+            state = applied.get(migration.version)
+            if state is True:
+                continue
+            if migration.batched:
+                self._run_batched(migration, state, on_progress)
+            else:
+                if on_progress:
+                    on_progress(migration.description, 0, 1)
+                with self.file_manager.write_session() as cursor:
+                    migration.apply(self.file_manager, cursor)
+                    self._mark(cursor, migration, None, True)
+                if on_progress:
+                    on_progress(migration.description, 1, 1)
+            count += 1
+        return count
+
+    def _run_batched(self, migration: Migration, checkpoint, on_progress):
+        if checkpoint is None:
+            with self.file_manager.write_session() as cursor:
+                migration.prepare(self.file_manager, cursor)
+                self._mark(cursor, migration, 0, False)
+            checkpoint = 0
+        with self.file_manager.read_session() as cursor:
+            total = migration.remaining(cursor, checkpoint)
+        done = 0
+        while True:
+            if on_progress:
+                on_progress(migration.description, done, total)
+            with self.file_manager.write_session() as cursor:
+                result = migration.batch(cursor, checkpoint)
+                if result is None:
+                    migration.finish(self.file_manager, cursor)
+                    self._mark(cursor, migration, checkpoint, True)
+                    break
+                checkpoint, batch_count = result
+                self._mark(cursor, migration, checkpoint, False)
+            done += batch_count
+        if on_progress:
+            on_progress(migration.description, total, total)
+
+    def _mark(self, cursor, migration: Migration, checkpoint, finished: bool):
+        cursor.execute(
+            """
+            INSERT OR REPLACE INTO migrations
+                (version, description, checkpoint, applied_at)
+            VALUES (?, ?, ?, ?)
+            """,
+            (
+                migration.version,
+                migration.description,
+                checkpoint,
+                time.strftime("%Y-%m-%d %H:%M:%S") if finished else None,
+            ),
+        )
+
+    def _initial_versions(self) -> dict:
+        """migrationsテーブル作成前の適用済みの移行"""
+        with self.file_manager.read_session() as cursor:
+            cursor.execute(
+                """
+                SELECT name FROM sqlite_master
+                WHERE type = 'table' AND name IN ('version', 'files')
+                """
+            )
+            tables = [row[0] for row in cursor.fetchall()]
+            if "version" in tables:
+                # 旧形式(FileManager.version)で記録した番号
+                cursor.execute("SELECT MAX(version) FROM version")
+                version = cursor.fetchone()[0]
+                if version is None:
+                    version = 0 if "files" in tables else LATEST_VERSION
+            elif "files" in tables:
+                version = 0
+            else:
+                # 新規作成
+                version = LATEST_VERSION
+        return {m.version: True for m in self.migrations if m.version <= version}
+
+    def _bootstrap(self) -> dict:
+        """migrationsテーブルを作成して適用済みの移行を記録"""
+        applied = self._initial_versions()
+        with self.file_manager.write_session() as cursor:
+            cursor.execute(
+                """
+                CREATE TABLE IF NOT EXISTS migrations (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT,
+                    checkpoint INTEGER,
+                    applied_at TIMESTAMP
+                )
+                """
+            )
+            self.file_manager.query_create_tag_mng(cursor)
+            self.file_manager.query_create_file_tags(cursor)
+            cursor.execute(
+                """
+                SELECT 1 FROM sqlite_master
+                WHERE type = 'table' AND name IN ('files', 'file_entries')
+                """
+            )
+            if cursor.fetchone() is None:
+                # 新規作成
+                self.file_manager.create_schema(cursor)
+            for migration in self.migrations:
+                if applied.get(migration.version) is True:
+                    self._mark(cursor, migration, None, True)
+            cursor.execute("DROP TABLE IF EXISTS version")
+        return applied
@@ -0,0 +1,253 @@
+import threading
+import time
+import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import util.util_query as util_query
+from util.path_info import (
+    LINK_ERROR,
+    LINK_MISSING,
+    LINK_TIMEOUT,
+    nearest_ancestor,
+    stat_path,
+    volume_of,
+)
+
+# 1回に確認する件数
+REFRESH_BATCH = 500
+# 前回の確認からこの秒数が経過したら再確認
+RECHECK_INTERVAL = 60 * 60
+# 確認するファイルがない場合の待ち時間(秒)
+IDLE_INTERVAL = 30
+# 確認スレッド数
+WORKERS = 16
+# ボリュームごとの同時確認数(1つの遅いボリュームがスレッドを使い切らないため)
+VOLUME_CONCURRENCY = 4
+# 1件の確認のタイムアウト(秒)
+CHECK_TIMEOUT = 5.0
+# 確認中の結果を待つ間隔(秒)
+POLL_INTERVAL = 0.1
+
+
+class _BatchState:
+    """1回分の確認で共有する状態"""
+
+    def __init__(self):
+        # 確認を開始した時刻 ファイルID -> time.monotonic()
+        self.started = {}
+        # タイムアウトしたボリューム(以降の確認は行わない)
+        self.unreachable = set()
+        # 親フォルダの存在確認結果
+        self.exists_cache = {}
+
+
+class PathRefresher:
+    """登録済みパスのリンク切れ確認
+
+    移動したフォルダの配下、未確認・確認日時の古いものの順に、スレッドプールで並行に確認して
+    パス情報(種類・サイズ・更新日時・存在有無)とリンク状態、
+    リンク切れの場合は存在する最も近い親フォルダを保存する。
+    一覧の表示時にファイルシステムへアクセスする必要がない。
+
+    ボリュームごとに同時確認数を制限し、応答のないボリュームは
+    タイムアウトとして記録してその回の残りの確認を打ち切る
+    """
+
+    def __init__(
+        self,
+        file_manager,
+        batch_size: int = REFRESH_BATCH,
+        recheck_interval: float = RECHECK_INTERVAL,
+        idle_interval: float = IDLE_INTERVAL,
+        workers: int = WORKERS,
+        volume_concurrency: int = VOLUME_CONCURRENCY,
+        timeout: float = CHECK_TIMEOUT,
+    ):
+        self.file_manager = file_manager
+        self.batch_size = batch_size
+        self.recheck_interval = recheck_interval
+        self.idle_interval = idle_interval
+        self.workers = workers
+        self.volume_concurrency = volume_concurrency
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="link-check"
+        )
+        self._volumes = {}
+        self._volumes_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        # この時刻より前に確認したものは経過時間に関係なく再確認する
+        self._recheck_before = 0.0
+        # 計測値
+        self.checked = 0
+        self.timeouts = 0
+        self.last_batch_seconds = 0.0
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(
+            target=self._loop, name="path-refresher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        # 応答のない確認は待たない
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def wake(self):
+        """待機中の場合すぐに確認を再開"""
+        self._wake.set()
+
+    def recheck_all(self):
+        """登録済みのすべてのパスを(確認日時の古い順に)再確認"""
+        self._recheck_before = time.time()
+        self.wake()
+
+    def metrics(self) -> dict:
+        """計測値を取得"""
+        return {
+            "checked": self.checked,
+            "timeouts": self.timeouts,
+            "last_batch_seconds": self.last_batch_seconds,
+        }
+
+    def refresh_once(self) -> int:
+        """確認が必要なファイルを1回分確認
+
+        Returns:
+            int: 確認した件数
+        """
+        with self.file_manager.read_session() as cursor:
+            checked_before = max(
+                time.time() - self.recheck_interval, self._recheck_before
+            )
+            files = util_query.select_files_to_check(
+                cursor, checked_before, self.batch_size
+            )
+        if not files:
+            return 0
+        started_at = time.monotonic()
+        # ファイルシステムへのアクセスはトランザクションの外で行う
+        rows = self._check_all(files)
+        if rows:
+            with self.file_manager.write_session() as cursor:
+                util_query.update_file_info(cursor, rows)
+                util_query.clear_moved_dirs(cursor, [row[0] for row in rows])
+        self.checked += len(rows)
+        self.last_batch_seconds = time.monotonic() - started_at
+        return len(rows)
+
+    def _check_all(self, files: list) -> list:
+        state = _BatchState()
+        futures = {
+            self._pool.submit(self._check, file_id, filepath, state): (
+                file_id,
+                filepath,
+            )
+            for file_id, filepath in files
+        }
+        rows = []
+        pending = set(futures)
+        # 確認の開始・完了が最後にあった時刻
+        progressed_at = time.monotonic()
+        started_count = 0
+        while pending and not self._stop.is_set():
+            done, pending = wait(
+                pending, timeout=POLL_INTERVAL, return_when=FIRST_COMPLETED
+            )
+            rows.extend(future.result() for future in done)
+            now = time.monotonic()
+            if done or len(state.started) > started_count:
+                started_count = len(state.started)
+                progressed_at = now
+            # 応答のない確認でスレッドが埋まり、開始できないまま待っている
+            stalled = now - progressed_at > self.timeout
+            for future in list(pending):
+                file_id, filepath = futures[future]
+                started = state.started.get(file_id)
+                if started is None:
+                    volume = volume_of(filepath)
+                    if volume not in state.unreachable and not stalled:
+                        continue
+                    if not future.cancel():
+                        # 開始済み(次の確認でタイムアウトを判定する)
+                        continue
+                    pending.discard(future)
+                    if volume in state.unreachable:
+                        rows.append(self._timeout_row(file_id))
+                    # 他のボリュームは確認日時を更新せず次回に確認する
+                elif now - started > self.timeout:
+                    # 確認を開始してからタイムアウトしたものは結果を待たない
+                    pending.discard(future)
+                    state.unreachable.add(volume_of(filepath))
+                    rows.append(self._timeout_row(file_id))
+        for future in pending:
+            future.cancel()
+        return rows
+
+    def _check(self, file_id: int, filepath: str, state: _BatchState) -> tuple:
+        """1件確認
+
+        Returns:
+            tuple: util_query.update_file_infoの1行分
+        """
+        volume = volume_of(filepath)
+        if volume in state.unreachable:
+            return self._timeout_row(file_id)
+        semaphore = self._semaphore(volume)
+        if not semaphore.acquire(timeout=self.timeout):
+            # 前回までの確認が応答しないまま残っている
+            state.unreachable.add(volume)
+            return self._timeout_row(file_id)
+        try:
+            state.started[file_id] = time.monotonic()
+            info = stat_path(filepath)
+            ancestor = None
+            if info[5] == LINK_MISSING:
+
+                def exists(path):
+                    if path not in state.exists_cache:
+                        state.exists_cache[path] = stat_path(path)[3] == 1
+                    return state.exists_cache[path]
+
+                ancestor = nearest_ancestor(filepath, exists)
+            return (file_id, *info, ancestor)
+        except Exception:
+            traceback.print_exc()
+            return self._status_row(file_id, LINK_ERROR)
+        finally:
+            semaphore.release()
+
+    def _timeout_row(self, file_id: int) -> tuple:
+        self.timeouts += 1
+        return self._status_row(file_id, LINK_TIMEOUT)
+
+    def _status_row(self, file_id: int, status: str) -> tuple:
+        # 存在有無は不明のため種類・サイズ等は前回の値のまま
+        checked_at = time.time()
+        return (file_id, None, None, None, None, checked_at, status, None, None, None)
+
+    def _semaphore(self, volume: str) -> threading.Semaphore:
+        with self._volumes_lock:
+            if volume not in self._volumes:
+                self._volumes[volume] = threading.Semaphore(self.volume_concurrency)
+            return self._volumes[volume]
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                count = self.refresh_once()
+            except Exception:
+                traceback.print_exc()
+                count = 0
+            if count == 0:
+                self._wake.wait(self.idle_interval)
+                self._wake.clear()
@@ -0,0 +1,411 @@
+import asyncio
+import json
+import os
+import traceback
+from urllib.parse import parse_qs, urlsplit
+
+from util.util_conversion import split_path
+from database.file_search import (
+    PAGE_SIZE,
+    SEARCH_TARGETS,
+    FileQuery,
+    file_record,
+    find_file,
+)
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+# 1回の検索で返す最大件数(これを超える場合はstreamで取得する)
+MAX_LIMIT = 1000
+# NDJSONで出力する場合に1回に読み込む件数
+# (タグで絞り込むと1ページごとに該当行全体を並べ替えるため大きめにする)
+STREAM_PAGE_SIZE = 5000
+# リクエストの上限
+MAX_HEADER_BYTES = 16 * 1024
+MAX_BODY_BYTES = 1024 * 1024
+# 接続を維持する時間(秒)
+KEEP_ALIVE_TIMEOUT = 30
+
+_REASONS = {
+    200: "OK",
+    201: "Created",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    500: "Internal Server Error",
+}
+
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+class Request:
+    def __init__(self, method: str, target: str, headers: dict, body: bytes):
+        self.method = method
+        url = urlsplit(target)
+        self.path = url.path.rstrip("/") or "/"
+        self.params = {
+            key: values[-1] for key, values in parse_qs(url.query).items()
+        }
+        self.headers = headers
+        self.body = body
+
+    @property
+    def keep_alive(self) -> bool:
+        return self.headers.get("connection", "").lower() != "close"
+
+    def json(self) -> dict:
+        try:
+            data = json.loads(self.body or b"{}")
+        except ValueError as ex:
+            raise HttpError(400, f"JSONを解析できません({ex})")
+        if not isinstance(data, dict):
+            raise HttpError(400, "JSONはオブジェクトで指定してください")
+        return data
+
+
+class QueryServer:
+    """登録済みパスを問い合わせるローカル用のHTTP/JSONサーバー
+
+    DB処理はFileManagerのDbExecutorで実行する(読み取りは並行、書き込みは直列)。
+    イベントループはDBを待たずに他の接続を処理する
+
+    GET  /search?q=&target=&tag=&sort=&desc=&link=&limit=&after=
+         検索結果1ページ分({"items": [...], "next": 次ページのafter})
+    GET  /search?...&stream=1
+         検索結果すべてをNDJSON(1行に1件)で出力
+    GET  /tags            タグ一覧とファイル数
+    GET  /files?path=     パスから登録済みのファイルを取得
+    POST /files           ファイル登録 {"filepath", "filename", "memo", "tags"}
+    GET  /health          リンク状態ごとの件数
+    """
+
+    def __init__(self, file_manager, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+        self.file_manager = file_manager
+        self.executor = file_manager.executor
+        self.host = host
+        self.port = port
+        self._server = None
+        self._routes = {
+            ("GET", "/search"): self.search,
+            ("GET", "/tags"): self.tags,
+            ("GET", "/files"): self.lookup,
+            ("POST", "/files"): self.register,
+            ("GET", "/health"): self.health,
+        }
+
+    async def start(self) -> int:
+        """待ち受けを開始
+
+        Returns:
+            int: 待ち受けているポート(port=0の場合は割り当てられたポート)
+        """
+        self._server = await asyncio.start_server(
+            self._handle, self.host, self.port, limit=MAX_HEADER_BYTES
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self.port
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _run(self, future):
+        """DbExecutorのFutureを待つ"""
+        return await asyncio.wrap_future(future)
+
+    # ============================================
+    # 接続
+    # ============================================
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    request = await asyncio.wait_for(
+                        self._read_request(reader), KEEP_ALIVE_TIMEOUT
+                    )
+                except HttpError as ex:
+                    await self._send_json(writer, ex.status, {"error": str(ex)}, False)
+                    break
+                if request is None:
+                    break
+                await self._dispatch(request, writer)
+                if not request.keep_alive:
+                    break
+        except (asyncio.TimeoutError, ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _read_request(self, reader: asyncio.StreamReader):
+        try:
+            head = await reader.readuntil(b"\r\n\r\n")
+        except asyncio.IncompleteReadError as ex:
+            if ex.partial.strip():
+                raise HttpError(400, "リクエストが途中で終了しました")
+            return None
+        except asyncio.LimitOverrunError:
+            raise HttpError(413, "ヘッダーが大きすぎます")
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _ = lines[0].split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "リクエスト行が不正です")
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+        body = b""
+        try:
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HttpError(400, "Content-Lengthが不正です")
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, "リクエストが大きすぎます")
+        if length:
+            body = await reader.readexactly(length)
+        return Request(method.upper(), target, headers, body)
+
+    async def _dispatch(self, request: Request, writer: asyncio.StreamWriter):
+        handler = self._routes.get((request.method, request.path))
+        try:
+            if handler is None:
+                if any(path == request.path for _, path in self._routes):
+                    raise HttpError(405, f"{request.method}は使用できません")
+                raise HttpError(404, f"{request.path}は存在しません")
+            await handler(request, writer)
+        except HttpError as ex:
+            await self._send_json(
+                writer, ex.status, {"error": str(ex)}, request.keep_alive
+            )
+        except ValueError as ex:
+            # タグ条件式の誤りなど
+            await self._send_json(writer, 400, {"error": str(ex)}, request.keep_alive)
+        except ConnectionError:
+            raise
+        except Exception as ex:
+            traceback.print_exc()
+            await self._send_json(writer, 500, {"error": str(ex)}, request.keep_alive)
+
+    async def _send(
+        self,
+        writer: asyncio.StreamWriter,
+        status: int,
+        body: bytes,
+        content_type: str,
+        keep_alive: bool,
+    ):
+        writer.write(
+            (
+                f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                "\r\n"
+            ).encode("latin-1")
+            + body
+        )
+        await writer.drain()
+
+    async def _send_json(self, writer, status: int, data, keep_alive: bool):
+        await self._send(
+            writer,
+            status,
+            json.dumps(data, ensure_ascii=False).encode("utf-8"),
+            "application/json; charset=utf-8",
+            keep_alive,
+        )
+
+    # ============================================
+    # API
+    # ============================================
+    def _query(self, request: Request) -> FileQuery:
+        params = request.params
+        targets = tuple(
+            t for t in params.get("target", "").split(",") if t in SEARCH_TARGETS
+        )
+        return FileQuery(
+            text=params.get("q", ""),
+            targets=targets or ("filename",),
+            tag_expression=params.get("tag", ""),
+            sort_key=params.get("sort", "filename"),
+            ascending=params.get("desc", "") not in ("1", "true"),
+            link_status=params.get("link", ""),
+        )
+
+    def _int_param(self, request: Request, name: str, default: int) -> int:
+        try:
+            return int(request.params.get(name, default))
+        except ValueError:
+            raise HttpError(400, f"{name}は数値で指定してください")
+
+    def _after_param(self, request: Request, query: FileQuery) -> tuple:
+        """次ページのカーソル(前の応答のnext)
+
+        並び替えの式の値とIDの配列で、並び替えによって要素数が異なる
+        """
+        try:
+            after = json.loads(request.params["after"])
+        except ValueError:
+            raise HttpError(400, "afterが不正です")
+        if (
+            not isinstance(after, list)
+            or len(after) != len(query.sort_expressions()) + 1
+            or not all(
+                value is None or isinstance(value, (str, int, float))
+                for value in after
+            )
+        ):
+            raise HttpError(400, "afterが不正です")
+        return tuple(after)
+
+    async def search(self, request: Request, writer: asyncio.StreamWriter):
+        query = self._query(request)
+        if request.params.get("stream") in ("1", "true"):
+            await self._stream_search(request, query, writer)
+            return
+        limit = max(1, min(self._int_param(request, "limit", PAGE_SIZE), MAX_LIMIT))
+        after = None
+        if request.params.get("after"):
+            after = self._after_param(request, query)
+        rows, next_after = await self._run(
+            self.executor.search_files(query, after, limit)
+        )
+        await self._send_json(
+            writer,
+            200,
+            {"items": [file_record(row) for row in rows], "next": next_after},
+            request.keep_alive,
+        )
+
+    async def _stream_search(self, request: Request, query: FileQuery, writer):
+        """検索結果をNDJSONで出力(chunked)
+
+        1ページずつ読み込んで書き出すため、読み取り用コネクションを
+        クライアントの受信速度に関係なく短時間で返却する
+        """
+        # 先頭ページでエラー(タグ条件式の誤り等)を判定してから応答を開始
+        rows, after = await self._run(
+            self.executor.search_files(query, None, STREAM_PAGE_SIZE)
+        )
+        writer.write(
+            (
+                "HTTP/1.1 200 OK\r\n"
+                "Content-Type: application/x-ndjson; charset=utf-8\r\n"
+                "Transfer-Encoding: chunked\r\n"
+                f"Connection: {'keep-alive' if request.keep_alive else 'close'}\r\n"
+                "\r\n"
+            ).encode("latin-1")
+        )
+        try:
+            while True:
+                if rows:
+                    chunk = "".join(
+                        json.dumps(file_record(row), ensure_ascii=False) + "\n"
+                        for row in rows
+                    ).encode("utf-8")
+                    writer.write(
+                        f"{len(chunk):x}\r\n".encode("latin-1") + chunk + b"\r\n"
+                    )
+                    await writer.drain()
+                if after is None:
+                    break
+                rows, after = await self._run(
+                    self.executor.search_files(query, after, STREAM_PAGE_SIZE)
+                )
+        except ConnectionError:
+            raise
+        except Exception:
+            # 応答の途中のためエラーは返せない。終端を送らずに切断して中断を知らせる
+            traceback.print_exc()
+            writer.transport.abort()
+            raise ConnectionAbortedError("検索結果の出力を中断しました")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def tags(self, request: Request, writer: asyncio.StreamWriter):
+        tags = await self._run(self.executor.list_tag_counts())
+        await self._send_json(
+            writer,
+            200,
+            [{"id": i, "tag": name, "count": count} for i, name, count in tags],
+            request.keep_alive,
+        )
+
+    async def lookup(self, request: Request, writer: asyncio.StreamWriter):
+        path = request.params.get("path")
+        if not path:
+            raise HttpError(400, "pathを指定してください")
+        row = await self._run(self.executor.read(find_file, path))
+        if row is None:
+            raise HttpError(404, f"登録されていません: {path}")
+        await self._send_json(writer, 200, file_record(row), request.keep_alive)
+
+    async def register(self, request: Request, writer: asyncio.StreamWriter):
+        data = request.json()
+        filepath = data.get("filepath")
+        if not isinstance(filepath, str) or not filepath:
+            raise HttpError(400, "filepathを指定してください")
+        # cli registerと同じく絶対パスで登録する
+        filepath = os.path.abspath(filepath)
+        tags = data.get("tags") or []
+        if not isinstance(tags, list) or not all(isinstance(t, str) for t in tags):
+            raise HttpError(400, "tagsは文字列の配列で指定してください")
+        filename = data.get("filename") or split_path(filepath)[1] or filepath
+        # パス情報の取得(ファイルシステムへのアクセス)はDbExecutorのスレッドで行う
+        file_id, created, _ = await self._run(
+            self.executor.register_file(filename, filepath, data.get("memo") or "", tags)
+        )
+        row = await self._run(self.executor.read(find_file, filepath))
+        await self._send_json(
+            writer,
+            201 if created else 200,
+            {"created": created, **file_record(row)},
+            request.keep_alive,
+        )
+
+    async def health(self, request: Request, writer: asyncio.StreamWriter):
+        counts, oldest = await self._run(self.executor.link_summary())
+        await self._send_json(
+            writer,
+            200,
+            {
+                "counts": {
+                    (status or "unchecked"): count for status, count in counts.items()
+                },
+                "oldest_checked_at": oldest,
+            },
+            request.keep_alive,
+        )
+
+
+def run_server(file_manager, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT):
+    """サーバーを起動(Ctrl+Cで終了)"""
+    server = QueryServer(file_manager, host, port)
+
+    async def main():
+        await server.start()
+        print(f"http://{server.host}:{server.port}/ で待ち受けています", flush=True)
+        await server.serve_forever()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
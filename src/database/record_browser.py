@@ -0,0 +1,109 @@
+import sqlite3
+from database.file_search import escape_like
+
+# 1ページの件数
+RECORD_PAGE_SIZE = 100
+# 表示する値の最大文字数(長い値は省略して送る)
+MAX_VALUE_LENGTH = 200
+
+
+def record_source(cursor: sqlite3.Cursor, table_name: str) -> tuple:
+    """レコードを参照するテーブルのカラムとページングのキー
+
+    テーブルはrowid、ビューは先頭のカラムをキーにする
+
+    Raises:
+        ValueError: テーブル・ビューが存在しない場合
+
+    Returns:
+        tuple: (カラム名のリスト, キーの式)
+    """
+    cursor.execute(
+        """
+        SELECT type, sql FROM sqlite_master
+        WHERE type IN ('table', 'view') AND name = ?
+        """,
+        (table_name,),
+    )
+    row = cursor.fetchone()
+    if row is None:
+        raise ValueError(f"テーブルが存在しません: {table_name}")
+    table_type, sql = row
+    cursor.execute(f'PRAGMA table_info("{table_name}")')
+    columns = [col[1] for col in cursor.fetchall()]
+    if table_type == "view" or "WITHOUT ROWID" in (sql or "").upper():
+        return columns, f'"{columns[0]}"'
+    return columns, "rowid"
+
+
+def fetch_record_page(
+    cursor: sqlite3.Cursor,
+    table_name: str,
+    filters: dict = None,
+    after=None,
+    start_key=None,
+    limit: int = RECORD_PAGE_SIZE,
+) -> tuple:
+    """テーブルのレコードを1ページ分取得(キーセットページング)
+
+    キーの順に並べ、前ページの最終行のキーより後ろを取得するため
+    後ろのページでも読み飛ばしが発生しない。
+    結果はfetchmanyで1ページ分だけ読み出す
+
+    Args:
+        cursor (sqlite3.Cursor): カーソル
+        table_name (str): テーブル名
+        filters (dict): カラム名 -> 部分一致で絞り込む文字列
+        after: 前ページの最終行のキー(先頭ページはNone)
+        start_key: このキー以降から表示(ID指定で移動する場合)
+        limit (int): 取得件数
+
+    Raises:
+        ValueError: テーブル・カラムが存在しない場合
+
+    Returns:
+        tuple: (カラム名のリスト, 行のリスト, 次ページのキー。最終ページの場合None)
+            行は(キー, 各カラムの値)
+    """
+    columns, key = record_source(cursor, table_name)
+    conditions = []
+    params = []
+    for column, text in (filters or {}).items():
+        if column not in columns:
+            raise ValueError(f"カラムが存在しません: {column}")
+        conditions.append(f"CAST(\"{column}\" AS TEXT) LIKE ? ESCAPE '\\'")
+        params.append(f"%{escape_like(text)}%")
+    if after is not None:
+        conditions.append(f"{key} > ?")
+        params.append(after)
+    elif start_key is not None:
+        conditions.append(f"{key} >= ?")
+        params.append(start_key)
+    cursor.execute(
+        f"""
+        SELECT {key}, {", ".join(f'"{column}"' for column in columns)}
+        FROM "{table_name}"
+        WHERE {" AND ".join(conditions) if conditions else "1"}
+        ORDER BY {key}
+        """,
+        params,
+    )
+    # 次ページの有無を判定するため1件多く読む
+    rows = cursor.fetchmany(limit + 1)
+    next_after = rows[limit - 1][0] if len(rows) > limit else None
+    return (
+        columns,
+        [
+            (row[0], *(_shorten(value) for value in row[1:]))
+            for row in rows[:limit]
+        ],
+        next_after,
+    )
+
+
+def _shorten(value):
+    if isinstance(value, bytes):
+        return f"<{len(value)} bytes>"
+    if isinstance(value, str) and len(value) > MAX_VALUE_LENGTH:
+        return value[:MAX_VALUE_LENGTH] + "…"
+    return value
@@ -0,0 +1,237 @@
+import os
+import threading
+import time
+
+import util.util_query as util_query
+from util.crawler import DEFAULT_WORKERS, crawl_entries
+from util.path_info import KIND_FILE, LINK_MISSING
+from util.util_conversion import location_key, path_key, split_path
+
+# 1回の照合クエリで渡す走査結果の件数
+MATCH_BATCH = 1000
+# 1トランザクションで更新する件数
+APPLY_BATCH = 5000
+
+# 照合方法
+MATCH_FINGERPRINT = "fingerprint"
+MATCH_NAME_SIZE = "name_size"
+
+
+class RelocationPlan:
+    """移動先の検出結果(ドライラン)"""
+
+    def __init__(self):
+        # (ファイルID, 変更前のパス, 変更後のパス, 照合方法)
+        self.moves = []
+        # (ファイルID, 変更前のパス, 理由)
+        self.conflicts = []
+        # リンク切れの件数
+        self.missing = 0
+        # 走査した件数
+        self.scanned = 0
+        self.cancelled = False
+        self.elapsed = 0.0
+
+    @property
+    def unmatched(self) -> int:
+        return self.missing - len(self.moves) - len(self.conflicts)
+
+
+class Relocator:
+    """リンク切れのパスの移動先をフィンガープリントで検出して一括で付け替える
+
+    候補のフォルダを走査し、(デバイス, inode/ファイルID)が一致するものを
+    移動先とする。inodeが変わる別ボリュームへのコピーは
+    (名前, サイズ, 更新日時)が一致するファイルを移動先とする
+    """
+
+    def __init__(self, file_manager, workers: int = DEFAULT_WORKERS):
+        self.file_manager = file_manager
+        self.workers = workers
+        self._cancel = threading.Event()
+
+    def cancel(self):
+        self._cancel.set()
+
+    def plan(self, roots: list, on_progress=None) -> RelocationPlan:
+        """移動先を検出(DBは更新しない)
+
+        Args:
+            roots (list): 移動先を探すフォルダ
+            on_progress (function): 走査件数を受け取る処理
+
+        Returns:
+            RelocationPlan: 検出結果
+        """
+        started_at = time.monotonic()
+        plan = RelocationPlan()
+        with self.file_manager.read_session() as cursor:
+            cursor.execute(
+                """
+                SELECT id, filepath, size, mtime FROM files
+                WHERE link_status = ?
+                """,
+                (LINK_MISSING,),
+            )
+            missing = cursor.fetchall()
+        plan.missing = len(missing)
+        if not missing:
+            return plan
+        # inodeで一致しない場合の照合用 (名前, サイズ, 更新日時) -> ファイル
+        by_name_size = {}
+        for file_id, filepath, size, mtime in missing:
+            if size is not None and mtime is not None:
+                key = (os.path.basename(filepath).casefold(), size, mtime)
+                by_name_size.setdefault(key, []).append((file_id, filepath))
+
+        # ファイルID -> 移動先の候補 {パス: 照合方法}
+        candidates = {}
+        batch = []
+        for root in roots:
+            for name, path, _, info in crawl_entries(
+                root, cancel=self._cancel, workers=self.workers
+            ):
+                plan.scanned += 1
+                kind, size, mtime, *_, fp_dev, fp_ino = info
+                if fp_ino is not None:
+                    batch.append((fp_ino, fp_dev, path))
+                if kind == KIND_FILE:
+                    key = (name.casefold(), size, mtime)
+                    for file_id, _ in by_name_size.get(key, ()):
+                        candidates.setdefault(file_id, {}).setdefault(
+                            path, MATCH_NAME_SIZE
+                        )
+                if len(batch) >= MATCH_BATCH:
+                    self._match(batch, candidates)
+                    batch = []
+                    if on_progress:
+                        on_progress(plan.scanned)
+        if batch:
+            self._match(batch, candidates)
+
+        self._resolve(plan, dict((row[0], row[1]) for row in missing), candidates)
+        plan.cancelled = self._cancel.is_set()
+        plan.elapsed = time.monotonic() - started_at
+        return plan
+
+    def _match(self, batch: list, candidates: dict):
+        """走査結果のフィンガープリントをリンク切れのファイルと照合(インデックスを使用)"""
+        values = ",".join(["(?, ?, ?)"] * len(batch))
+        params = [value for row in batch for value in row]
+        with self.file_manager.read_session() as cursor:
+            cursor.execute(
+                f"""
+                WITH scanned(ino, dev, path) AS (VALUES {values})
+                SELECT f.id, s.path
+                FROM scanned s
+                JOIN file_entries f ON f.fp_ino = s.ino
+                WHERE f.link_status = ?
+                AND (f.fp_dev IS NULL OR s.dev IS NULL OR f.fp_dev = s.dev)
+                """,
+                (*params, LINK_MISSING),
+            )
+            for file_id, path in cursor.fetchall():
+                # フィンガープリントでの一致を優先
+                candidates.setdefault(file_id, {})[path] = MATCH_FINGERPRINT
+
+    def _resolve(self, plan: RelocationPlan, old_paths: dict, candidates: dict):
+        """候補から移動先を1つに決める(決められないものは競合)"""
+        moves = {}
+        for file_id, paths in candidates.items():
+            fingerprint = [p for p, m in paths.items() if m == MATCH_FINGERPRINT]
+            choices = fingerprint or list(paths)
+            if len(choices) > 1:
+                plan.conflicts.append(
+                    (file_id, old_paths[file_id], f"移動先の候補が{len(choices)}件あります")
+                )
+                continue
+            moves[file_id] = (choices[0], paths[choices[0]])
+
+        # 移動先が登録済み・同じ移動先に複数のファイルが一致する場合は競合
+        targets = {}
+        for file_id, (path, _) in moves.items():
+            targets.setdefault(location_key(path), []).append(file_id)
+        with self.file_manager.read_session() as cursor:
+            registered = util_query.select_registered_locations(
+                cursor, [path for path, _ in moves.values()]
+            )
+        for file_id, (path, method) in moves.items():
+            key = location_key(path)
+            if key in registered:
+                plan.conflicts.append((file_id, old_paths[file_id], "移動先は登録済みです"))
+            elif len(targets[key]) > 1:
+                plan.conflicts.append(
+                    (file_id, old_paths[file_id], "同じ移動先に複数のパスが一致しました")
+                )
+            else:
+                plan.moves.append((file_id, old_paths[file_id], path, method))
+        plan.moves.sort(key=lambda move: move[1])
+
+    def apply(self, plan: RelocationPlan, on_progress=None) -> int:
+        """検出結果でパスを一括更新
+
+        検出後にパスが変更されたファイル・移動先が登録されたファイルは更新しない
+
+        Returns:
+            int: 更新した件数
+        """
+        updated = 0
+        for start in range(0, len(plan.moves), APPLY_BATCH):
+            chunk = plan.moves[start : start + APPLY_BATCH]
+            checked_at = time.time()
+            with self.file_manager.write_session() as cursor:
+                dir_ids = util_query.intern_dirs(
+                    cursor, [split_path(move[2])[0] for move in chunk]
+                )
+                old_dir_ids = []
+                file_ids = [move[0] for move in chunk]
+                for offset in range(0, len(file_ids), util_query.IN_BATCH):
+                    ids = file_ids[offset : offset + util_query.IN_BATCH]
+                    placeholders = ",".join("?" * len(ids))
+                    cursor.execute(
+                        f"SELECT dir_id FROM file_entries WHERE id IN ({placeholders})",
+                        ids,
+                    )
+                    old_dir_ids += [row[0] for row in cursor.fetchall()]
+                rows = []
+                for file_id, old_path, new_path, _ in chunk:
+                    old_dir_key, old_name_key = location_key(old_path)
+                    new_dir, new_basename = split_path(new_path)
+                    rows.append(
+                        {
+                            "id": file_id,
+                            "dir_id": dir_ids[path_key(new_dir)],
+                            "basename": new_basename,
+                            "name_key": path_key(new_basename),
+                            "old_dir_key": old_dir_key,
+                            "old_name_key": old_name_key,
+                            "old_name": os.path.basename(old_path),
+                            "new_name": os.path.basename(new_path),
+                            "checked_at": checked_at,
+                        }
+                    )
+                cursor.executemany(
+                    """
+                    UPDATE OR IGNORE file_entries
+                    SET dir_id = :dir_id,
+                        basename = :basename,
+                        name_key = :name_key,
+                        -- 名称がファイル名のままの場合は変更後のファイル名にする
+                        filename = CASE WHEN filename = :old_name
+                            THEN :new_name ELSE filename END,
+                        exists_flag = 1,
+                        link_status = 'ok',
+                        nearest_ancestor = NULL,
+                        checked_at = :checked_at
+                    WHERE id = :id
+                    AND name_key = :old_name_key
+                    AND dir_id = (SELECT id FROM dirs WHERE path_key = :old_dir_key)
+                    """,
+                    rows,
+                )
+                updated += cursor.rowcount
+                # 移動元のファイルがなくなったフォルダを削除
+                util_query.delete_orphan_dirs(cursor, old_dir_ids)
+            if on_progress:
+                on_progress(start + len(chunk), len(plan.moves))
+        return updated
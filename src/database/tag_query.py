@@ -0,0 +1,221 @@
+import re
+import sqlite3
+
+# 演算子
+OP_AND = "AND"
+OP_OR = "OR"
+OP_NOT = "NOT"
+OPERATORS = (OP_AND, OP_OR, OP_NOT)
+
+_TOKEN_PATTERN = re.compile(r'\s*(?:(\()|(\))|"((?:[^"]|"")*)"|([^\s()"]+))')
+
+
+class TagQuerySyntaxError(ValueError):
+    """タグ条件式の構文エラー"""
+
+
+def quote_tag(tag: str) -> str:
+    """タグ名を条件式で使える形に変換
+
+    空白・括弧・引用符を含むタグや演算子と同名のタグは引用符で囲む
+    """
+    if not tag or re.search(r'[\s()"]', tag) or tag.upper() in OPERATORS:
+        return '"' + tag.replace('"', '""') + '"'
+    return tag
+
+
+def tokenize(text: str) -> list:
+    """条件式をトークンに分割
+
+    Returns:
+        list: (種類, 値)のリスト。種類は"(", ")", "op", "tag"
+    """
+    tokens = []
+    pos = 0
+    text = text.rstrip()
+    while pos < len(text):
+        m = _TOKEN_PATTERN.match(text, pos)
+        if not m:
+            raise TagQuerySyntaxError(f"閉じられていない引用符があります: {text[pos:]}")
+        pos = m.end()
+        if m.group(1):
+            tokens.append(("(", "("))
+        elif m.group(2):
+            tokens.append((")", ")"))
+        elif m.group(3) is not None:
+            tokens.append(("tag", m.group(3).replace('""', '"')))
+        elif m.group(4).upper() in OPERATORS:
+            tokens.append(("op", m.group(4).upper()))
+        else:
+            tokens.append(("tag", m.group(4)))
+    return tokens
+
+
+class TagQuery:
+    """タグ条件式
+
+    文法:
+        expr    := and_expr (OR and_expr)*
+        and_expr:= unary ([AND] unary)*     演算子省略時はAND
+        unary   := NOT unary | "(" expr ")" | タグ名
+
+    `work AND (2024 OR draft) NOT archived` のように記述する。
+    ノードはタプルで表現する ("tag", 名前) / ("and", 左, 右) / ("or", 左, 右) / ("not", 子)
+    """
+
+    def __init__(self, tree: tuple):
+        self.tree = tree
+
+    @classmethod
+    def parse(cls, text: str) -> "TagQuery":
+        tokens = tokenize(text)
+        if not tokens:
+            raise TagQuerySyntaxError("条件式が空です")
+        parser = _Parser(tokens)
+        tree = parser.parse_or()
+        if parser.pos < len(tokens):
+            raise TagQuerySyntaxError(f"不正なトークンです: {tokens[parser.pos][1]}")
+        return cls(tree)
+
+    def tag_names(self) -> set:
+        """条件式に含まれるタグ名"""
+        names = set()
+
+        def walk(node):
+            if node[0] == "tag":
+                names.add(node[1])
+            else:
+                for child in node[1:]:
+                    walk(child)
+
+        walk(self.tree)
+        return names
+
+    def to_sql(self, tag_ids: dict) -> tuple:
+        """ファイルIDの集合を返すSELECT文を作成
+
+        Args:
+            tag_ids (dict): タグ名 -> タグIDのリスト
+
+        Returns:
+            tuple: (SQL, パラメータ)
+        """
+        params = []
+
+        def build(node) -> str:
+            kind = node[0]
+            if kind == "tag":
+                ids = tag_ids.get(node[1], [])
+                if not ids:
+                    return "SELECT file_id FROM file_tags WHERE 0"
+                params.extend(ids)
+                placeholders = ",".join("?" * len(ids))
+                return f"SELECT file_id FROM file_tags WHERE tag_id IN ({placeholders})"
+            if kind == "not":
+                return (
+                    "SELECT id FROM file_entries "
+                    f"EXCEPT SELECT * FROM ({build(node[1])})"
+                )
+            left, right = node[1], node[2]
+            if kind == "and" and right[0] == "not":
+                # A AND NOT B は差集合で評価
+                return (
+                    f"SELECT * FROM ({build(left)}) "
+                    f"EXCEPT SELECT * FROM ({build(right[1])})"
+                )
+            op = "INTERSECT" if kind == "and" else "UNION"
+            return f"SELECT * FROM ({build(left)}) {op} SELECT * FROM ({build(right)})"
+
+        sql = build(self.tree)
+        return sql, params
+
+
+class _Parser:
+    def __init__(self, tokens: list):
+        self.tokens = tokens
+        self.pos = 0
+
+    def peek(self):
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else (None, None)
+
+    def next(self):
+        token = self.peek()
+        self.pos += 1
+        return token
+
+    def parse_or(self):
+        node = self.parse_and()
+        while self.peek() == ("op", OP_OR):
+            self.next()
+            node = ("or", node, self.parse_and())
+        return node
+
+    def parse_and(self):
+        node = self.parse_unary()
+        while True:
+            kind, value = self.peek()
+            if (kind, value) == ("op", OP_AND):
+                self.next()
+            elif kind not in ("tag", "(") and (kind, value) != ("op", OP_NOT):
+                return node
+            node = ("and", node, self.parse_unary())
+
+    def parse_unary(self):
+        kind, value = self.next()
+        if (kind, value) == ("op", OP_NOT):
+            return ("not", self.parse_unary())
+        if kind == "(":
+            node = self.parse_or()
+            if self.next()[0] != ")":
+                raise TagQuerySyntaxError("括弧が閉じられていません")
+            return node
+        if kind == "tag":
+            return ("tag", value)
+        if kind is None:
+            raise TagQuerySyntaxError("条件式が途中で終わっています")
+        raise TagQuerySyntaxError(f"不正なトークンです: {value}")
+
+
+def resolve_tag_ids(cursor: sqlite3.Cursor, names: set) -> dict:
+    """タグ名をタグIDに変換(大文字小文字は区別しない)
+
+    Returns:
+        dict: タグ名 -> タグIDのリスト
+    """
+    tag_ids = {}
+    if not names:
+        return tag_ids
+    names = sorted(names)
+    values = ",".join(["(?)"] * len(names))
+    cursor.execute(
+        f"""
+        WITH q(name) AS (VALUES {values})
+        SELECT q.name, t.id
+        FROM q
+        -- 式インデックス(idx_tag_mng_tag_name_lower)と同じ式で比較する
+        JOIN tag_mng t ON LOWER(t.tag_name) = LOWER(q.name)
+        """,
+        names,
+    )
+    for name, tag_id in cursor.fetchall():
+        tag_ids.setdefault(name, []).append(tag_id)
+    return tag_ids
+
+
+def tag_condition(cursor: sqlite3.Cursor, expression: str, alias: str = "f") -> tuple:
+    """タグ条件式からfilesの絞り込み条件を作成
+
+    Args:
+        cursor (sqlite3.Cursor): カーソル
+        expression (str): タグ条件式
+        alias (str): filesテーブルの別名
+
+    Raises:
+        TagQuerySyntaxError: 条件式が不正な場合
+
+    Returns:
+        tuple: (WHERE句に使う条件, パラメータ)
+    """
+    query = TagQuery.parse(expression)
+    sql, params = query.to_sql(resolve_tag_ids(cursor, query.tag_names()))
+    return f"{alias}.id IN ({sql})", params
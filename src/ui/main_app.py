@@ -1,85 +1,131 @@
-import flet as ft
-from .pages.file_register import FileRegisterPage
-from .pages.file_list import FileListPage
-from database.file_manager import FileManager
-from .pages.database_info import DatabaseInfoPage
-from .pages.maintenance import MaintenancePage
-
-
-class MainApp:
-    def __init__(self):
-        self.file_manager = FileManager()
-        self.select_index_page = 0
-
-    def main(self, page: ft.Page):
-        page.title = "パス管理"
-        page.padding = 0
-        page.window_width = 1200
-        page.window_height = 600
-
-        self.file_register_page = FileRegisterPage(page, self.file_manager)
-        self.file_list_page = FileListPage(page, self.file_manager)
-        self.database_info_page = DatabaseInfoPage(page, self.file_manager)
-        self.maintenance_page = MaintenancePage(page, self.file_manager)
-
-        # ナビゲーションレール
-        self.rail = ft.NavigationRail(
-            destinations=[
-                ft.NavigationRailDestination(
-                    icon=ft.icons.UPLOAD_FILE,
-                    label_content=ft.Text("ファイル登録"),
-                ),
-                ft.NavigationRailDestination(
-                    icon=ft.icons.FILE_COPY,
-                    label_content=ft.Text("ファイル一覧"),
-                ),
-                ft.NavigationRailDestination(
-                    icon=ft.icons.STORAGE,
-                    label_content=ft.Text("DB情報"),
-                ),
-                ft.NavigationRailDestination(
-                    icon=ft.icons.SETTINGS,
-                    label_content=ft.Text("メンテナンス"),
-                ),
-            ],
-            selected_index=0,
-            on_change=lambda e: self.change_page(e),
-        )
-
-        # コンテンツエリア
-        self.content_area = ft.Container(
-            content=self.file_register_page.build(page),
-            padding=20,
-            expand=True,
-        )
-
-        # レイアウト
-        page.add(
-            ft.Row(
-                [
-                    self.rail,
-                    ft.VerticalDivider(width=1),
-                    self.content_area,
-                ],
-                expand=True,
-                spacing=0,
-            )
-        )
-
-    def change_page(self, e):
-        if self.select_index_page == e.control.selected_index:
-            return
-        self.select_index_page = e.control.selected_index
-        if self.select_index_page == 0:
-            self.content_area.content = self.file_register_page.build(self.content_area)
-        elif self.select_index_page == 1:
-            self.content_area.content = self.file_list_page.build(self.content_area)
-        elif self.select_index_page == 2:
-            self.content_area.content = self.database_info_page.build(self.content_area)
-        else:
-            self.content_area.content = self.maintenance_page.build(self.content_area)
-        self.content_area.update()
-
-    @property
-    def open_file_checkbox(self):
-        return self.maintenance_page.open_file_checkbox
+import flet as ft
+from .pages.file_register import FileRegisterPage
+from .pages.file_list import FileListPage
+from database.file_manager import FileManager
+from database.path_refresher import PathRefresher
+from .pages.database_info import DatabaseInfoPage
+from .pages.maintenance import MaintenancePage
+
+
+class MainApp:
+    def __init__(self):
+        # 移行は画面に進捗を表示して行う
+        self.file_manager = FileManager(migrate=False)
+        # 登録済みパスの情報をバックグラウンドで更新
+        self.path_refresher = PathRefresher(self.file_manager)
+        self.select_index_page = 0
+
+    def main(self, page: ft.Page):
+        page.title = "パス管理"
+        page.padding = 0
+        page.window_width = 1200
+        page.window_height = 600
+        self.migrate(page)
+        self.path_refresher.start()
+
+        # 画面は初回表示時に作成し、作成したコントロールは切り替え後も使い回す
+        self.page_factories = [
+            lambda: FileRegisterPage(page, self.file_manager),
+            lambda: FileListPage(page, self.file_manager),
+            lambda: DatabaseInfoPage(page, self.file_manager),
+            lambda: MaintenancePage(page, self.file_manager, self.path_refresher),
+        ]
+        self.pages = {}
+        self.page_views = {}
+
+        # ナビゲーションレール
+        self.rail = ft.NavigationRail(
+            destinations=[
+                ft.NavigationRailDestination(
+                    icon=ft.icons.UPLOAD_FILE,
+                    label_content=ft.Text("ファイル登録"),
+                ),
+                ft.NavigationRailDestination(
+                    icon=ft.icons.FILE_COPY,
+                    label_content=ft.Text("ファイル一覧"),
+                ),
+                ft.NavigationRailDestination(
+                    icon=ft.icons.STORAGE,
+                    label_content=ft.Text("DB情報"),
+                ),
+                ft.NavigationRailDestination(
+                    icon=ft.icons.SETTINGS,
+                    label_content=ft.Text("メンテナンス"),
+                ),
+            ],
+            selected_index=0,
+            on_change=lambda e: self.change_page(e),
+        )
+
+        # コンテンツエリア
+        self.content_area = ft.Container(
+            padding=20,
+            expand=True,
+        )
+        self.content_area.content = self.page_view(self.select_index_page)
+
+        # レイアウト
+        page.add(
+            ft.Row(
+                [
+                    self.rail,
+                    ft.VerticalDivider(width=1),
+                    self.content_area,
+                ],
+                expand=True,
+                spacing=0,
+            )
+        )
+
+    def migrate(self, page: ft.Page):
+        """DBの移行(未適用の移行がある場合は進捗を表示)"""
+        if not self.file_manager.pending_migrations():
+            self.file_manager.migrate()
+            return
+        message = ft.Text("データベースを更新しています")
+        progress_bar = ft.ProgressBar(width=500, value=0)
+        progress_text = ft.Text("")
+        page.add(
+            ft.Container(
+                content=ft.Column(
+                    [message, progress_bar, progress_text],
+                    horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+                ),
+                padding=20,
+                alignment=ft.alignment.center,
+                expand=True,
+            )
+        )
+
+        def on_progress(description: str, done: int, total: int):
+            progress_bar.value = done / total if total else None
+            progress_text.value = f"{description} ({done:,} / {total:,})"
+            page.update()
+
+        self.file_manager.migrate(on_progress)
+        page.controls.clear()
+        page.update()
+
+    def page_view(self, index: int) -> ft.Control:
+        """画面のコントロール(初回は作成、2回目以降は変更があった分だけ更新)"""
+        if index in self.page_views:
+            self.pages[index].refresh()
+        else:
+            self.pages[index] = self.page_factories[index]()
+            self.page_views[index] = self.pages[index].build(self.content_area)
+        return self.page_views[index]
+
+    def change_page(self, e):
+        if self.select_index_page == e.control.selected_index:
+            return
+        self.select_index_page = e.control.selected_index
+        self.content_area.content = self.page_view(self.select_index_page)
+        self.content_area.update()
+
+    @property
+    def maintenance_page(self):
+        return self.pages.get(3)
+
+    @property
+    def open_file_checkbox(self):
+        return self.maintenance_page.open_file_checkbox
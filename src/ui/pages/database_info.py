@@ -1,190 +1,320 @@
-import flet as ft
-import os
-
-
-class TableInfoDialog(ft.AlertDialog):
-    def __init__(self, table_name, file_manager):
-        super().__init__()
-        self.title = ft.Text(f"{table_name}テーブルの構成")
-        self.file_manager = file_manager
-
-        conn = file_manager.create_connection()
-        cursor = conn.cursor()
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns = cursor.fetchall()
-        conn.close()
-
-        # カラム情報を表形式で表示
-        column_data = ft.DataTable(
-            columns=[
-                ft.DataColumn(ft.Text("カラム名")),
-                ft.DataColumn(ft.Text("型")),
-                ft.DataColumn(ft.Text("NULL許可")),
-                ft.DataColumn(ft.Text("主キー")),
-            ],
-            rows=[
-                ft.DataRow(
-                    cells=[
-                        ft.DataCell(ft.Text(col[1])),  # カラム名
-                        ft.DataCell(ft.Text(col[2])),  # 型
-                        ft.DataCell(ft.Text("○" if col[3] == 0 else "×")),  # NULL許可
-                        ft.DataCell(ft.Text("○" if col[5] == 1 else "×")),  # 主キー
-                    ]
-                )
-                for col in columns
-            ],
-        )
-
-        self.content = column_data
-
-
-class RecordsDialog(ft.AlertDialog):
-    def __init__(self, table_name, file_manager):
-        super().__init__()
-        self.title = ft.Text(f"{table_name}テーブルのレコード")
-        self.file_manager = file_manager
-
-        conn = file_manager.create_connection()
-        cursor = conn.cursor()
-
-        # カラム名を取得
-        cursor.execute(f"PRAGMA table_info({table_name})")
-        columns = [col[1] for col in cursor.fetchall()]
-
-        # レコードを取得
-        cursor.execute(f"SELECT * FROM {table_name}")
-        records = cursor.fetchall()
-        conn.close()
-
-        # レコードを表形式で表示
-        records_data = ft.DataTable(
-            columns=[ft.DataColumn(ft.Text(col)) for col in columns],
-            rows=[
-                ft.DataRow(cells=[ft.DataCell(ft.Text(str(value))) for value in record])
-                for record in records
-            ],
-        )
-        self.content = ft.Row(
-            [
-                ft.Column(
-                    controls=[records_data],
-                    scroll=ft.ScrollMode.ALWAYS,
-                    expand=True,
-                    height=450,
-                )
-            ],
-            scroll="auto",
-        )
-
-
-class TableInfoRow(ft.DataRow):
-    def __init__(self, table_name, record_count, page, file_manager):
-        # セルを作成
-        cells = [
-            ft.DataCell(
-                ft.TextButton(
-                    text=table_name,
-                    on_click=lambda _: self.show_table_info(
-                        page, table_name, file_manager
-                    ),
-                )
-            ),
-            ft.DataCell(
-                ft.TextButton(
-                    text=str(record_count),
-                    on_click=lambda _: self.show_records(
-                        page, table_name, file_manager
-                    ),
-                )
-            ),
-        ]
-        # 親クラスの初期化時にcellsを渡す
-        super().__init__(cells=cells)
-
-    def show_table_info(self, page, table_name, file_manager):
-        dialog = TableInfoDialog(table_name, file_manager)
-        page.dialog = dialog
-        dialog.open = True
-        page.update()
-
-    def show_records(self, page, table_name, file_manager):
-        dialog = RecordsDialog(table_name, file_manager)
-        page.dialog = dialog
-        dialog.open = True
-        page.update()
-
-
-class DatabaseInfoPage:
-    def __init__(self, page, file_manager):
-        self.page = page
-        self.file_manager = file_manager
-        self.init_components()
-
-    def init_components(self):
-        self.db_info = ft.Text("", size=16)
-        self.file_count = ft.Text("", size=16)
-        self.tag_count = ft.Text("", size=16)
-        self.db_path = ft.Text("", size=16)
-
-        # テーブル一覧用のDataTableを追加
-        self.table_list = ft.DataTable(
-            columns=[
-                ft.DataColumn(ft.Text("テーブル名")),
-                ft.DataColumn(ft.Text("レコード数")),
-            ],
-            rows=[],
-        )
-
-    def build(self, con: ft.Container):
-        self._update_table_list(con.page)  # テーブル一覧を更新
-        return ft.Column(
-            [
-                ft.Card(
-                    content=ft.Container(
-                        content=ft.Column(
-                            [
-                                ft.Text(
-                                    "テーブル一覧",
-                                    size=24,
-                                    weight=ft.FontWeight.BOLD,
-                                ),
-                                self.table_list,
-                            ]
-                        ),
-                        padding=20,
-                    )
-                ),
-            ],
-            spacing=20,
-        )
-
-    def _update_table_list(self, page):
-        """テーブル一覧を更新"""
-        conn = self.file_manager.create_connection()
-        with conn:
-            cursor = conn.cursor()
-            # テーブル一覧を取得
-            cursor.execute(
-                """
-                SELECT name FROM sqlite_master 
-                WHERE type='table' 
-                AND name NOT LIKE 'sqlite_%'
-            """
-            )
-            tables = cursor.fetchall()
-
-            # 各テーブルのレコード数を取得してDataTableRowsを作成
-            self.table_list.rows = []
-            for table in tables:
-                table_name = table[0]
-                cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-                count = cursor.fetchone()[0]
-                self.table_list.rows.append(
-                    TableInfoRow(table_name, count, page, self.file_manager)
-                )
-        conn.close()
-
-    def open_db_location(self, e):
-        db_path = os.path.abspath(self.file_manager.db_path)
-        if os.path.exists(db_path):
-            os.startfile(os.path.dirname(db_path))
+import flet as ft
+import os
+from database.db_executor import on_complete
+
+
+class TableInfoDialog(ft.AlertDialog):
+    def __init__(self, table_name, columns):
+        """
+        Args:
+            table_name (str): テーブル名
+            columns (list): PRAGMA table_infoの結果
+        """
+        super().__init__()
+        self.title = ft.Text(f"{table_name}テーブルの構成")
+
+        # カラム情報を表形式で表示
+        column_data = ft.DataTable(
+            columns=[
+                ft.DataColumn(ft.Text("カラム名")),
+                ft.DataColumn(ft.Text("型")),
+                ft.DataColumn(ft.Text("NULL許可")),
+                ft.DataColumn(ft.Text("主キー")),
+            ],
+            rows=[
+                ft.DataRow(
+                    cells=[
+                        ft.DataCell(ft.Text(col[1])),  # カラム名
+                        ft.DataCell(ft.Text(col[2])),  # 型
+                        ft.DataCell(ft.Text("○" if col[3] == 0 else "×")),  # NULL許可
+                        ft.DataCell(ft.Text("○" if col[5] == 1 else "×")),  # 主キー
+                    ]
+                )
+                for col in columns
+            ],
+        )
+
+        self.content = column_data
+
+
+class RecordsDialog(ft.AlertDialog):
+    """テーブルのレコードを1ページずつ表示
+
+    キーセットページングで表示中のページだけを取得・描画する
+    """
+
+    def __init__(self, table_name, columns, file_manager):
+        """
+        Args:
+            table_name (str): テーブル名
+            columns (list): カラム名のリスト
+            file_manager (FileManager): DB管理
+        """
+        super().__init__()
+        self.table_name = table_name
+        self.columns = columns
+        self.file_manager = file_manager
+        # 絞り込み条件 カラム名 -> 文字列
+        self.filters = {}
+        # 表示したページの(前ページの最終行のキー, 開始キー)
+        self.page_cursors = [(None, None)]
+        self.next_after = None
+        self.title = ft.Text(f"{table_name}テーブルのレコード")
+
+        self.filter_column = ft.Dropdown(
+            label="カラム",
+            options=[ft.dropdown.Option(col) for col in columns],
+            value=columns[0] if columns else None,
+            width=180,
+        )
+        self.filter_text = ft.TextField(
+            label="含む文字列", width=200, on_submit=self.add_filter
+        )
+        self.filter_chips = ft.Row([], wrap=True)
+        self.jump_key = ft.TextField(
+            label="IDで移動", width=120, on_submit=self.jump_to_key
+        )
+        self.prev_button = ft.IconButton(
+            icon=ft.icons.NAVIGATE_BEFORE, on_click=self.prev_page, disabled=True
+        )
+        self.next_button = ft.IconButton(
+            icon=ft.icons.NAVIGATE_NEXT, on_click=self.next_page, disabled=True
+        )
+        self.status = ft.Text("")
+        self.records_data = ft.DataTable(
+            columns=[ft.DataColumn(ft.Text(col)) for col in columns],
+            rows=[],
+        )
+        self.content = ft.Column(
+            [
+                ft.Row(
+                    [
+                        self.filter_column,
+                        self.filter_text,
+                        ft.IconButton(icon=ft.icons.FILTER_ALT, on_click=self.add_filter),
+                        self.jump_key,
+                        ft.IconButton(icon=ft.icons.SEARCH, on_click=self.jump_to_key),
+                    ]
+                ),
+                self.filter_chips,
+                ft.Row([self.prev_button, self.status, self.next_button]),
+                ft.Row(
+                    [
+                        ft.Column(
+                            controls=[self.records_data],
+                            scroll=ft.ScrollMode.ALWAYS,
+                            expand=True,
+                            height=400,
+                        )
+                    ],
+                    scroll="auto",
+                ),
+            ],
+            tight=True,
+        )
+        self.load_page()
+
+    def load_page(self):
+        """表示中のページを取得"""
+        after, start_key = self.page_cursors[-1]
+        self.prev_button.disabled = True
+        self.next_button.disabled = True
+
+        def loaded(result):
+            _, rows, self.next_after = result
+            self.records_data.rows = [
+                ft.DataRow(
+                    cells=[ft.DataCell(ft.Text(str(value))) for value in record[1:]]
+                )
+                for record in rows
+            ]
+            self.status.value = f"{len(self.page_cursors)}ページ目({len(rows)}件)"
+            self.prev_button.disabled = len(self.page_cursors) <= 1
+            self.next_button.disabled = self.next_after is None
+            if self.page:
+                self.update()
+
+        on_complete(
+            self.file_manager.executor.record_page(
+                self.table_name, dict(self.filters), after, start_key
+            ),
+            loaded,
+            lambda ex: self.show_status(f"取得できませんでした({ex})"),
+        )
+
+    def show_status(self, text: str):
+        self.status.value = text
+        if self.page:
+            self.status.update()
+
+    def reload(self, start_key=None):
+        """先頭(または指定したキー)のページから表示し直す"""
+        self.page_cursors = [(None, start_key)]
+        self.load_page()
+
+    def next_page(self, e):
+        if self.next_after is not None:
+            self.page_cursors.append((self.next_after, None))
+            self.load_page()
+
+    def prev_page(self, e):
+        if len(self.page_cursors) > 1:
+            self.page_cursors.pop()
+            self.load_page()
+
+    def jump_to_key(self, e):
+        text = (self.jump_key.value or "").strip()
+        if not text:
+            self.reload()
+            return
+        try:
+            start_key = int(text)
+        except ValueError:
+            self.show_status("IDは数値で入力してください")
+            return
+        self.reload(start_key)
+
+    def add_filter(self, e):
+        column = self.filter_column.value
+        text = self.filter_text.value or ""
+        if not column or not text:
+            return
+        self.filters[column] = text
+        self.filter_text.value = ""
+        self.update_filter_chips()
+        self.reload()
+
+    def remove_filter(self, column: str):
+        self.filters.pop(column, None)
+        self.update_filter_chips()
+        self.reload()
+
+    def update_filter_chips(self):
+        self.filter_chips.controls = [
+            ft.Chip(
+                label=ft.Text(f"{column}: {text}"),
+                on_delete=lambda _, column=column: self.remove_filter(column),
+            )
+            for column, text in self.filters.items()
+        ]
+
+
+class TableInfoRow(ft.DataRow):
+    def __init__(self, table_name, record_count, page, file_manager):
+        # セルを作成
+        cells = [
+            ft.DataCell(
+                ft.TextButton(
+                    text=table_name,
+                    on_click=lambda _: self.show_table_info(
+                        page, table_name, file_manager
+                    ),
+                )
+            ),
+            ft.DataCell(
+                ft.TextButton(
+                    text=str(record_count),
+                    on_click=lambda _: self.show_records(
+                        page, table_name, file_manager
+                    ),
+                )
+            ),
+        ]
+        # 親クラスの初期化時にcellsを渡す
+        super().__init__(cells=cells)
+
+    def show_table_info(self, page, table_name, file_manager):
+        on_complete(
+            file_manager.executor.table_columns(table_name),
+            lambda columns: self.show_dialog(
+                page, TableInfoDialog(table_name, columns)
+            ),
+        )
+
+    def show_records(self, page, table_name, file_manager):
+        # カラムだけ取得してダイアログを開き、レコードはページ単位で読み込む
+        on_complete(
+            file_manager.executor.table_columns(table_name),
+            lambda columns: self.show_dialog(
+                page,
+                RecordsDialog(
+                    table_name, [col[1] for col in columns], file_manager
+                ),
+            ),
+        )
+
+    def show_dialog(self, page, dialog: ft.AlertDialog):
+        page.dialog = dialog
+        dialog.open = True
+        page.update()
+
+
+class DatabaseInfoPage:
+    def __init__(self, page, file_manager):
+        self.page = page
+        self.file_manager = file_manager
+        self.init_components()
+
+    def init_components(self):
+        self.db_info = ft.Text("", size=16)
+        self.file_count = ft.Text("", size=16)
+        self.tag_count = ft.Text("", size=16)
+        self.db_path = ft.Text("", size=16)
+
+        # テーブル一覧用のDataTableを追加
+        self.table_list = ft.DataTable(
+            columns=[
+                ft.DataColumn(ft.Text("テーブル名")),
+                ft.DataColumn(ft.Text("レコード数")),
+            ],
+            rows=[],
+        )
+
+    def build(self, con: ft.Container):
+        self.loaded_generation = self.file_manager.generation
+        self._update_table_list(self.page)  # テーブル一覧を更新
+        return ft.Column(
+            [
+                ft.Card(
+                    content=ft.Container(
+                        content=ft.Column(
+                            [
+                                ft.Text(
+                                    "テーブル一覧",
+                                    size=24,
+                                    weight=ft.FontWeight.BOLD,
+                                ),
+                                self.table_list,
+                            ]
+                        ),
+                        padding=20,
+                    )
+                ),
+            ],
+            spacing=20,
+        )
+
+    def refresh(self):
+        """再表示時の更新(前回の表示以降にDBが変更された場合のみ)"""
+        if self.loaded_generation != self.file_manager.generation:
+            self.loaded_generation = self.file_manager.generation
+            self._update_table_list(self.page)
+
+    def _update_table_list(self, page):
+        """テーブル一覧を更新"""
+
+        def loaded(stats):
+            # 各テーブルのレコード数でDataTableRowsを作成
+            self.table_list.rows = [
+                TableInfoRow(table_name, count, page, self.file_manager)
+                for table_name, count in stats
+            ]
+            if self.table_list.page:
+                self.table_list.update()
+
+        on_complete(self.file_manager.executor.table_stats(), loaded)
+
+    def open_db_location(self, e):
+        db_path = os.path.abspath(self.file_manager.db_path)
+        if os.path.exists(db_path):
+            os.startfile(os.path.dirname(db_path))
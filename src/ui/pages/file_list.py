@@ -1,653 +1,1025 @@
-import flet as ft
-import os
-import util.config_manager as conf
-import common.define as define
-from util.util_query import insert_file_joined
-from util.util_conversion import str2bool
-
-
-class FileRow(ft.DataRow):
-    ACTION_EDIT = 1
-    ACTION_DELETE = 2
-
-    def __init__(
-        self,
-        file_id,
-        filename,
-        filepath,
-        tags,
-        memo,
-        reg_tags,
-        created_at,
-        page,
-        file_manager,
-        action_callback,
-    ):
-        self.file_id = file_id
-        self.filename = filename
-        self.filepath = filepath
-        self.memo = memo
-        self.tags = tags
-        self.reg_tags = reg_tags
-        self.created_at = created_at
-        self.file_manager = file_manager
-        self.page = page
-        self.action_callback: function = action_callback
-
-        self.filename_clone = filename
-        self.filepath_clone = filepath
-        self.memo_clone = memo
-        self.tags_clone = self.tags if self.tags else ""
-
-        self.file_open_type = conf.get_config(
-            define.SECTION_FILE_LIST,
-            define.KEY_FILE_OPEN,
-            define.FILE_OPEN["NONE"]["type"],
-        )
-
-        # ファイルかフォルダかでアイコンを変更
-        class IconInfo(object):
-            icon = None
-            color = None
-            tooltip = None
-
-            def __init__(self, icon, color, tooltip):
-                self.icon = icon
-                self.color = color
-                self.tooltip = tooltip
-
-        icon_info: IconInfo = (
-            IconInfo(ft.icons.FOLDER, ft.colors.AMBER, "フォルダを開く")
-            if os.path.isdir(filepath)
-            else IconInfo(
-                ft.icons.INSERT_DRIVE_FILE,
-                ft.colors.CYAN,
-                f"{define.FILE_OPEN[self.file_open_type]['text']}を開く",
-            )
-        )
-
-        cells = [
-            ft.DataCell(
-                ft.IconButton(
-                    icon=icon_info.icon,
-                    icon_color=icon_info.color,
-                    tooltip=icon_info.tooltip,
-                    on_click=lambda e: self.open_location(filepath),
-                )
-            ),
-            ft.DataCell(
-                ft.Text(
-                    filename,
-                    no_wrap=True,
-                    overflow=ft.TextOverflow.ELLIPSIS,
-                    text_align=ft.TextAlign.LEFT,
-                    size=12,
-                    tooltip=filename,
-                ),
-                on_double_tap=self.show_edit_dialog,
-            ),
-            ft.DataCell(
-                ft.Text(
-                    tags if tags else "",
-                    no_wrap=True,
-                    overflow=ft.TextOverflow.ELLIPSIS,
-                    text_align=ft.TextAlign.LEFT,
-                    width=100,
-                    size=12,
-                ),
-                on_double_tap=self.show_edit_dialog,
-            ),
-            ft.DataCell(
-                ft.TextButton(
-                    content=ft.Text(
-                        filepath,
-                        # no_wrap=True,
-                        # overflow=ft.TextOverflow.ELLIPSIS,
-                        text_align=ft.TextAlign.LEFT,
-                        size=12,
-                    ),
-                    tooltip=f"'{filepath}'をコピー",
-                    on_click=lambda e: self.copy_path(filepath),
-                    width=400,
-                    style=ft.ButtonStyle(alignment=ft.alignment.center_left),
-                ),
-                on_double_tap=self.show_edit_dialog,
-            ),
-            ft.DataCell(
-                ft.Text(
-                    memo,
-                    no_wrap=True,
-                    overflow=ft.TextOverflow.ELLIPSIS,
-                    text_align=ft.TextAlign.LEFT,
-                    size=12,
-                    tooltip=memo,
-                ),
-                on_double_tap=self.show_edit_dialog,
-            ),
-            ft.DataCell(
-                ft.IconButton(
-                    icon=ft.icons.DELETE,
-                    tooltip="削除",
-                    on_click=self.delete_row,
-                    icon_color=ft.colors.RED_400,
-                )
-            ),
-        ]
-        super().__init__(cells=cells)
-
-    def open_location(self, path):
-        def recursion_dir_path(path) -> str:
-            if not path:
-                return ""
-            elif os.path.exists(path):
-                return path
-            else:
-                return recursion_dir_path(os.path.dirname(path))
-
-        """ファイルの場所を開く"""
-        folder_path = path
-        if os.path.exists(path):
-            if os.path.isdir(path):
-                os.startfile(path)  # フォルダを直接開く
-            else:
-                folder_path = os.path.dirname(path)
-                if define.FILE_OPEN["NONE"]["type"] == self.file_open_type:
-                    os.startfile(folder_path)  # ファイルの場所を開く
-                elif define.FILE_OPEN["ONLY"]["type"] == self.file_open_type:
-                    os.startfile(path)
-                else:
-                    os.startfile(folder_path)
-                    os.startfile(path)
-        else:
-            dir_path = recursion_dir_path(path)
-            os.startfile(dir_path)
-            self.page.show_snack_bar(
-                ft.SnackBar(
-                    content=ft.Text(
-                        f"選択したパスのリンクが切れているため、有効なパス({dir_path})を表示"
-                    )
-                )
-            )
-            folder_path = dir_path
-
-    def copy_path(self, path):
-        """パスをクリップボードにコピー"""
-        self.page.set_clipboard(path)
-        self.page.show_snack_bar(ft.SnackBar(content=ft.Text("パスをコピーしました")))
-
-    def delete_row(self, e):
-        """行を削除"""
-
-        def confirm_delete(e):
-            if e.control.result:
-                conn = self.file_manager.create_connection()
-                with conn:
-                    cursor = conn.cursor()
-                    cursor.execute(
-                        "DELETE FROM file_tags WHERE file_id = ?", (self.file_id,)
-                    )
-                    cursor.execute("DELETE FROM files WHERE id = ?", (self.file_id,))
-                conn.close()
-                # ダイアログを閉じる
-                self.page.dialog.open = False
-                self.page.update()
-                self.action_callback(self.ACTION_DELETE, self.page)
-
-        # 削除確認ダイアログを表示
-        self.page.dialog = ft.AlertDialog(
-            title=ft.Text("確認"),
-            content=ft.Text("このファイル情報を削除してもよろしいですか？"),
-            actions=[
-                ft.TextButton("キャンセル", on_click=lambda e: self.close_dialog(e)),
-                ft.TextButton(
-                    "削除", on_click=lambda e: self.handle_delete(e, confirm_delete)
-                ),
-            ],
-            actions_alignment=ft.MainAxisAlignment.END,
-        )
-        self.page.dialog.open = True
-        self.page.update()
-
-    def close_dialog(self, e):
-        """ダイアログを閉じる"""
-        self.page.dialog.open = False
-        self.page.update()
-
-    def handle_delete(self, e, callback):
-        """削除処理を実行"""
-        e.control.result = True
-        callback(e)
-
-    def show_edit_dialog(self, e):
-        def file_update(e):
-            self.filename_clone = e.control.value
-
-        def path_update(e):
-            self.filepath_clone = e.control.value
-
-        def memo_update(e):
-            self.memo_clone = e.control.value
-
-        """編集ダイアログを表示"""
-        filename_field = ft.TextField(
-            label="名称", value=self.filename_clone, width=400, on_change=file_update
-        )
-        filepath_field = ft.TextField(
-            label="パス", value=self.filepath_clone, width=400, on_change=path_update
-        )
-        memo_field = ft.TextField(
-            label="メモ",
-            value=self.memo_clone,
-            width=400,
-            max_lines=3,
-            multiline=True,
-            on_change=memo_update,
-        )
-        # タグを表示するためのコンテナ
-        tags_container = ft.Container(
-            content=ft.Row(controls=[], spacing=5, wrap=True),
-            border=ft.border.all(1, ft.colors.GREY_400),
-            border_radius=5,
-            padding=10,
-            width=400,
-        )
-
-        self.update_tags_container(tags_container)
-
-        created_at_text = ft.Text(f"作成日時: {self.created_at}")
-
-        def save_changes(e):
-            if e.control.result:
-                conn = self.file_manager.create_connection()
-                with conn:
-                    cursor = conn.cursor()
-                    cursor.execute(
-                        """
-                        UPDATE files 
-                        SET filename = ?, filepath = ?, memo = ?
-                        WHERE id = ?
-                        """,
-                        (
-                            filename_field.value,
-                            filepath_field.value,
-                            memo_field.value,
-                            self.file_id,
-                        ),
-                    )
-                    cursor.execute(
-                        "DELETE FROM file_tags WHERE file_id = ?", (self.file_id,)
-                    )
-                    new_tags = [
-                        tag.strip() for tag in self.tags_clone.split(",") if tag.strip()
-                    ]
-                    for index, tag in enumerate(new_tags):
-                        insert_file_joined(cursor, self.file_id, tag, index)
-
-                conn.close()
-                # ダイアログを閉じる
-                self.page.dialog.open = False
-                self.page.update()
-                self.action_callback(self.ACTION_EDIT, self.page)
-                self.filename = self.filename_clone
-                self.filepath = self.filepath_clone
-                self.memo = self.memo_clone
-
-        def cancel():
-            self.filename_clone = self.filename
-            self.filepath_clone = self.filepath
-            self.memo_clone = self.memo
-            self.tags_clone = self.tags
-            self.close_dialog(None)
-
-        self.page.dialog = ft.AlertDialog(
-            title=ft.Text("ファイル情報の編集"),
-            content=ft.Column(
-                [
-                    created_at_text,
-                    ft.Divider(),
-                    filename_field,
-                    filepath_field,
-                    memo_field,
-                    tags_container,
-                ],
-                spacing=10,
-                width=400,
-            ),
-            actions=[
-                ft.TextButton(
-                    "保存", on_click=lambda e: self.handle_save(e, save_changes)
-                ),
-                ft.TextButton("キャンセル", on_click=lambda e: cancel()),
-            ],
-            actions_alignment=ft.MainAxisAlignment.END,
-            modal=True,
-        )
-        self.page.dialog.open = True
-        self.page.update()
-
-    def handle_save(self, e, callback):
-        """保存処理を実行"""
-        e.control.result = True
-        callback(e)
-
-    def update_tags_container(self, container: ft.Container):
-        """タグコンテナを更新"""
-        container.content.controls = [
-            ft.Chip(
-                label=ft.Text(tag.strip()),
-                on_delete=lambda e: self.remove_tag(e.control.label.value, container),
-            )
-            for tag in (self.tags_clone.split(",") if self.tags_clone else [])
-        ]
-        container.content.controls.append(
-            ft.IconButton(
-                icon=ft.icons.ADD, on_click=lambda _: self.show_tag_dialog(container)
-            )
-        )
-
-    def remove_tag(self, tag: str, container: ft.Container):
-        """タグを削除"""
-        self.tags_clone = ",".join(
-            [t for t in self.tags_clone.split(",") if t.strip() != tag]
-        )
-        self.update_tags_container(container)
-        self.page.update()
-
-    def show_tag_dialog(self, container):
-        def handle_tap(e):
-            search_bar.open_view()
-
-        def select_tag(e):
-            text = e.control.data
-            # search_bar.value = text
-            search_bar.close_view(text)
-
-        # def submit_tag(e):
-        #     e.control.close_view(e.control.value)
-        #     # self.add_tag(e.control.value, container)
-
-        """タグ追加ダイアログを表示"""
-        search_bar = ft.SearchBar(
-            bar_hint_text="新しいタグを入力",
-            # on_submit=lambda e: submit_tag(e),
-            controls=[
-                ft.ListTile(
-                    title=ft.Text(item[1] if item[1] else ""),
-                    on_click=select_tag,
-                    data=item[1] if item[1] else "",
-                )
-                for item in self.reg_tags
-            ],
-            on_tap=handle_tap,
-        )
-
-        self.page.dialog = ft.AlertDialog(
-            title=ft.Text("タグの追加"),
-            content=ft.Column([search_bar]),
-            actions=[
-                ft.TextButton(
-                    "追加", on_click=lambda e: self.add_tag(search_bar.value, container)
-                ),
-                ft.TextButton(
-                    "閉じる", on_click=lambda e: self.close_tag_dialog(e, container)
-                ),
-            ],
-        )
-        self.page.dialog.open = True
-        self.page.update()
-
-    def add_tag(self, new_tag, container: ft.Container):
-        """新しいタグを追加"""
-        if new_tag and new_tag not in self.tags_clone:
-            self.tags_clone = (
-                f"{self.tags_clone},{new_tag}" if self.tags_clone else new_tag
-            )
-            self.update_tags_container(container)
-        self.show_edit_dialog(None)
-
-    def close_tag_dialog(self, e, container: ft.Container):
-        """タグダイアログを閉じる"""
-        self.update_tags_container(container)
-        self.show_edit_dialog(e)
-
-
-class FileListPage:
-    def __init__(self, page, file_manager):
-        self.page = page
-        self.file_manager = file_manager
-        self.files = []
-        self.tags = []
-        self.sort_ascending = True
-        self.init_components()
-
-    def clear_text(self, text_field: ft.TextField):
-        text_field.value = ""
-        text_field.update()
-        self.search_files()
-
-    def init_components(self):
-        self.search_tags()
-        self.search_field = ft.TextField(
-            label="名称で検索",
-            width=300,
-            on_change=self.search_files,
-            suffix=ft.IconButton(
-                icon=ft.icons.CLEAR,
-                padding=ft.padding.all(0),
-                visual_density=ft.VisualDensity.COMPACT,
-                on_click=lambda e: self.clear_text(self.search_field),
-            ),
-            dense=True,
-        )
-
-        self.tag_filter = ft.TextField(
-            label="タグで検索",
-            width=300,
-            on_change=self.search_files,
-            suffix=ft.IconButton(
-                icon=ft.icons.CLEAR,
-                padding=ft.padding.all(0),
-                visual_density=ft.VisualDensity.COMPACT,
-                on_click=lambda e: self.clear_text(self.tag_filter),
-            ),
-            dense=True,
-        )
-
-        self.tag_view_btn = self.get_tags_view_btn()
-
-        # DataTableの設定を調整
-        self.files_table = ft.DataTable(
-            columns=[
-                ft.DataColumn(ft.Container(ft.Text("種類"), width=30)),
-                ft.DataColumn(
-                    ft.Container(ft.Text("名称"), width=120),
-                    on_sort=self.sort_function,
-                ),
-                ft.DataColumn(
-                    ft.Container(ft.Text("タグ"), width=100),
-                    on_sort=self.sort_function,
-                ),
-                ft.DataColumn(
-                    ft.Container(ft.Text("パス"), width=400),
-                    on_sort=self.sort_function,
-                ),
-                ft.DataColumn(
-                    ft.Container(ft.Text("メモ"), width=250),
-                    on_sort=self.sort_function,
-                ),
-                ft.DataColumn(ft.Container(ft.Text("操作"), width=50)),
-            ],
-            rows=[],
-            horizontal_margin=10,
-            horizontal_lines=ft.BorderSide(1, ft.colors.GREY_300),
-            # ソート関連のパラメータ
-            sort_column_index=1,  # デフォルトでソートする列のインデックス
-            sort_ascending=True,  # デフォルトの昇順/降順
-            border=ft.border.all(1, ft.colors.GREY_200),
-            column_spacing=10,
-        )
-
-    def build(self, con: ft.Container):
-        self.search_tags()
-        self.search_files()
-        self.content_area = con
-        self.tag_view_btn = self.get_tags_view_btn()
-        self.set_files_table()
-        return ft.Container(  # Containerでラップ
-            content=ft.Column(
-                [
-                    ft.Row(
-                        [self.search_field, self.tag_filter, self.tag_view_btn],
-                        alignment=ft.MainAxisAlignment.START,  # 左寄せ
-                    ),
-                    ft.Row(
-                        [
-                            ft.Column(
-                                controls=[self.files_table],
-                                scroll=ft.ScrollMode.ALWAYS,
-                                expand=True,
-                                height=450,
-                            )
-                        ],
-                        scroll="auto",
-                    ),
-                ],
-                spacing=20,  # 要素間の間隔を設定
-                expand=True,
-                alignment=ft.MainAxisAlignment.START,  # 上寄せ
-            ),
-            expand=True,
-        )
-
-    def search_files(self, page=None):
-        """検索条件でファイル一覧を絞り込み"""
-        search_text = self.search_field.value.lower()
-        tag_text = self.tag_filter.value.lower()
-
-        conn = self.file_manager.create_connection()
-        with conn:
-            cursor = conn.cursor()
-            query = """
-                SELECT 
-                    f.id, 
-                    f.filename, 
-                    f.filepath, 
-                    GROUP_CONCAT(t.tag_name) as tags,
-                    f.memo,
-                    f.created_at
-                FROM files f
-                LEFT JOIN file_tags j ON f.id = j.file_id
-                LEFT JOIN tag_mng t ON j.tag_id = t.id
-                GROUP BY f.id
-                HAVING (? = '' OR LOWER(f.filename) LIKE ?)
-                AND (? = '' OR LOWER(tags) LIKE ?)
-                ORDER BY f.filename, j.number_of
-            """
-            cursor.execute(
-                query, (search_text, f"%{search_text}%", tag_text, f"%{tag_text}%")
-            )
-            self.files = cursor.fetchall()
-
-        conn.close()
-        # 検索結果でテーブルを更新
-        self.set_files_table()
-
-    def sort_function(self, e):
-        if e.control.parent.sort_column_index != e.column_index:
-            e.control.parent.__setattr__("sort_ascending", False)
-            e.control.parent.update()
-
-        self.files.sort(
-            key=lambda x: x[e.column_index] if x[e.column_index] else "",
-            reverse=e.control.parent.sort_ascending,
-        )
-        # 検索結果でテーブルを更新
-        self.set_files_table()
-        # インデックス更新
-        e.control.parent.__setattr__("sort_column_index", e.column_index)
-
-        # フラグ更新
-        (
-            e.control.parent.__setattr__("sort_ascending", False)
-            if e.control.parent.sort_ascending
-            else e.control.parent.__setattr__("sort_ascending", True)
-        )
-        e.control.parent.update()
-
-    def search_tags(self, page=None):
-        conn = self.file_manager.create_connection()
-        with conn:
-            cursor = conn.cursor()
-            query = """
-                SELECT 
-                    mng.id, 
-                    mng.tag_name
-                FROM tag_mng mng
-                ORDER BY mng.tag_name
-            """
-            cursor.execute(
-                query,
-            )
-            self.tags = cursor.fetchall()
-        conn.close()
-
-    def set_files_table(self):
-        # 検索結果でテーブルを更新
-        self.files_table.rows = [
-            FileRow(
-                file_id=file[0],
-                filename=file[1],
-                filepath=file[2],
-                tags=file[3],
-                memo=file[4],
-                reg_tags=self.tags,
-                created_at=file[5],
-                page=self.files_table.page,
-                file_manager=self.file_manager,
-                action_callback=self.wrap_action,
-            )
-            for file in self.files
-        ]
-        if self.files_table.page:
-            self.files_table.update()
-
-    def get_tags_view_btn(self):
-        # タグ一覧のPopupMenuButtonを更新
-        def tag_select(text):
-            self.tag_filter.value = text
-            self.tag_filter.update()
-            self.search_files()
-
-        # def tag_open():
-        #     print("押下")
-        #     self.search_tags()
-        #     self.tag_view_btn = self.get_tags_view_btn()
-        #     self.tag_view_btn.update()
-
-        return ft.PopupMenuButton(
-            content=ft.Icon(name=ft.icons.FILTER_LIST_ALT),
-            items=[
-                ft.PopupMenuItem(
-                    content=ft.Row(
-                        [
-                            ft.Icon(name=ft.icons.TAG, size=12),
-                            ft.Text(value=tag[1], color=ft.colors.PRIMARY, size=12),
-                        ],
-                        vertical_alignment=ft.CrossAxisAlignment.END,
-                    ),
-                    height=30,
-                    on_click=lambda e: tag_select(e.control.content.controls[1].value),
-                )
-                for tag in self.tags
-            ],
-            # on_open=lambda e: tag_open(),
-        )
-
-    def wrap_action(self, action, page: ft.Page):
-        # FileRowクラスのaction_callbackのラッパー
-        if action == FileRow.ACTION_EDIT:
-            pass
-        elif action == FileRow.ACTION_DELETE:
-            pass
-        self.search_files()
-        page.update()
+import flet as ft
+import os
+import sqlite3
+import time
+import util.config_manager as conf
+import common.define as define
+from database.db_executor import on_complete
+from database.file_search import (
+    SEARCH_TARGETS,
+    SORT_MEMO,
+    SORT_MTIME,
+    SORT_NAME,
+    SORT_PATH,
+    SORT_SIZE,
+    SORT_TAGS,
+    TARGET_NAME,
+    LINK_UNCHECKED,
+    FileQuery,
+    fetch_file_page,
+)
+from database.tag_query import TagQuerySyntaxError, quote_tag
+from util.path_info import (
+    KIND_DIR,
+    KIND_FILE,
+    LINK_MISSING,
+    LINK_STATUS_TEXT,
+    format_mtime,
+    format_size,
+)
+from util.search_scheduler import SearchScheduler
+
+
+# 行の高さ(px)。仮想スクロールの位置計算に使うため全行固定
+ROW_HEIGHT = 40
+# 列定義 (見出し, 幅)
+COLUMNS = [
+    ("種類", 30),
+    ("名称", 120),
+    ("タグ", 100),
+    ("パス", 320),
+    ("メモ", 200),
+    ("サイズ", 70),
+    ("更新日時", 110),
+    ("操作", 50),
+]
+
+MB = 1024 * 1024
+DAY = 24 * 60 * 60
+# サイズの絞り込み  キー -> (表示名, (下限, 上限未満))
+SIZE_FILTERS = {
+    "": ("指定なし", (None, None)),
+    "small": ("1MB未満", (0, MB)),
+    "medium": ("1MB～100MB", (MB, 100 * MB)),
+    "large": ("100MB以上", (100 * MB, None)),
+}
+# 更新日時の絞り込み  キー -> (表示名, (何日前以降, 何日前より前))
+MTIME_FILTERS = {
+    "": ("指定なし", (None, None)),
+    "day": ("24時間以内", (1, None)),
+    "week": ("7日以内", (7, None)),
+    "month": ("30日以内", (30, None)),
+    "year": ("1年以内", (365, None)),
+    "old": ("1年以上前", (None, 365)),
+}
+# リンク状態の絞り込み  キー -> 表示名
+LINK_FILTERS = {"": "指定なし", **LINK_STATUS_TEXT, LINK_UNCHECKED: "未確認"}
+
+
+class FileRow(ft.Container):
+    """ファイル一覧の1行
+
+    表示範囲の行だけを生成し、スクロール時はbindで表示内容を差し替えて再利用する
+    """
+
+    ACTION_EDIT = 1
+    ACTION_DELETE = 2
+
+    def __init__(
+        self,
+        page,
+        file_manager,
+        action_callback,
+    ):
+        self.file_id = None
+        self.filename = ""
+        self.filepath = ""
+        self.memo = ""
+        self.tags = ""
+        self.reg_tags = []
+        self.created_at = None
+        self.link_status = None
+        self.nearest_ancestor = None
+        self.file_manager = file_manager
+        self.action_callback: function = action_callback
+        self.file_open_type = define.FILE_OPEN["NONE"]["type"]
+
+        self.filename_clone = ""
+        self.filepath_clone = ""
+        self.memo_clone = ""
+        self.tags_clone = ""
+
+        self.kind_button = ft.IconButton(
+            on_click=lambda e: self.open_location(self.filepath),
+        )
+        self.filename_text = ft.Text(
+            no_wrap=True,
+            overflow=ft.TextOverflow.ELLIPSIS,
+            text_align=ft.TextAlign.LEFT,
+            size=12,
+        )
+        self.tags_text = ft.Text(
+            no_wrap=True,
+            overflow=ft.TextOverflow.ELLIPSIS,
+            text_align=ft.TextAlign.LEFT,
+            size=12,
+        )
+        self.filepath_text = ft.Text(
+            no_wrap=True,
+            overflow=ft.TextOverflow.ELLIPSIS,
+            text_align=ft.TextAlign.LEFT,
+            size=12,
+        )
+        self.filepath_button = ft.TextButton(
+            content=self.filepath_text,
+            on_click=lambda e: self.copy_path(self.filepath),
+            style=ft.ButtonStyle(alignment=ft.alignment.center_left),
+        )
+        self.memo_text = ft.Text(
+            no_wrap=True,
+            overflow=ft.TextOverflow.ELLIPSIS,
+            text_align=ft.TextAlign.LEFT,
+            size=12,
+        )
+        self.size_text = ft.Text(text_align=ft.TextAlign.RIGHT, size=12)
+        self.mtime_text = ft.Text(size=12)
+        delete_button = ft.IconButton(
+            icon=ft.icons.DELETE,
+            tooltip="削除",
+            on_click=self.delete_row,
+            icon_color=ft.colors.RED_400,
+        )
+
+        def cell(content, index, editable=False):
+            control = ft.Container(content=content, width=COLUMNS[index][1])
+            if editable:
+                # ダブルタップで編集
+                control = ft.GestureDetector(
+                    content=control, on_double_tap=self.show_edit_dialog
+                )
+            return control
+
+        super().__init__(
+            content=ft.Row(
+                [
+                    cell(self.kind_button, 0),
+                    cell(self.filename_text, 1, True),
+                    cell(self.tags_text, 2, True),
+                    cell(self.filepath_button, 3, True),
+                    cell(self.memo_text, 4, True),
+                    cell(self.size_text, 5),
+                    cell(self.mtime_text, 6),
+                    cell(delete_button, 7),
+                ],
+                spacing=10,
+            ),
+            height=ROW_HEIGHT,
+            padding=ft.padding.symmetric(horizontal=10),
+            border=ft.border.only(bottom=ft.BorderSide(1, ft.colors.GREY_300)),
+        )
+        self.page = page
+
+    def bind(self, file, reg_tags: list, file_open_type: str):
+        """表示するファイル情報を設定
+
+        ファイルシステムにはアクセスせず、DBに保持したパス情報で表示する
+
+        Args:
+            file (tuple): (id, filename, filepath, tags, memo, created_at,
+                           kind, size, mtime, exists_flag,
+                           link_status, nearest_ancestor, ...)
+            reg_tags (list): 登録済みタグ一覧
+            file_open_type (str): ファイルオープン設定
+        """
+        (
+            file_id,
+            filename,
+            filepath,
+            tags,
+            memo,
+            created_at,
+            kind,
+            size,
+            mtime,
+            exists_flag,
+            link_status,
+            ancestor,
+        ) = file[:12]
+        self.file_id = file_id
+        self.filename = filename
+        self.filepath = filepath
+        self.memo = memo
+        self.tags = tags
+        self.reg_tags = reg_tags
+        self.created_at = created_at
+        self.link_status = link_status
+        self.nearest_ancestor = ancestor
+        self.file_open_type = file_open_type
+
+        self.filename_clone = filename
+        self.filepath_clone = filepath
+        self.memo_clone = memo
+        self.tags_clone = self.tags if self.tags else ""
+
+        # ファイルかフォルダかでアイコンを変更
+        if link_status == LINK_MISSING or exists_flag == 0:
+            self.kind_button.icon = ft.icons.LINK_OFF
+            self.kind_button.icon_color = ft.colors.RED_400
+            self.kind_button.tooltip = (
+                f"リンク切れ({ancestor}を開く)"
+                if ancestor
+                else "リンク切れ(有効な親フォルダを開く)"
+            )
+        elif link_status in LINK_STATUS_TEXT and exists_flag is None:
+            # タイムアウト・アクセスエラーで確認できなかった
+            self.kind_button.icon = ft.icons.SYNC_PROBLEM
+            self.kind_button.icon_color = ft.colors.ORANGE_400
+            self.kind_button.tooltip = (
+                f"確認できませんでした({LINK_STATUS_TEXT[link_status]})"
+            )
+        elif kind == KIND_DIR:
+            self.kind_button.icon = ft.icons.FOLDER
+            self.kind_button.icon_color = ft.colors.AMBER
+            self.kind_button.tooltip = "フォルダを開く"
+        elif kind == KIND_FILE:
+            self.kind_button.icon = ft.icons.INSERT_DRIVE_FILE
+            self.kind_button.icon_color = ft.colors.CYAN
+            self.kind_button.tooltip = (
+                f"{define.FILE_OPEN[self.file_open_type]['text']}を開く"
+            )
+        else:
+            # バックグラウンドでの確認待ち
+            self.kind_button.icon = ft.icons.HELP_OUTLINE
+            self.kind_button.icon_color = ft.colors.GREY_400
+            self.kind_button.tooltip = "開く"
+        self.filename_text.value = filename
+        self.filename_text.tooltip = filename
+        self.tags_text.value = tags if tags else ""
+        self.filepath_text.value = filepath
+        self.filepath_button.tooltip = f"'{filepath}'をコピー"
+        self.memo_text.value = memo
+        self.memo_text.tooltip = memo
+        self.size_text.value = format_size(size)
+        self.mtime_text.value = format_mtime(mtime)
+        self.visible = True
+
+    def open_location(self, path):
+        def recursion_dir_path(path) -> str:
+            if not path:
+                return ""
+            elif os.path.exists(path):
+                return path
+            else:
+                return recursion_dir_path(os.path.dirname(path))
+
+        """ファイルの場所を開く"""
+        folder_path = path
+        if os.path.exists(path):
+            if os.path.isdir(path):
+                os.startfile(path)  # フォルダを直接開く
+            else:
+                folder_path = os.path.dirname(path)
+                if define.FILE_OPEN["NONE"]["type"] == self.file_open_type:
+                    os.startfile(folder_path)  # ファイルの場所を開く
+                elif define.FILE_OPEN["ONLY"]["type"] == self.file_open_type:
+                    os.startfile(path)
+                else:
+                    os.startfile(folder_path)
+                    os.startfile(path)
+        else:
+            # リンク切れ確認で保存した親フォルダを優先して使う
+            dir_path = (
+                self.nearest_ancestor
+                if self.nearest_ancestor and os.path.exists(self.nearest_ancestor)
+                else recursion_dir_path(path)
+            )
+            os.startfile(dir_path)
+            self.page.show_snack_bar(
+                ft.SnackBar(
+                    content=ft.Text(
+                        f"選択したパスのリンクが切れているため、有効なパス({dir_path})を表示"
+                    )
+                )
+            )
+            folder_path = dir_path
+
+    def copy_path(self, path):
+        """パスをクリップボードにコピー"""
+        self.page.set_clipboard(path)
+        self.page.show_snack_bar(ft.SnackBar(content=ft.Text("パスをコピーしました")))
+
+    def delete_row(self, e):
+        """行を削除"""
+
+        def confirm_delete(e):
+            if e.control.result:
+                # 完了までに行が別のファイルに再利用される場合があるためIDを保持
+                file_id = self.file_id
+
+                def deleted(_):
+                    # ダイアログを閉じる
+                    self.page.dialog.open = False
+                    self.page.update()
+                    self.action_callback(self.ACTION_DELETE, file_id)
+
+                on_complete(
+                    self.file_manager.executor.delete_file(file_id),
+                    deleted,
+                    self.show_error,
+                )
+
+        # 削除確認ダイアログを表示
+        self.page.dialog = ft.AlertDialog(
+            title=ft.Text("確認"),
+            content=ft.Text("このファイル情報を削除してもよろしいですか？"),
+            actions=[
+                ft.TextButton("キャンセル", on_click=lambda e: self.close_dialog(e)),
+                ft.TextButton(
+                    "削除", on_click=lambda e: self.handle_delete(e, confirm_delete)
+                ),
+            ],
+            actions_alignment=ft.MainAxisAlignment.END,
+        )
+        self.page.dialog.open = True
+        self.page.update()
+
+    def show_error(self, ex: Exception):
+        """DB処理の失敗を通知"""
+        self.page.show_snack_bar(
+            ft.SnackBar(content=ft.Text(f"処理に失敗しました({ex})"))
+        )
+
+    def close_dialog(self, e):
+        """ダイアログを閉じる"""
+        self.page.dialog.open = False
+        self.page.update()
+
+    def handle_delete(self, e, callback):
+        """削除処理を実行"""
+        e.control.result = True
+        callback(e)
+
+    def show_edit_dialog(self, e):
+        def file_update(e):
+            self.filename_clone = e.control.value
+
+        def path_update(e):
+            self.filepath_clone = e.control.value
+
+        def memo_update(e):
+            self.memo_clone = e.control.value
+
+        """編集ダイアログを表示"""
+        filename_field = ft.TextField(
+            label="名称", value=self.filename_clone, width=400, on_change=file_update
+        )
+        filepath_field = ft.TextField(
+            label="パス", value=self.filepath_clone, width=400, on_change=path_update
+        )
+        memo_field = ft.TextField(
+            label="メモ",
+            value=self.memo_clone,
+            width=400,
+            max_lines=3,
+            multiline=True,
+            on_change=memo_update,
+        )
+        # タグを表示するためのコンテナ
+        tags_container = ft.Container(
+            content=ft.Row(controls=[], spacing=5, wrap=True),
+            border=ft.border.all(1, ft.colors.GREY_400),
+            border_radius=5,
+            padding=10,
+            width=400,
+        )
+
+        self.update_tags_container(tags_container)
+
+        created_at_text = ft.Text(f"作成日時: {self.created_at}")
+
+        def save_changes(e):
+            if e.control.result:
+                new_tags = [
+                    tag.strip() for tag in self.tags_clone.split(",") if tag.strip()
+                ]
+                file_id = self.file_id
+                values = (
+                    filename_field.value,
+                    filepath_field.value,
+                    ",".join(new_tags),
+                    memo_field.value,
+                )
+
+                def saved(_):
+                    # ダイアログを閉じる
+                    self.page.dialog.open = False
+                    self.page.update()
+                    self.action_callback(self.ACTION_EDIT, file_id, values)
+
+                def failed(ex):
+                    if isinstance(ex, sqlite3.IntegrityError):
+                        # 変更後のパスが他のファイルで登録済み
+                        filepath_field.error_text = "登録済みのパスです"
+                        filepath_field.update()
+                    else:
+                        self.show_error(ex)
+
+                on_complete(
+                    self.file_manager.executor.update_file(
+                        file_id,
+                        filename_field.value,
+                        filepath_field.value,
+                        memo_field.value,
+                        new_tags,
+                    ),
+                    saved,
+                    failed,
+                )
+
+        def cancel():
+            self.filename_clone = self.filename
+            self.filepath_clone = self.filepath
+            self.memo_clone = self.memo
+            self.tags_clone = self.tags
+            self.close_dialog(None)
+
+        self.page.dialog = ft.AlertDialog(
+            title=ft.Text("ファイル情報の編集"),
+            content=ft.Column(
+                [
+                    created_at_text,
+                    ft.Divider(),
+                    filename_field,
+                    filepath_field,
+                    memo_field,
+                    tags_container,
+                ],
+                spacing=10,
+                width=400,
+            ),
+            actions=[
+                ft.TextButton(
+                    "保存", on_click=lambda e: self.handle_save(e, save_changes)
+                ),
+                ft.TextButton("キャンセル", on_click=lambda e: cancel()),
+            ],
+            actions_alignment=ft.MainAxisAlignment.END,
+            modal=True,
+        )
+        self.page.dialog.open = True
+        self.page.update()
+
+    def handle_save(self, e, callback):
+        """保存処理を実行"""
+        e.control.result = True
+        callback(e)
+
+    def update_tags_container(self, container: ft.Container):
+        """タグコンテナを更新"""
+        container.content.controls = [
+            ft.Chip(
+                label=ft.Text(tag.strip()),
+                on_delete=lambda e: self.remove_tag(e.control.label.value, container),
+            )
+            for tag in (self.tags_clone.split(",") if self.tags_clone else [])
+        ]
+        container.content.controls.append(
+            ft.IconButton(
+                icon=ft.icons.ADD, on_click=lambda _: self.show_tag_dialog(container)
+            )
+        )
+
+    def remove_tag(self, tag: str, container: ft.Container):
+        """タグを削除"""
+        self.tags_clone = ",".join(
+            [t for t in self.tags_clone.split(",") if t.strip() != tag]
+        )
+        self.update_tags_container(container)
+        self.page.update()
+
+    def show_tag_dialog(self, container):
+        def handle_tap(e):
+            search_bar.open_view()
+
+        def select_tag(e):
+            text = e.control.data
+            # search_bar.value = text
+            search_bar.close_view(text)
+
+        # def submit_tag(e):
+        #     e.control.close_view(e.control.value)
+        #     # self.add_tag(e.control.value, container)
+
+        """タグ追加ダイアログを表示"""
+        search_bar = ft.SearchBar(
+            bar_hint_text="新しいタグを入力",
+            # on_submit=lambda e: submit_tag(e),
+            controls=[
+                ft.ListTile(
+                    title=ft.Text(item[1] if item[1] else ""),
+                    on_click=select_tag,
+                    data=item[1] if item[1] else "",
+                )
+                for item in self.reg_tags
+            ],
+            on_tap=handle_tap,
+        )
+
+        self.page.dialog = ft.AlertDialog(
+            title=ft.Text("タグの追加"),
+            content=ft.Column([search_bar]),
+            actions=[
+                ft.TextButton(
+                    "追加", on_click=lambda e: self.add_tag(search_bar.value, container)
+                ),
+                ft.TextButton(
+                    "閉じる", on_click=lambda e: self.close_tag_dialog(e, container)
+                ),
+            ],
+        )
+        self.page.dialog.open = True
+        self.page.update()
+
+    def add_tag(self, new_tag, container: ft.Container):
+        """新しいタグを追加"""
+        if new_tag and new_tag not in self.tags_clone:
+            self.tags_clone = (
+                f"{self.tags_clone},{new_tag}" if self.tags_clone else new_tag
+            )
+            self.update_tags_container(container)
+        self.show_edit_dialog(None)
+
+    def close_tag_dialog(self, e, container: ft.Container):
+        """タグダイアログを閉じる"""
+        self.update_tags_container(container)
+        self.show_edit_dialog(e)
+
+
+class FileListPage:
+    # 列インデックス -> 並び替え項目
+    SORT_COLUMNS = {
+        1: SORT_NAME,
+        2: SORT_TAGS,
+        3: SORT_PATH,
+        4: SORT_MEMO,
+        5: SORT_SIZE,
+        6: SORT_MTIME,
+    }
+    # 末尾からこの距離(px)までスクロールしたら次ページを読み込む
+    LOAD_MORE_THRESHOLD = 200
+    # 一覧の表示領域の高さ(px)
+    VIEWPORT_HEIGHT = 450
+    # 表示範囲の前後に余分に描画する行数
+    OVERSCAN = 5
+
+    def __init__(self, page, file_manager):
+        self.page = page
+        self.file_manager = file_manager
+        self.files = []
+        self.tags = []
+        self.sort_column_index = 1
+        self.sort_ascending = True
+        # 読み込み中の検索条件と次ページのカーソル
+        self.query = None
+        self.next_cursor = None
+        self.loading = False
+        # 描画中の先頭行のインデックス
+        self.first_index = 0
+        self.file_open_type = conf.store.get(
+            define.SECTION_FILE_LIST,
+            define.KEY_FILE_OPEN,
+            define.FILE_OPEN["NONE"]["type"],
+        )
+        self.init_components()
+
+    def clear_text(self, text_field: ft.TextField):
+        text_field.value = ""
+        text_field.update()
+        self.search_files()
+
+    def init_components(self):
+        self.search_scheduler = SearchScheduler(
+            self.query_files,
+            self.apply_search_result,
+            self.on_search_error,
+            submit=self.file_manager.executor.submit_read,
+        )
+        self.search_target = ft.Dropdown(
+            value=TARGET_NAME,
+            options=[
+                ft.dropdown.Option(key=key, text=text)
+                for key, text in SEARCH_TARGETS.items()
+            ],
+            width=100,
+            dense=True,
+            on_change=self.search_files,
+        )
+        self.search_field = ft.TextField(
+            label="キーワードで検索",
+            width=300,
+            on_change=self.on_search_change,
+            suffix=ft.IconButton(
+                icon=ft.icons.CLEAR,
+                padding=ft.padding.all(0),
+                visual_density=ft.VisualDensity.COMPACT,
+                on_click=lambda e: self.clear_text(self.search_field),
+            ),
+            dense=True,
+        )
+
+        self.tag_filter = ft.TextField(
+            label="タグで検索",
+            hint_text="例: work AND (2024 OR draft) NOT archived",
+            width=300,
+            on_change=self.on_search_change,
+            suffix=ft.IconButton(
+                icon=ft.icons.CLEAR,
+                padding=ft.padding.all(0),
+                visual_density=ft.VisualDensity.COMPACT,
+                on_click=lambda e: self.clear_text(self.tag_filter),
+            ),
+            dense=True,
+        )
+
+        self.tag_view_btn = self.get_tags_view_btn()
+        self.search_tags()
+
+        # サイズ・更新日時の絞り込み
+        self.size_filter = ft.Dropdown(
+            label="サイズ",
+            value="",
+            options=[
+                ft.dropdown.Option(key=key, text=text)
+                for key, (text, _) in SIZE_FILTERS.items()
+            ],
+            width=130,
+            dense=True,
+            on_change=self.search_files,
+        )
+        self.link_filter = ft.Dropdown(
+            label="リンク",
+            value="",
+            options=[
+                ft.dropdown.Option(key=key, text=text)
+                for key, text in LINK_FILTERS.items()
+            ],
+            width=130,
+            dense=True,
+            on_change=self.search_files,
+        )
+        self.mtime_filter = ft.Dropdown(
+            label="更新日時",
+            value="",
+            options=[
+                ft.dropdown.Option(key=key, text=text)
+                for key, (text, _) in MTIME_FILTERS.items()
+            ],
+            width=130,
+            dense=True,
+            on_change=self.search_files,
+        )
+
+        # 見出し行
+        self.sort_icons = {}
+        header_cells = []
+        for index, (label, width) in enumerate(COLUMNS):
+            if index in self.SORT_COLUMNS:
+                self.sort_icons[index] = ft.Icon(size=14)
+                content = ft.TextButton(
+                    content=ft.Row(
+                        [ft.Text(label), self.sort_icons[index]], spacing=2
+                    ),
+                    data=index,
+                    on_click=self.sort_function,
+                    style=ft.ButtonStyle(padding=0),
+                )
+            else:
+                content = ft.Text(label)
+            header_cells.append(ft.Container(content=content, width=width))
+        self.files_header = ft.Container(
+            content=ft.Row(header_cells, spacing=10),
+            padding=ft.padding.symmetric(horizontal=10),
+            border=ft.border.only(bottom=ft.BorderSide(1, ft.colors.GREY_400)),
+        )
+        self.update_sort_icons()
+
+        # 仮想スクロール
+        # 表示範囲と前後の数行分だけ行を生成し、スクロール位置に合わせて使い回す。
+        # 表示範囲外の行は上下の余白の高さで表現する
+        pool_size = -(-self.VIEWPORT_HEIGHT // ROW_HEIGHT) + self.OVERSCAN * 2
+        self.row_pool = [
+            FileRow(
+                page=self.page,
+                file_manager=self.file_manager,
+                action_callback=self.wrap_action,
+            )
+            for _ in range(pool_size)
+        ]
+        self.top_spacer = ft.Container(height=0)
+        self.bottom_spacer = ft.Container(height=0)
+        self.files_view = ft.Column(
+            controls=[self.top_spacer, *self.row_pool, self.bottom_spacer],
+            spacing=0,
+            scroll=ft.ScrollMode.ALWAYS,
+            height=self.VIEWPORT_HEIGHT,
+            on_scroll=self.on_scroll,
+            on_scroll_interval=50,
+        )
+        self.files_table = ft.Container(
+            content=ft.Column([self.files_header, self.files_view], spacing=0),
+            border=ft.border.all(1, ft.colors.GREY_200),
+        )
+
+    def build(self, con: ft.Container):
+        self.file_open_type = conf.store.get(
+            define.SECTION_FILE_LIST,
+            define.KEY_FILE_OPEN,
+            define.FILE_OPEN["NONE"]["type"],
+        )
+        self.loaded_generation = self.file_manager.generation
+        self.search_tags()
+        self.search_files()
+        self.content_area = con
+        return ft.Container(  # Containerでラップ
+            content=ft.Column(
+                [
+                    ft.Row(
+                        [
+                            self.search_target,
+                            self.search_field,
+                            self.tag_filter,
+                            self.tag_view_btn,
+                            self.size_filter,
+                            self.mtime_filter,
+                            self.link_filter,
+                        ],
+                        alignment=ft.MainAxisAlignment.START,  # 左寄せ
+                    ),
+                    ft.Row(
+                        [self.files_table],
+                        scroll="auto",
+                    ),
+                ],
+                spacing=20,  # 要素間の間隔を設定
+                expand=True,
+                alignment=ft.MainAxisAlignment.START,  # 上寄せ
+            ),
+            expand=True,
+        )
+
+    def refresh(self):
+        """再表示時の更新
+
+        前回の表示以降にDBが変更された場合のみ再検索する
+        """
+        file_open_type = conf.store.get(
+            define.SECTION_FILE_LIST,
+            define.KEY_FILE_OPEN,
+            define.FILE_OPEN["NONE"]["type"],
+        )
+        if self.loaded_generation != self.file_manager.generation:
+            self.file_open_type = file_open_type
+            self.loaded_generation = self.file_manager.generation
+            self.search_tags()
+            self.search_files()
+        elif file_open_type != self.file_open_type:
+            self.file_open_type = file_open_type
+            self.render_rows()
+
+    def current_query(self) -> FileQuery:
+        """入力中の検索条件"""
+        now = time.time()
+        after_days, before_days = MTIME_FILTERS[self.mtime_filter.value or ""][1]
+        return FileQuery(
+            text=self.search_field.value,
+            targets=(self.search_target.value,),
+            tag_expression=self.tag_filter.value,
+            sort_key=self.SORT_COLUMNS[self.sort_column_index],
+            ascending=self.sort_ascending,
+            size_range=SIZE_FILTERS[self.size_filter.value or ""][1],
+            mtime_range=(
+                now - after_days * DAY if after_days else None,
+                now - before_days * DAY if before_days else None,
+            ),
+            link_status=self.link_filter.value or "",
+        )
+
+    def query_files(self, query: FileQuery) -> tuple:
+        """先頭ページを取得
+
+        Returns:
+            tuple: (検索条件, 行のリスト, 次ページのカーソル)
+        """
+        with self.file_manager.read_session() as cursor:
+            files, next_cursor = fetch_file_page(
+                cursor, query, fts=self.file_manager.fts_enabled
+            )
+        return query, files, next_cursor
+
+    def search_files(self, page=None):
+        """検索条件でファイル一覧を絞り込み(先頭ページのみ読み込む)
+
+        待ち時間なしでバックグラウンド実行し、入力中の検索は破棄する
+        """
+        self.search_scheduler.request(self.current_query(), delay=0)
+
+    def on_search_change(self, e):
+        """入力中の検索(入力が止まってからバックグラウンドで実行)"""
+        self.search_scheduler.request(self.current_query())
+
+    def apply_search_result(self, result: tuple):
+        self.query, self.files, self.next_cursor = result
+        self.set_tag_filter_error(None)
+
+        # 検索結果でテーブルを更新
+        self.set_files_table()
+
+    def on_search_error(self, ex: Exception):
+        if isinstance(ex, TagQuerySyntaxError):
+            self.set_tag_filter_error(str(ex))
+        elif self.page:
+            self.page.show_snack_bar(
+                ft.SnackBar(content=ft.Text(f"検索に失敗しました({ex})"))
+            )
+
+    def load_more(self):
+        """次ページを読み込んで末尾に追加"""
+        query = self.query
+        if query is None or self.next_cursor is None or self.loading:
+            return
+        self.loading = True
+
+        def loaded(result):
+            self.loading = False
+            if query is not self.query:
+                # 読み込み中に検索条件が変わった
+                return
+            files, self.next_cursor = result
+            self.files.extend(files)
+            self.render_rows()
+
+        def failed(ex):
+            self.loading = False
+            self.on_search_error(ex)
+
+        on_complete(
+            self.file_manager.executor.search_files(query, after=self.next_cursor),
+            loaded,
+            failed,
+        )
+
+    def on_scroll(self, e):
+        if e.pixels >= e.max_scroll_extent - self.LOAD_MORE_THRESHOLD:
+            self.load_more()
+        first_index = self.window_start(e.pixels)
+        if first_index != self.first_index:
+            self.first_index = first_index
+            self.render_rows()
+
+    def window_start(self, pixels: float) -> int:
+        """スクロール位置から描画する先頭行のインデックスを求める"""
+        first_index = int(pixels // ROW_HEIGHT) - self.OVERSCAN
+        return max(0, min(first_index, len(self.files) - len(self.row_pool)))
+
+    def render_rows(self):
+        """表示範囲の行にファイル情報を割り当てる"""
+        shown = 0
+        for offset, row in enumerate(self.row_pool):
+            index = self.first_index + offset
+            if index < len(self.files):
+                row.bind(self.files[index], self.tags, self.file_open_type)
+                shown += 1
+            else:
+                row.visible = False
+        self.top_spacer.height = self.first_index * ROW_HEIGHT
+        self.bottom_spacer.height = (
+            len(self.files) - self.first_index - shown
+        ) * ROW_HEIGHT
+        if self.files_view.page:
+            self.files_view.update()
+
+    def set_tag_filter_error(self, message):
+        """タグ条件式のエラー表示を更新"""
+        if self.tag_filter.error_text == message:
+            return
+        self.tag_filter.error_text = message
+        if self.tag_filter.page:
+            self.tag_filter.update()
+
+    def sort_function(self, e):
+        # 同じ列なら昇順/降順を切り替え、別の列なら昇順で並び替え
+        column_index = e.control.data
+        if self.sort_column_index == column_index:
+            self.sort_ascending = not self.sort_ascending
+        else:
+            self.sort_column_index = column_index
+            self.sort_ascending = True
+        self.update_sort_icons()
+
+        # 読み込み済みの行は一部のみのため、DB側で並び替えて再取得
+        self.search_files()
+
+    def update_sort_icons(self):
+        """見出しの並び替えアイコンを更新"""
+        for index, icon in self.sort_icons.items():
+            if index == self.sort_column_index:
+                icon.name = (
+                    ft.icons.ARROW_UPWARD
+                    if self.sort_ascending
+                    else ft.icons.ARROW_DOWNWARD
+                )
+                icon.visible = True
+            else:
+                icon.visible = False
+        if self.files_header.page:
+            self.files_header.update()
+
+    def search_tags(self, page=None):
+        on_complete(self.file_manager.executor.list_tags(), self.set_tags)
+
+    def set_tags(self, tags: list):
+        # 行が参照しているリストをそのまま更新
+        self.tags[:] = tags
+        self.tag_view_btn.items = self.get_tag_menu_items()
+        if self.tag_view_btn.page:
+            self.tag_view_btn.update()
+
+    def set_files_table(self):
+        # 検索結果でテーブルを更新(先頭から表示)
+        self.first_index = 0
+        if self.files_view.page:
+            self.files_view.scroll_to(offset=0)
+        self.render_rows()
+
+    def get_tags_view_btn(self):
+        # タグ一覧のPopupMenuButtonを作成
+        return ft.PopupMenuButton(
+            content=ft.Icon(name=ft.icons.FILTER_LIST_ALT),
+            items=self.get_tag_menu_items(),
+        )
+
+    def get_tag_menu_items(self) -> list:
+        def tag_select(text):
+            # 入力済みの条件式にAND条件として追加
+            current = self.tag_filter.value.strip()
+            self.tag_filter.value = (
+                f"{current} AND {quote_tag(text)}" if current else quote_tag(text)
+            )
+            self.tag_filter.update()
+            self.search_files()
+
+        return [
+            ft.PopupMenuItem(
+                content=ft.Row(
+                    [
+                        ft.Icon(name=ft.icons.TAG, size=12),
+                        ft.Text(value=tag[1], color=ft.colors.PRIMARY, size=12),
+                    ],
+                    vertical_alignment=ft.CrossAxisAlignment.END,
+                ),
+                height=30,
+                on_click=lambda e: tag_select(e.control.content.controls[1].value),
+            )
+            for tag in self.tags
+        ]
+
+    def wrap_action(self, action, file_id: int, values: tuple = None):
+        """FileRowクラスのaction_callbackのラッパー
+
+        一覧全体は再検索せず、読み込み済みの結果と表示中の行のみ更新する
+
+        Args:
+            action (int): FileRow.ACTION_EDIT / FileRow.ACTION_DELETE
+            file_id (int): 対象のファイルID
+            values (tuple): 編集後の(filename, filepath, tags, memo)
+        """
+        index = next(
+            (i for i, file in enumerate(self.files) if file[0] == file_id), None
+        )
+        if index is None:
+            self.search_files()
+            return
+        if action == FileRow.ACTION_DELETE:
+            del self.files[index]
+            self.first_index = max(
+                0, min(self.first_index, len(self.files) - len(self.row_pool))
+            )
+        elif action == FileRow.ACTION_EDIT:
+            old = self.files[index]
+            filename, filepath, tags, memo = values
+            # 作成日時・パス情報・並び替えキーは変更前の値を引き継ぐ
+            new = (file_id, filename, filepath, tags if tags else None, memo, *old[5:])
+            if self.needs_refresh(old, new):
+                self.search_files()
+                return
+            self.files[index] = new
+        self.render_rows()
+
+    def needs_refresh(self, old: tuple, new: tuple) -> bool:
+        """編集で絞り込み結果や並び順が変わる可能性があるか"""
+
+        def changed(index):
+            return (old[index] or "") != (new[index] or "")
+
+        # 並び替え項目・検索対象 -> 行のインデックス
+        columns = {SORT_NAME: 1, SORT_PATH: 2, SORT_TAGS: 3, SORT_MEMO: 4}
+        if changed(2):
+            # パス情報(種類・サイズ・更新日時)が変わるため再取得
+            return True
+        if self.query.sort_key in columns and changed(columns[self.query.sort_key]):
+            return True
+        if self.query.text and any(changed(columns[t]) for t in self.query.targets):
+            return True
+        if self.query.tag_expression and changed(3):
+            return True
+        return False
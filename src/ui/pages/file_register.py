@@ -1,289 +1,414 @@
-import flet as ft
-import os
-from util.util_query import insert_file_joined
-
-
-class FileRegisterPage:
-    def __init__(self, page, file_manager):
-        self.page = page
-        self.file_manager = file_manager
-        self.success_message = ft.Text("", color=ft.colors.GREEN)
-        self.file_picker = None
-        self.folder_picker = None
-        self.init_components()
-        self.tags = []
-
-    def init_components(self):
-        # 名称入力
-        self.file_name = ft.TextField(
-            label="名称",
-            width=500,
-        )
-        # パス
-        self.file_path = ft.TextField(
-            label="パス",
-            width=500,
-        )
-
-        # タグ入力
-        self.tag_input = ft.TextField(
-            label="タグ（カンマ区切り）",
-            width=460,
-        )
-
-        # メモ入力
-        self.memo = ft.TextField(
-            label="メモ", width=500, max_lines=3, min_lines=3, multiline=True
-        )
-
-        # 登録ボタン
-        self.submit_button = ft.ElevatedButton(
-            text="登録", on_click=self.on_submit, width=400
-        )
-
-        # クリアボタン
-        self.clear_button = ft.ElevatedButton(
-            text="クリア", on_click=self.on_clear, width=100
-        )
-
-        # ドロップエリアの作成
-        drop_content = ft.Container(
-            content=ft.Column(
-                [
-                    ft.Text("ファイルまたはフォルダをドロップ(機能未提供)", size=20),
-                    ft.Row(
-                        [
-                            ft.ElevatedButton(
-                                "ファイルを選択",
-                                on_click=self.pick_files,
-                                icon=ft.icons.FILE_UPLOAD,
-                            ),
-                            ft.ElevatedButton(
-                                "フォルダを選択",
-                                on_click=self.pick_folder,
-                                icon=ft.icons.FOLDER_OPEN,
-                            ),
-                        ],
-                        alignment=ft.MainAxisAlignment.CENTER,
-                    ),
-                ],
-                alignment=ft.MainAxisAlignment.CENTER,
-                spacing=20,
-            ),
-            width=500,
-            height=140,
-            bgcolor=ft.colors.BLUE_GREY_100,
-            border_radius=10,
-            padding=10,
-            alignment=ft.alignment.center,
-        )
-
-        self.drop_area = ft.DragTarget(
-            group="files",
-            content=drop_content,
-            on_accept=self.on_drop,
-            on_will_accept=lambda e: e.data.startswith("files://") if e.data else False,
-        )
-
-    def search_tags(self, page=None):
-        conn = self.file_manager.create_connection()
-        with conn:
-            cursor = conn.cursor()
-            query = """
-                SELECT 
-                    mng.id, 
-                    mng.tag_name
-                FROM tag_mng mng
-                ORDER BY mng.tag_name
-            """
-            cursor.execute(
-                query,
-            )
-            self.tags = cursor.fetchall()
-        conn.close()
-
-    def get_tags_view_btn(self) -> ft.PopupMenuButton:
-        # タグ一覧のPopupMenuButtonを更新
-        def tag_select(text, e):
-            tag_list = [tag for tag in self.tag_input.value.split(",") if not tag == ""]
-            tag_list.append(text)
-            self.tag_input.value = ",".join(tag_list)
-            self.tag_input.update()
-
-        return ft.PopupMenuButton(
-            content=ft.Icon(name=ft.icons.FILTER_LIST_ALT),
-            items=[
-                ft.PopupMenuItem(
-                    content=ft.Row(
-                        [
-                            ft.Icon(name=ft.icons.TAG, size=12),
-                            ft.Text(value=tag[1], color=ft.colors.PRIMARY, size=12),
-                        ],
-                        vertical_alignment=ft.CrossAxisAlignment.END,
-                    ),
-                    height=30,
-                    on_click=lambda e: tag_select(
-                        e.control.content.controls[1].value, e
-                    ),
-                )
-                for tag in self.tags
-            ],
-            # on_open=lambda e: tag_open(),
-        )
-
-    def update_tags_container(self, container: ft.Container):
-        """タグコンテナを更新"""
-        container.content.controls = [
-            ft.Chip(
-                label=ft.Text(tag.strip()),
-                on_delete=lambda _: self.remove_tag(tag.strip(), container),
-            )
-            for tag in (self.tags_clone.split(",") if self.tags_clone else [])
-        ]
-        container.content.controls.append(
-            ft.IconButton(
-                icon=ft.icons.ADD, on_click=lambda _: self.show_tag_dialog(container)
-            )
-        )
-
-    def pick_files(self, _):
-        """ファイル選択ダイアログを表示"""
-        if self.file_picker:
-            self.file_picker.pick_files()
-
-    def pick_folder(self, _):
-        """フォルダ選択ダイアログを表示"""
-        if self.folder_picker:
-            self.folder_picker.get_directory_path()
-
-    def build(self, con: ft.Container):
-        # ファイルピッカーの初期化
-        self.file_picker = ft.FilePicker(on_result=self.on_file_picker_result)
-        self.folder_picker = ft.FilePicker(on_result=self.on_folder_picker_result)
-        self.search_tags()
-        self.tag_view_btn = self.get_tags_view_btn()
-
-        return ft.Column(
-            [
-                self.drop_area,
-                self.file_picker,
-                self.folder_picker,
-                self.file_name,
-                self.file_path,
-                ft.Row([self.tag_input, self.tag_view_btn]),
-                self.memo,
-                ft.Row([self.submit_button, self.clear_button]),
-                self.success_message,
-            ],
-            scroll="auto",
-        )
-
-    # イベントハンドラ
-    def on_drop(self, e):
-        if e.data and e.data.startswith("files://"):
-            path = e.data.replace("files://", "")
-            self.process_dropped_item(path)
-
-    def process_dropped_item(self, path: str):
-        if os.path.exists(path):
-            name = os.path.basename(path)
-            type_text = "フォルダ" if os.path.isdir(path) else "ファイル"
-            self.file_name.value = name
-            self.file_path.value = path
-            self.file_name.update()
-            self.file_path.update()
-
-    def on_file_picker_result(self, e):
-        if e.files:
-            file_path = e.files[0].path
-            self.process_dropped_item(file_path)
-
-    def on_folder_picker_result(self, e):
-        if e.path:
-            self.process_dropped_item(e.path)
-
-    def on_submit(self, e):
-        # パスの重複確認
-        conn = self.file_manager.create_connection()
-        with conn:
-            cursor = conn.cursor()
-            query = """
-                SELECT 
-                    *
-                FROM files
-                WHERE filepath =?
-            """
-            cursor.execute(query, (self.file_path.value,))
-            res = cursor.fetchone()
-        conn.close()
-        if res:
-            print(res)
-            self.page.show_snack_bar(
-                ft.SnackBar(
-                    content=ft.Text(
-                        f"登録済みのパスです。[ 名称: {res[1]} 、パス: {res[2]} ]"
-                    )
-                )
-            )
-
-        # 登録条件確認
-        if (
-            self.file_name.value
-            and self.file_path.value
-            and os.path.exists(self.file_path.value)
-        ):
-
-            tags = [
-                tag.strip() for tag in self.tag_input.value.split(",") if tag.strip()
-            ]
-
-            conn = self.file_manager.create_connection()
-            with conn:
-                cursor = conn.cursor()
-                cursor.execute(
-                    "INSERT INTO files (filename, filepath, memo) VALUES (?, ?, ?)",
-                    (self.file_name.value, self.file_path.value, self.memo.value),
-                )
-                file_id = cursor.lastrowid
-
-                for index, tag in enumerate(tags):
-                    insert_file_joined(cursor, file_id, tag, index)
-
-            conn.close()
-
-            self.file_name.value = ""
-            self.file_path.value = ""
-            self.tag_input.value = ""
-            self.memo.value = ""
-            self.file_name.update()
-            self.file_path.update()
-            self.tag_input.update()
-            self.memo.update()
-            self.page.show_snack_bar(
-                ft.SnackBar(content=ft.Text("正常に登録されました！"))
-            )
-
-        else:
-            msg_list = []
-            if not self.file_name.value:
-                msg_list.append("名称")
-            if not self.file_path.value:
-                msg_list.append("パス")
-            elif not os.path.exists(self.file_path.value):
-                self.page.show_snack_bar(
-                    ft.SnackBar(content=ft.Text("存在しないパスです"))
-                )
-                return
-            self.page.show_snack_bar(
-                ft.SnackBar(content=ft.Text(f"{'・'.join(msg_list)}を入力してください"))
-            )
-
-    def on_clear(self, e):
-        self.file_name.value = ""
-        self.file_path.value = ""
-        self.tag_input.value = ""
-        self.memo.value = ""
-        self.file_name.update()
-        self.file_path.update()
-        self.tag_input.update()
-        self.memo.update()
+import flet as ft
+import os
+import threading
+from database.bulk_register import BulkRegister
+from database.db_executor import on_complete
+from util.file_walker import split_patterns
+
+
+class FileRegisterPage:
+    def __init__(self, page, file_manager):
+        self.page = page
+        self.file_manager = file_manager
+        self.success_message = ft.Text("", color=ft.colors.GREEN)
+        self.file_picker = None
+        self.folder_picker = None
+        self.bulk_picker = None
+        self.bulk_register = None
+        self.init_components()
+        self.tags = []
+
+    def init_components(self):
+        # 名称入力
+        self.file_name = ft.TextField(
+            label="名称",
+            width=500,
+        )
+        # パス
+        self.file_path = ft.TextField(
+            label="パス",
+            width=500,
+        )
+
+        # タグ入力
+        self.tag_input = ft.TextField(
+            label="タグ（カンマ区切り）",
+            width=460,
+        )
+
+        # メモ入力
+        self.memo = ft.TextField(
+            label="メモ", width=500, max_lines=3, min_lines=3, multiline=True
+        )
+
+        # 登録ボタン
+        self.submit_button = ft.ElevatedButton(
+            text="登録", on_click=self.on_submit, width=400
+        )
+
+        # クリアボタン
+        self.clear_button = ft.ElevatedButton(
+            text="クリア", on_click=self.on_clear, width=100
+        )
+
+        # ドロップエリアの作成
+        drop_content = ft.Container(
+            content=ft.Column(
+                [
+                    ft.Text("ファイルまたはフォルダをドロップ(機能未提供)", size=20),
+                    ft.Row(
+                        [
+                            ft.ElevatedButton(
+                                "ファイルを選択",
+                                on_click=self.pick_files,
+                                icon=ft.icons.FILE_UPLOAD,
+                            ),
+                            ft.ElevatedButton(
+                                "フォルダを選択",
+                                on_click=self.pick_folder,
+                                icon=ft.icons.FOLDER_OPEN,
+                            ),
+                        ],
+                        alignment=ft.MainAxisAlignment.CENTER,
+                    ),
+                ],
+                alignment=ft.MainAxisAlignment.CENTER,
+                spacing=20,
+            ),
+            width=500,
+            height=140,
+            bgcolor=ft.colors.BLUE_GREY_100,
+            border_radius=10,
+            padding=10,
+            alignment=ft.alignment.center,
+        )
+
+        self.drop_area = ft.DragTarget(
+            group="files",
+            content=drop_content,
+            on_accept=self.on_drop,
+            on_will_accept=lambda e: e.data.startswith("files://") if e.data else False,
+        )
+        self.init_bulk_components()
+
+    def init_bulk_components(self):
+        # フォルダ一括登録
+        self.bulk_root = ft.TextField(label="登録するフォルダ", width=400)
+        self.bulk_depth = ft.TextField(
+            label="階層数(空欄は無制限)",
+            width=160,
+            keyboard_type=ft.KeyboardType.NUMBER,
+        )
+        self.bulk_include_dirs = ft.Checkbox(label="フォルダも登録", value=True)
+        self.bulk_include = ft.TextField(
+            label="対象パターン(カンマ区切り 例: *.pdf,*.docx)", width=500
+        )
+        self.bulk_exclude = ft.TextField(
+            label="除外パターン(カンマ区切り)", width=500, value=".git,__pycache__"
+        )
+        self.bulk_tags = ft.TextField(label="付与するタグ（カンマ区切り）", width=500)
+        self.bulk_start_button = ft.ElevatedButton(
+            text="一括登録", on_click=self.on_bulk_start, width=400
+        )
+        self.bulk_cancel_button = ft.ElevatedButton(
+            text="中止", on_click=self.on_bulk_cancel, width=100, disabled=True
+        )
+        self.bulk_progress_bar = ft.ProgressBar(width=500, visible=False)
+        self.bulk_progress_text = ft.Text("")
+
+    def refresh(self):
+        """再表示時の更新(前回の表示以降にDBが変更された場合のみタグを再取得)"""
+        if self.loaded_generation != self.file_manager.generation:
+            self.loaded_generation = self.file_manager.generation
+            self.search_tags()
+
+    def search_tags(self, page=None):
+        on_complete(self.file_manager.executor.list_tags(), self.set_tags)
+
+    def set_tags(self, tags: list):
+        self.tags = tags
+        self.tag_view_btn.items = self.get_tag_menu_items()
+        if self.tag_view_btn.page:
+            self.tag_view_btn.update()
+
+    def get_tags_view_btn(self) -> ft.PopupMenuButton:
+        # タグ一覧のPopupMenuButtonを作成
+        return ft.PopupMenuButton(
+            content=ft.Icon(name=ft.icons.FILTER_LIST_ALT),
+            items=self.get_tag_menu_items(),
+        )
+
+    def get_tag_menu_items(self) -> list:
+        def tag_select(text, e):
+            tag_list = [tag for tag in self.tag_input.value.split(",") if not tag == ""]
+            tag_list.append(text)
+            self.tag_input.value = ",".join(tag_list)
+            self.tag_input.update()
+
+        return [
+            ft.PopupMenuItem(
+                content=ft.Row(
+                    [
+                        ft.Icon(name=ft.icons.TAG, size=12),
+                        ft.Text(value=tag[1], color=ft.colors.PRIMARY, size=12),
+                    ],
+                    vertical_alignment=ft.CrossAxisAlignment.END,
+                ),
+                height=30,
+                on_click=lambda e: tag_select(e.control.content.controls[1].value, e),
+            )
+            for tag in self.tags
+        ]
+
+    def update_tags_container(self, container: ft.Container):
+        """タグコンテナを更新"""
+        container.content.controls = [
+            ft.Chip(
+                label=ft.Text(tag.strip()),
+                on_delete=lambda _: self.remove_tag(tag.strip(), container),
+            )
+            for tag in (self.tags_clone.split(",") if self.tags_clone else [])
+        ]
+        container.content.controls.append(
+            ft.IconButton(
+                icon=ft.icons.ADD, on_click=lambda _: self.show_tag_dialog(container)
+            )
+        )
+
+    def pick_files(self, _):
+        """ファイル選択ダイアログを表示"""
+        if self.file_picker:
+            self.file_picker.pick_files()
+
+    def pick_folder(self, _):
+        """フォルダ選択ダイアログを表示"""
+        if self.folder_picker:
+            self.folder_picker.get_directory_path()
+
+    def build(self, con: ft.Container):
+        # ファイルピッカーの初期化
+        self.file_picker = ft.FilePicker(on_result=self.on_file_picker_result)
+        self.folder_picker = ft.FilePicker(on_result=self.on_folder_picker_result)
+        self.bulk_picker = ft.FilePicker(on_result=self.on_bulk_picker_result)
+        self.tag_view_btn = self.get_tags_view_btn()
+        self.loaded_generation = self.file_manager.generation
+        self.search_tags()
+
+        return ft.Column(
+            [
+                self.drop_area,
+                self.file_picker,
+                self.folder_picker,
+                self.file_name,
+                self.file_path,
+                ft.Row([self.tag_input, self.tag_view_btn]),
+                self.memo,
+                ft.Row([self.submit_button, self.clear_button]),
+                self.success_message,
+                ft.Divider(),
+                ft.Text("フォルダ一括登録", size=18, weight=ft.FontWeight.BOLD),
+                self.bulk_picker,
+                ft.Row(
+                    [
+                        self.bulk_root,
+                        ft.IconButton(
+                            icon=ft.icons.FOLDER_OPEN,
+                            on_click=lambda _: self.bulk_picker.get_directory_path(),
+                        ),
+                    ]
+                ),
+                ft.Row([self.bulk_depth, self.bulk_include_dirs]),
+                self.bulk_include,
+                self.bulk_exclude,
+                self.bulk_tags,
+                ft.Row([self.bulk_start_button, self.bulk_cancel_button]),
+                self.bulk_progress_bar,
+                self.bulk_progress_text,
+            ],
+            scroll="auto",
+        )
+
+    # イベントハンドラ
+    def on_drop(self, e):
+        if e.data and e.data.startswith("files://"):
+            path = e.data.replace("files://", "")
+            self.process_dropped_item(path)
+
+    def process_dropped_item(self, path: str):
+        # 存在確認はイベントのスレッドで行わない(応答のないネットワークパスで画面が固まる)
+        def stated(info: tuple):
+            if info[3] != 1:
+                return
+            self.file_name.value = os.path.basename(path)
+            self.file_path.value = path
+            self.file_name.update()
+            self.file_path.update()
+
+        on_complete(self.file_manager.executor.stat(path), stated)
+
+    def on_file_picker_result(self, e):
+        if e.files:
+            file_path = e.files[0].path
+            self.process_dropped_item(file_path)
+
+    def on_folder_picker_result(self, e):
+        if e.path:
+            self.process_dropped_item(e.path)
+
+    def on_submit(self, e):
+        # 登録条件確認
+        if not (self.file_name.value and self.file_path.value):
+            msg_list = []
+            if not self.file_name.value:
+                msg_list.append("名称")
+            if not self.file_path.value:
+                msg_list.append("パス")
+            self.page.show_snack_bar(
+                ft.SnackBar(content=ft.Text(f"{'・'.join(msg_list)}を入力してください"))
+            )
+            return
+
+        filename = self.file_name.value
+        filepath = self.file_path.value
+        memo = self.memo.value
+        tags = [tag.strip() for tag in self.tag_input.value.split(",") if tag.strip()]
+        self.submit_button.disabled = True
+        self.submit_button.update()
+
+        def stated(info: tuple):
+            if info[3] != 1:
+                self.submit_button.disabled = False
+                self.submit_button.update()
+                message = (
+                    "存在しないパスです" if info[3] == 0 else "パスを確認できませんでした"
+                )
+                self.page.show_snack_bar(ft.SnackBar(content=ft.Text(message)))
+                return
+            # 登録済みのパスは登録しない(正規化パスの一意インデックスで判定)
+            on_complete(
+                self.file_manager.executor.register_file(
+                    filename, filepath, memo, tags, info
+                ),
+                self.on_registered,
+                self.on_register_error,
+            )
+
+        # 存在確認はイベントのスレッドで行わない(応答のないネットワークパスで画面が固まる)
+        on_complete(
+            self.file_manager.executor.stat(filepath),
+            stated,
+            self.on_register_error,
+        )
+
+    def on_registered(self, result: tuple):
+        _, created, res = result
+        self.submit_button.disabled = False
+        self.submit_button.update()
+        if not created:
+            self.page.show_snack_bar(
+                ft.SnackBar(
+                    content=ft.Text(
+                        f"登録済みのパスです。[ 名称: {res[0]} 、パス: {res[1]} ]"
+                    )
+                )
+            )
+            return
+
+        self.on_clear(None)
+        self.page.show_snack_bar(ft.SnackBar(content=ft.Text("正常に登録されました！")))
+        # 新しいタグを候補に反映
+        self.search_tags()
+
+    def on_register_error(self, ex: Exception):
+        self.submit_button.disabled = False
+        self.submit_button.update()
+        self.page.show_snack_bar(
+            ft.SnackBar(content=ft.Text(f"登録に失敗しました({ex})"))
+        )
+
+    def on_clear(self, e):
+        self.file_name.value = ""
+        self.file_path.value = ""
+        self.tag_input.value = ""
+        self.memo.value = ""
+        self.file_name.update()
+        self.file_path.update()
+        self.tag_input.update()
+        self.memo.update()
+
+    def on_bulk_picker_result(self, e):
+        if e.path:
+            self.bulk_root.value = e.path
+            self.bulk_root.update()
+
+    def on_bulk_start(self, e):
+        root = self.bulk_root.value
+        if not root:
+            self.page.show_snack_bar(
+                ft.SnackBar(content=ft.Text("存在するフォルダを指定してください"))
+            )
+            return
+        depth = (self.bulk_depth.value or "").strip()
+        if depth and not (depth.isdigit() and int(depth) > 0):
+            self.bulk_depth.error_text = "1以上の数値を入力してください"
+            self.bulk_depth.update()
+            return
+        self.bulk_depth.error_text = None
+
+        self.bulk_register = BulkRegister(self.file_manager)
+        kwargs = dict(
+            root=root,
+            max_depth=int(depth) if depth else None,
+            include=split_patterns(self.bulk_include.value),
+            exclude=split_patterns(self.bulk_exclude.value),
+            include_dirs=self.bulk_include_dirs.value,
+            tags=self.bulk_tags.value.split(","),
+            on_progress=self.on_bulk_progress,
+        )
+        self.set_bulk_running(True)
+        self.bulk_progress_text.value = "フォルダを読み込んでいます..."
+        self.bulk_progress_text.update()
+
+        bulk_register = self.bulk_register
+
+        def run():
+            try:
+                # フォルダの確認もイベントのスレッドでは行わない
+                if not os.path.isdir(root):
+                    self.set_bulk_running(False)
+                    self.bulk_progress_text.value = "存在するフォルダを指定してください"
+                    self.bulk_progress_text.update()
+                    return
+                bulk_register.run(**kwargs)
+            except Exception as ex:
+                self.set_bulk_running(False)
+                self.bulk_progress_text.value = f"一括登録に失敗しました({ex})"
+                self.bulk_progress_text.update()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def on_bulk_cancel(self, e):
+        if self.bulk_register:
+            self.bulk_register.cancel()
+
+    def on_bulk_progress(self, progress):
+        text = (
+            f"走査: {progress.scanned}件 / 登録: {progress.registered}件 / "
+            f"登録済み: {progress.skipped}件 "
+            f"({progress.files_per_second():.0f}件/秒)"
+        )
+        if progress.finished:
+            text = ("中止しました。" if progress.cancelled else "完了しました。") + text
+            self.set_bulk_running(False)
+            self.search_tags()
+        self.bulk_progress_text.value = text
+        self.bulk_progress_text.update()
+
+    def set_bulk_running(self, running: bool):
+        self.bulk_start_button.disabled = running
+        self.bulk_cancel_button.disabled = not running
+        # 総件数は走査が終わるまで分からないため進捗は不定表示
+        self.bulk_progress_bar.visible = running
+        self.bulk_start_button.update()
+        self.bulk_cancel_button.update()
+        self.bulk_progress_bar.update()
@@ -1,122 +1,389 @@
-import flet as ft
-import util.config_manager as conf
-import common.define as define
-from database.file_manager import FileManager
-from util.util_query import delete_tag
-
-
-class MaintenancePage:
-    def __init__(self, page: ft.Page, file_manager: FileManager):
-        self.page = page
-        self.file_manager = file_manager
-
-        def on_change(e):
-            conf.set_config(
-                define.SECTION_FILE_LIST, define.KEY_FILE_OPEN, e.control.value
-            )
-
-        self.open_file_radio = ft.RadioGroup(
-            value=conf.get_config(
-                define.SECTION_FILE_LIST,
-                define.KEY_FILE_OPEN,
-                define.FILE_OPEN["NONE"]["type"],
-            ),
-            content=ft.Row(
-                [
-                    ft.Radio(
-                        value=define.FILE_OPEN["NONE"]["type"],
-                        label=define.FILE_OPEN["NONE"]["text"],
-                    ),
-                    ft.Radio(
-                        value=define.FILE_OPEN["ONLY"]["type"],
-                        label=define.FILE_OPEN["ONLY"]["text"],
-                    ),
-                    ft.Radio(
-                        value=define.FILE_OPEN["BOTH"]["type"],
-                        label=define.FILE_OPEN["BOTH"]["text"],
-                    ),
-                ]
-            ),
-            on_change=lambda e: on_change(e),
-        )
-        # self.tags = self.get_dropdown_optin_tags()
-
-    def build(self, con: ft.Container):
-        # タグ削除用のドロップダウン
-        self.tag_dropdown = ft.Dropdown(
-            label="削除するタグを選択",
-            options=self.get_dropdown_optin_tags(),
-            width=300,
-        )
-
-        # タグ削除ボタン
-        delete_tag_button = ft.ElevatedButton(
-            text="タグを削除", on_click=self.delete_tag
-        )
-
-        content = ft.Column(
-            [
-                ft.Text("メンテナンス", size=24, weight=ft.FontWeight.BOLD),
-                ft.Text("タグの削除", size=18, weight=ft.FontWeight.BOLD),
-                self.tag_dropdown,
-                delete_tag_button,
-                ft.Divider(),
-                ft.Text("ファイルオープン制御", size=18, weight=ft.FontWeight.BOLD),
-                self.open_file_radio,
-            ]
-        )
-        return content
-
-    def get_all_tags(self) -> list:
-        tags = []
-        conn = self.file_manager.create_connection()
-        with conn:
-            cursor = conn.cursor()
-            query = """
-                SELECT 
-                    mng.id, 
-                    mng.tag_name,
-                    count(j.file_id) AS count
-                FROM tag_mng mng
-                LEFT JOIN file_tags j ON mng.id = j.tag_id
-                GROUP BY mng.id, mng.tag_name    
-                ORDER BY mng.tag_name
-            """
-            cursor.execute(query)
-            tags = cursor.fetchall()
-
-        return tags
-
-    def get_dropdown_optin_tags(self) -> list:
-        tags = self.get_all_tags()
-        return [
-            ft.dropdown.Option(
-                key=tag[1], content=ft.Row([ft.Text(value=f"{tag[1]}({str(tag[2])})")])
-            )
-            for tag in tags
-        ]
-
-    def update_tag_list(self):
-        self.tag_dropdown.options = self.get_dropdown_optin_tags()
-        self.tag_dropdown.update()
-
-    def delete_tag(self, e):
-        selected_tag = self.tag_dropdown.value
-        res = None
-        if selected_tag:
-            conn = self.file_manager.create_connection()
-            with conn:
-                cursor = conn.cursor()
-                res = delete_tag(cursor, selected_tag)
-            if res:
-                self.update_tag_list()
-                self.page.snack_bar = ft.SnackBar(
-                    content=ft.Text(f"タグ '{selected_tag}' を削除しました")
-                )
-
-            else:
-                self.page.snack_bar = ft.SnackBar(
-                    content=ft.Text(f"タグを削除できませんでした('{selected_tag}')")
-                )
-            self.page.snack_bar.open = True
-            self.page.update()
+import flet as ft
+import threading
+import util.config_manager as conf
+import common.define as define
+from database.db_executor import on_complete
+from database.file_manager import FileManager
+from database.relocation import MATCH_FINGERPRINT, Relocator
+from util.path_info import LINK_STATUS_TEXT, format_mtime
+
+
+class MaintenancePage:
+    def __init__(
+        self, page: ft.Page, file_manager: FileManager, path_refresher=None
+    ):
+        self.page = page
+        self.file_manager = file_manager
+        self.path_refresher = path_refresher
+
+        def on_change(e):
+            conf.store.set(
+                define.SECTION_FILE_LIST, define.KEY_FILE_OPEN, e.control.value
+            )
+
+        self.open_file_radio = ft.RadioGroup(
+            value=conf.store.get(
+                define.SECTION_FILE_LIST,
+                define.KEY_FILE_OPEN,
+                define.FILE_OPEN["NONE"]["type"],
+            ),
+            content=ft.Row(
+                [
+                    ft.Radio(
+                        value=define.FILE_OPEN["NONE"]["type"],
+                        label=define.FILE_OPEN["NONE"]["text"],
+                    ),
+                    ft.Radio(
+                        value=define.FILE_OPEN["ONLY"]["type"],
+                        label=define.FILE_OPEN["ONLY"]["text"],
+                    ),
+                    ft.Radio(
+                        value=define.FILE_OPEN["BOTH"]["type"],
+                        label=define.FILE_OPEN["BOTH"]["text"],
+                    ),
+                ]
+            ),
+            on_change=lambda e: on_change(e),
+        )
+        # self.tags = self.get_dropdown_optin_tags()
+
+    def build(self, con: ft.Container):
+        # タグ削除用のドロップダウン
+        self.tag_dropdown = ft.Dropdown(
+            label="削除するタグを選択",
+            options=[],
+            width=300,
+        )
+        self.loaded_generation = self.file_manager.generation
+        self.update_tag_list()
+
+        # タグ削除ボタン
+        delete_tag_button = ft.ElevatedButton(
+            text="タグを削除", on_click=self.delete_tag
+        )
+
+        # パスの一括置換
+        self.old_prefix = ft.TextField(
+            label="置換前のフォルダ", width=500, on_change=self.clear_prefix_preview
+        )
+        self.new_prefix = ft.TextField(
+            label="置換後のフォルダ", width=500, on_change=self.clear_prefix_preview
+        )
+        self.prefix_preview_button = ft.ElevatedButton(
+            text="プレビュー", on_click=self.preview_path_prefix
+        )
+        self.prefix_rewrite_button = ft.ElevatedButton(
+            text="置換", on_click=self.rewrite_path_prefix, disabled=True
+        )
+        self.prefix_status = ft.Text("")
+        self.prefix_report = ft.Column([], spacing=2, height=120, scroll="auto")
+
+        # リンク切れ確認の集計
+        self.link_summary = ft.Column([], spacing=2)
+        self.update_link_summary()
+        link_buttons = ft.Row(
+            [
+                ft.ElevatedButton(
+                    text="集計を更新", on_click=lambda _: self.update_link_summary()
+                ),
+                ft.ElevatedButton(
+                    text="すべて再確認",
+                    on_click=self.recheck_links,
+                    disabled=self.path_refresher is None,
+                ),
+            ]
+        )
+
+        # 移動したパスの追跡
+        self.relocation_roots = ft.TextField(
+            label="移動先を探すフォルダ(1行に1つ)",
+            width=500,
+            multiline=True,
+            min_lines=2,
+            max_lines=4,
+        )
+        self.relocation_plan_button = ft.ElevatedButton(
+            text="移動先を検出", on_click=self.plan_relocation
+        )
+        self.relocation_apply_button = ft.ElevatedButton(
+            text="検出結果を適用", on_click=self.apply_relocation, disabled=True
+        )
+        self.relocation_status = ft.Text("")
+        self.relocation_report = ft.Column([], spacing=2, height=150, scroll="auto")
+        self.relocator = None
+        self.relocation_result = None
+
+        content = ft.Column(
+            [
+                ft.Text("メンテナンス", size=24, weight=ft.FontWeight.BOLD),
+                ft.Text("タグの削除", size=18, weight=ft.FontWeight.BOLD),
+                self.tag_dropdown,
+                delete_tag_button,
+                ft.Divider(),
+                ft.Text("件数の再集計", size=18, weight=ft.FontWeight.BOLD),
+                ft.Text(
+                    "タグごとのファイル数・テーブルのレコード数が実際と異なる場合に集計し直します",
+                    size=12,
+                ),
+                ft.ElevatedButton(text="再集計", on_click=self.rebuild_counters),
+                ft.Divider(),
+                ft.Text("パスの一括置換", size=18, weight=ft.FontWeight.BOLD),
+                self.old_prefix,
+                self.new_prefix,
+                ft.Row([self.prefix_preview_button, self.prefix_rewrite_button]),
+                self.prefix_status,
+                self.prefix_report,
+                ft.Divider(),
+                ft.Text("リンク切れ確認", size=18, weight=ft.FontWeight.BOLD),
+                self.link_summary,
+                link_buttons,
+                ft.Divider(),
+                ft.Text("移動したパスの追跡", size=18, weight=ft.FontWeight.BOLD),
+                self.relocation_roots,
+                ft.Row([self.relocation_plan_button, self.relocation_apply_button]),
+                self.relocation_status,
+                self.relocation_report,
+                ft.Divider(),
+                ft.Text("ファイルオープン制御", size=18, weight=ft.FontWeight.BOLD),
+                self.open_file_radio,
+            ],
+            scroll="auto",
+        )
+        return content
+
+    def refresh(self):
+        """再表示時の更新(前回の表示以降にDBが変更された場合のみ)"""
+        if self.loaded_generation != self.file_manager.generation:
+            self.loaded_generation = self.file_manager.generation
+            self.update_tag_list()
+            self.update_link_summary()
+
+    def get_dropdown_optin_tags(self, tags: list) -> list:
+        return [
+            ft.dropdown.Option(
+                key=tag[1], content=ft.Row([ft.Text(value=f"{tag[1]}({str(tag[2])})")])
+            )
+            for tag in tags
+        ]
+
+    def update_tag_list(self):
+        def loaded(tags):
+            self.tag_dropdown.options = self.get_dropdown_optin_tags(tags)
+            if self.tag_dropdown.page:
+                self.tag_dropdown.update()
+
+        on_complete(self.file_manager.executor.list_tag_counts(), loaded)
+
+    def delete_tag(self, e):
+        selected_tag = self.tag_dropdown.value
+        if not selected_tag:
+            return
+
+        def deleted(res):
+            if res:
+                self.tag_dropdown.value = None
+                self.update_tag_list()
+                self.show_message(f"タグ '{selected_tag}' を削除しました")
+            else:
+                self.show_message(f"タグを削除できませんでした('{selected_tag}')")
+
+        on_complete(
+            self.file_manager.executor.delete_tag(selected_tag),
+            deleted,
+            lambda ex: self.show_message(
+                f"タグを削除できませんでした('{selected_tag}')({ex})"
+            ),
+        )
+
+    def rebuild_counters(self, e):
+        def rebuilt(fixed):
+            self.update_tag_list()
+            self.show_message(
+                f"件数を再集計しました({fixed}件を修正)"
+                if fixed
+                else "件数を再集計しました(修正はありません)"
+            )
+
+        on_complete(
+            self.file_manager.executor.rebuild_counters(),
+            rebuilt,
+            lambda ex: self.show_message(f"再集計できませんでした({ex})"),
+        )
+
+    def get_prefixes(self) -> tuple:
+        return (self.old_prefix.value or "").strip(), (
+            self.new_prefix.value or ""
+        ).strip()
+
+    def clear_prefix_preview(self, e):
+        # 入力を変更した場合はプレビューからやり直す
+        if not self.prefix_rewrite_button.disabled:
+            self.prefix_rewrite_button.disabled = True
+            self.prefix_rewrite_button.update()
+
+    def preview_path_prefix(self, e):
+        old_prefix, new_prefix = self.get_prefixes()
+        if not old_prefix or not new_prefix:
+            self.show_message("置換前と置換後のフォルダを入力してください")
+            return
+
+        def loaded(result):
+            count, conflict_count, samples, conflicts = result
+            self.prefix_status.value = f"対象: {count}件 / 競合: {conflict_count}件"
+            lines = [
+                ft.Text(f"{old_path} → {new_path}", size=12)
+                for old_path, new_path in samples
+            ]
+            lines += [
+                ft.Text(f"{path}: 登録済みです", size=12, color=ft.colors.ORANGE_700)
+                for path in conflicts
+            ]
+            self.prefix_report.controls = lines
+            self.prefix_rewrite_button.disabled = count == 0 or conflict_count > 0
+            self.prefix_status.update()
+            self.prefix_report.update()
+            self.prefix_rewrite_button.update()
+
+        on_complete(
+            self.file_manager.executor.preview_path_prefix(old_prefix, new_prefix),
+            loaded,
+            lambda ex: self.show_message(f"プレビューに失敗しました({ex})"),
+        )
+
+    def rewrite_path_prefix(self, e):
+        old_prefix, new_prefix = self.get_prefixes()
+        self.prefix_rewrite_button.disabled = True
+        self.prefix_rewrite_button.update()
+
+        def rewritten(count):
+            self.prefix_status.value = f"{count}件のパスを置換しました"
+            self.prefix_report.controls = []
+            self.prefix_status.update()
+            self.prefix_report.update()
+            self.update_link_summary()
+
+        on_complete(
+            self.file_manager.executor.rewrite_path_prefix(old_prefix, new_prefix),
+            rewritten,
+            lambda ex: self.show_message(f"置換できませんでした({ex})"),
+        )
+
+    def update_link_summary(self):
+        def loaded(result):
+            counts, oldest = result
+            lines = [
+                f"{text}: {counts.get(status, 0)}件"
+                for status, text in LINK_STATUS_TEXT.items()
+            ]
+            lines.append(f"未確認: {counts.get(None, 0)}件")
+            if oldest:
+                lines.append(f"最も古い確認日時: {format_mtime(oldest)}")
+            self.link_summary.controls = [ft.Text(line) for line in lines]
+            if self.link_summary.page:
+                self.link_summary.update()
+
+        on_complete(self.file_manager.executor.link_summary(), loaded)
+
+    def recheck_links(self, e):
+        self.path_refresher.recheck_all()
+        self.show_message("バックグラウンドで再確認を開始しました")
+
+    def plan_relocation(self, e):
+        roots = [
+            root.strip()
+            for root in (self.relocation_roots.value or "").splitlines()
+            if root.strip()
+        ]
+        if not roots:
+            self.show_message("移動先を探すフォルダを入力してください")
+            return
+        self.relocator = Relocator(self.file_manager)
+        self.relocation_result = None
+        self.set_relocation_running(True)
+        self.set_relocation_status("フォルダを走査しています...")
+
+        def progress(scanned):
+            self.set_relocation_status(f"フォルダを走査しています...({scanned}件)")
+
+        def run():
+            try:
+                plan = self.relocator.plan(roots, progress)
+            except Exception as ex:
+                self.set_relocation_running(False)
+                self.set_relocation_status(f"検出に失敗しました({ex})")
+                return
+            self.relocation_result = plan
+            self.show_relocation_plan(plan)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def show_relocation_plan(self, plan):
+        self.set_relocation_running(False)
+        self.set_relocation_status(
+            f"{'中止しました。' if plan.cancelled else ''}"
+            f"リンク切れ: {plan.missing}件 / 移動先あり: {len(plan.moves)}件 / "
+            f"競合: {len(plan.conflicts)}件 / 未検出: {plan.unmatched}件 "
+            f"(走査: {plan.scanned}件、{plan.elapsed:.1f}秒)"
+        )
+        lines = [
+            ft.Text(
+                f"{old_path} → {new_path}"
+                + ("" if method == MATCH_FINGERPRINT else " (名前・サイズで一致)"),
+                size=12,
+            )
+            for _, old_path, new_path, method in plan.moves[:100]
+        ]
+        lines += [
+            ft.Text(f"{old_path}: {reason}", size=12, color=ft.colors.ORANGE_700)
+            for _, old_path, reason in plan.conflicts[:100]
+        ]
+        self.relocation_report.controls = lines
+        self.relocation_report.update()
+        self.relocation_apply_button.disabled = not plan.moves
+        self.relocation_apply_button.update()
+
+    def apply_relocation(self, e):
+        plan = self.relocation_result
+        if not plan or not plan.moves:
+            return
+        self.relocation_result = None
+        self.set_relocation_running(True)
+
+        def progress(done, total):
+            self.set_relocation_status(f"更新しています...({done}/{total}件)")
+
+        def run():
+            try:
+                updated = self.relocator.apply(plan, progress)
+            except Exception as ex:
+                self.set_relocation_status(f"更新に失敗しました({ex})")
+            else:
+                self.set_relocation_status(
+                    f"{updated}件のパスを更新しました"
+                    + (
+                        f"(検出後に変更された{len(plan.moves) - updated}件は更新していません)"
+                        if updated < len(plan.moves)
+                        else ""
+                    )
+                )
+                self.relocation_report.controls = []
+                self.relocation_report.update()
+                self.update_link_summary()
+            self.set_relocation_running(False)
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def set_relocation_running(self, running: bool):
+        self.relocation_plan_button.disabled = running
+        self.relocation_apply_button.disabled = True
+        self.relocation_plan_button.update()
+        self.relocation_apply_button.update()
+
+    def set_relocation_status(self, text: str):
+        self.relocation_status.value = text
+        self.relocation_status.update()
+
+    def show_message(self, message: str):
+        self.page.snack_bar = ft.SnackBar(content=ft.Text(message))
+        self.page.snack_bar.open = True
+        self.page.update()
@@ -1,25 +1,153 @@
-import configparser
-
-CONFIG_FILE_NAME = "config.ini"
-
-
-def set_config(section: str, key: str, value):
-    config = configparser.ConfigParser()
-    # セクションチェック
-    if section not in config:
-        config[section] = {}
-
-    # 値設定
-    config[section][key] = str(value)
-
-    with open(CONFIG_FILE_NAME, "w") as configfile:
-        config.write(configfile)
-
-
-def get_config(section: str, key: str, default=None):
-    config = configparser.ConfigParser()
-    config.read(CONFIG_FILE_NAME)
-    if section in config:
-        return config[section].get(key, default)
-    else:
-        return default
+import configparser
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+CONFIG_FILE_NAME = "config.ini"
+CONFIG_ENCODING = "utf-8"
+# ファイルの更新確認の間隔(秒)
+RELOAD_CHECK_INTERVAL = 1.0
+
+
+class ConfigStore:
+    """設定ファイルの読み書き
+
+    読み込んだ内容はメモリに保持し、ファイルの更新日時が変わった場合のみ読み直す。
+    書き込みは一時ファイルに書いてから置き換えるため、途中で失敗しても
+    既存のファイルは壊れない
+    """
+
+    def __init__(self, path: str = CONFIG_FILE_NAME):
+        self.path = path
+        self._lock = threading.RLock()
+        self._parser = configparser.ConfigParser()
+        # 読み込んだファイルの(更新日時, サイズ)
+        self._stamp = None
+        self._checked_at = None
+        # batch中の書き込み待ち
+        self._batch_depth = 0
+        self._dirty = False
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def _reload_if_changed(self, force: bool = False):
+        now = time.monotonic()
+        if (
+            not force
+            and self._checked_at is not None
+            and now - self._checked_at < RELOAD_CHECK_INTERVAL
+        ):
+            return
+        self._checked_at = now
+        stamp = self._file_stamp()
+        if stamp == self._stamp:
+            return
+        parser = configparser.ConfigParser()
+        if stamp is not None:
+            parser.read(self.path, encoding=CONFIG_ENCODING)
+        self._parser = parser
+        self._stamp = stamp
+
+    # ============================================
+    # 読み取り
+    # ============================================
+    def get(self, section: str, key: str, default: str = None) -> str:
+        with self._lock:
+            self._reload_if_changed()
+            return self._parser.get(section, key, fallback=default)
+
+    def get_int(self, section: str, key: str, default: int = None) -> int:
+        """整数の設定値(未設定・変換できない場合はdefault)"""
+        with self._lock:
+            self._reload_if_changed()
+            try:
+                return self._parser.getint(section, key, fallback=default)
+            except ValueError:
+                return default
+
+    def get_float(self, section: str, key: str, default: float = None) -> float:
+        """小数の設定値(未設定・変換できない場合はdefault)"""
+        with self._lock:
+            self._reload_if_changed()
+            try:
+                return self._parser.getfloat(section, key, fallback=default)
+            except ValueError:
+                return default
+
+    def get_bool(self, section: str, key: str, default: bool = None) -> bool:
+        """真偽値の設定値(true/yes/on/1など。未設定・変換できない場合はdefault)"""
+        with self._lock:
+            self._reload_if_changed()
+            try:
+                return self._parser.getboolean(section, key, fallback=default)
+            except ValueError:
+                return default
+
+    # ============================================
+    # 書き込み
+    # ============================================
+    def set(self, section: str, key: str, value):
+        """設定値を変更して保存(batch中はbatchの終了時に保存)"""
+        with self._lock:
+            # 他で変更された内容を失わないよう読み直してから変更
+            self._reload_if_changed(force=True)
+            if not self._parser.has_section(section):
+                self._parser.add_section(section)
+            if isinstance(value, bool):
+                value = "true" if value else "false"
+            self._parser.set(section, key, str(value))
+            self._dirty = True
+            if self._batch_depth == 0:
+                self._save()
+
+    @contextmanager
+    def batch(self):
+        """複数の変更をまとめて1回で保存"""
+        with self._lock:
+            self._batch_depth += 1
+            try:
+                yield self
+            finally:
+                self._batch_depth -= 1
+                if self._batch_depth == 0 and self._dirty:
+                    self._save()
+
+    def _save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, temp_path = tempfile.mkstemp(
+            prefix=".config-", suffix=".tmp", dir=directory
+        )
+        try:
+            with os.fdopen(fd, "w", encoding=CONFIG_ENCODING) as configfile:
+                self._parser.write(configfile)
+                configfile.flush()
+                os.fsync(configfile.fileno())
+            os.replace(temp_path, self.path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+        self._dirty = False
+        self._stamp = self._file_stamp()
+        self._checked_at = time.monotonic()
+
+
+# アプリ全体で共有する設定
+store = ConfigStore()
+
+
+def set_config(section: str, key: str, value):
+    store.set(section, key, value)
+
+
+def get_config(section: str, key: str, default=None):
+    return store.get(section, key, default)
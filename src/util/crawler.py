@@ -0,0 +1,220 @@
+import queue
+import random
+import threading
+import time
+from collections import deque
+
+from util.file_walker import scan_dir
+
+# 走査スレッド数(I/O待ちが主のためCPU数より多くてよい)
+DEFAULT_WORKERS = 8
+# 走査結果を保持するフォルダ数の上限(書き込みが追いつかない場合は走査を待たせる)
+QUEUE_SIZE = 64
+# 空き時に他スレッドの作業を待つ間隔(秒)
+IDLE_WAIT = 0.05
+
+# 走査完了の通知
+_DONE = object()
+
+
+class Crawler:
+    """フォルダ配下を複数スレッドで並行に走査する
+
+    スレッドごとに未走査フォルダの両端キューを持ち、自分のキューは末尾から
+    (深さ優先)、空になったら他スレッドのキューの先頭から取り出す(ワークスティーリング)。
+    走査結果は上限付きのキューで1本の読み出し側(書き込み処理)に渡すため、
+    読み出しが遅い場合は走査が待ち、メモリ使用量は一定に収まる。
+    """
+
+    def __init__(
+        self,
+        workers: int = DEFAULT_WORKERS,
+        queue_size: int = QUEUE_SIZE,
+        max_depth: int = None,
+        include: list = (),
+        exclude: list = (),
+        include_dirs: bool = True,
+        cancel=None,
+    ):
+        """
+        Args:
+            workers (int): 走査スレッド数
+            queue_size (int): 走査結果を保持するフォルダ数の上限
+            cancel (threading.Event): セットされたら走査を中断
+            その他はwalk_entriesと同じ
+        """
+        self.workers = max(1, workers)
+        self.max_depth = max_depth
+        self.include = include
+        self.exclude = exclude
+        self.include_dirs = include_dirs
+        self.cancel = cancel
+        self._output = queue.Queue(maxsize=queue_size)
+        self._deques = [deque() for _ in range(self.workers)]
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._stop = threading.Event()
+        # 計測値
+        self.dirs_scanned = 0
+        self.entries = 0
+        self.steals = 0
+        self.started_at = None
+        self.elapsed = 0.0
+
+    def files_per_second(self) -> float:
+        return self.entries / self.elapsed if self.elapsed > 0 else 0.0
+
+    def metrics(self) -> dict:
+        """計測値を取得"""
+        return {
+            "workers": self.workers,
+            "dirs_scanned": self.dirs_scanned,
+            "entries": self.entries,
+            "steals": self.steals,
+            "elapsed": self.elapsed,
+            "files_per_second": self.files_per_second(),
+        }
+
+    def crawl(self, root: str):
+        """フォルダ配下のファイル・フォルダを返す(順序は不定、ルート自身は含まない)
+
+        Yields:
+            tuple: (名称, パス, フォルダの場合True, パス情報)
+        """
+        self.started_at = time.monotonic()
+        self._pending = 1
+        self._deques[0].append((root, 1))
+        threads = [
+            threading.Thread(
+                target=self._work, args=(index,), name=f"crawler-{index}", daemon=True
+            )
+            for index in range(self.workers)
+        ]
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                try:
+                    item = self._output.get(timeout=IDLE_WAIT)
+                except queue.Empty:
+                    if self._stopped():
+                        break
+                    continue
+                if item is _DONE:
+                    break
+                if isinstance(item, BaseException):
+                    raise item
+                self.entries += len(item)
+                self.elapsed = time.monotonic() - self.started_at
+                yield from item
+        finally:
+            # 読み出し側が途中で終了した場合も走査スレッドを止める
+            self._stop.set()
+            with self._cond:
+                self._cond.notify_all()
+            for thread in threads:
+                thread.join()
+            self.elapsed = time.monotonic() - self.started_at
+
+    def _stopped(self) -> bool:
+        return self._stop.is_set() or (
+            self.cancel is not None and self.cancel.is_set()
+        )
+
+    def _take(self, index: int):
+        """走査するフォルダを取得(自分のキューが空なら他スレッドから奪う)"""
+        try:
+            return self._deques[index].pop()
+        except IndexError:
+            pass
+        others = [i for i in range(self.workers) if i != index]
+        random.shuffle(others)
+        for other in others:
+            try:
+                item = self._deques[other].popleft()
+            except IndexError:
+                continue
+            self.steals += 1
+            return item
+        return None
+
+    def _put(self, item) -> bool:
+        # 上限に達している間は待つ(中断された場合は諦める)
+        while not self._stopped():
+            try:
+                self._output.put(item, timeout=IDLE_WAIT)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _work(self, index: int):
+        try:
+            while not self._stopped():
+                item = self._take(index)
+                if item is None:
+                    with self._cond:
+                        if self._pending == 0:
+                            return
+                        self._cond.wait(IDLE_WAIT)
+                    continue
+                path, depth = item
+                found, dirs = scan_dir(
+                    path,
+                    depth,
+                    self.max_depth,
+                    self.include,
+                    self.exclude,
+                    self.include_dirs,
+                )
+                if dirs:
+                    # 未完了数を先に増やしてから積む(完了判定を誤らないため)
+                    with self._cond:
+                        self._pending += len(dirs)
+                    self._deques[index].extend(
+                        (dir_path, depth + 1) for dir_path in reversed(dirs)
+                    )
+                    with self._cond:
+                        self._cond.notify_all()
+                if found and not self._put(found):
+                    return
+                with self._cond:
+                    self.dirs_scanned += 1
+                    self._pending -= 1
+                    finished = self._pending == 0
+                    if finished:
+                        self._cond.notify_all()
+                if finished:
+                    self._put(_DONE)
+                    return
+        except BaseException as ex:
+            self._stop_with(ex)
+
+    def _stop_with(self, ex: BaseException):
+        # 例外は読み出し側で送出する
+        while True:
+            try:
+                self._output.put_nowait(ex)
+                break
+            except queue.Full:
+                try:
+                    self._output.get_nowait()
+                except queue.Empty:
+                    pass
+        self._stop.set()
+
+
+def crawl_entries(
+    root: str,
+    max_depth: int = None,
+    include: list = (),
+    exclude: list = (),
+    include_dirs: bool = True,
+    cancel=None,
+    workers: int = DEFAULT_WORKERS,
+):
+    """walk_entriesの並行版(順序は不定)"""
+    crawler = Crawler(
+        workers, QUEUE_SIZE, max_depth, include, exclude, include_dirs, cancel
+    )
+    yield from crawler.crawl(root)
@@ -0,0 +1,95 @@
+import fnmatch
+import os
+
+from util.path_info import entry_info
+
+
+def split_patterns(text: str) -> list:
+    """カンマ区切りのパターン文字列をリストに変換"""
+    return [pattern.strip() for pattern in (text or "").split(",") if pattern.strip()]
+
+
+def match_any(name: str, patterns: list) -> bool:
+    """名称がいずれかのパターンに一致するか(大文字小文字は区別しない)"""
+    name = name.casefold()
+    return any(fnmatch.fnmatchcase(name, pattern.casefold()) for pattern in patterns)
+
+
+def scan_dir(
+    path: str,
+    depth: int,
+    max_depth: int = None,
+    include: list = (),
+    exclude: list = (),
+    include_dirs: bool = True,
+) -> tuple:
+    """フォルダ直下を読み込む
+
+    Args:
+        path (str): フォルダ
+        depth (int): フォルダの階層(起点の直下が1)
+        その他はwalk_entriesと同じ
+
+    Returns:
+        tuple: (登録対象の(名称, パス, フォルダの場合True, パス情報)のリスト,
+                さらに読み込むフォルダのパスのリスト)
+    """
+    try:
+        with os.scandir(path) as it:
+            entries = sorted(it, key=lambda entry: entry.name)
+    except OSError:
+        # アクセスできないフォルダは読み飛ばす
+        return [], []
+    found = []
+    dirs = []
+    for entry in entries:
+        if exclude and match_any(entry.name, exclude):
+            continue
+        try:
+            is_dir = entry.is_dir(follow_symlinks=False)
+        except OSError:
+            continue
+        if is_dir and (max_depth is None or depth < max_depth):
+            dirs.append(entry.path)
+        if is_dir and not include_dirs:
+            continue
+        if include and not match_any(entry.name, include):
+            continue
+        found.append((entry.name, entry.path, is_dir, entry_info(entry, is_dir)))
+    return found, dirs
+
+
+def walk_entries(
+    root: str,
+    max_depth: int = None,
+    include: list = (),
+    exclude: list = (),
+    include_dirs: bool = True,
+    cancel=None,
+):
+    """フォルダ配下のファイル・フォルダを順に返す(ルート自身は含まない)
+
+    os.scandirで1フォルダずつ読み込むため、全件をメモリに保持しない。
+    シンボリックリンクのフォルダはたどらない。
+
+    Args:
+        root (str): 起点のフォルダ
+        max_depth (int): 読み込む階層の深さ(1は直下のみ、Noneは無制限)
+        include (list): 登録対象の名称パターン(空の場合はすべて)
+        exclude (list): 除外する名称パターン(一致したフォルダの配下も除外)
+        include_dirs (bool): フォルダも返す場合True
+        cancel (threading.Event): セットされたら走査を中断
+
+    Yields:
+        tuple: (名称, パス, フォルダの場合True, パス情報)
+            パス情報はpath_info.stat_pathと同じ形式
+    """
+    stack = [(root, 1)]
+    while stack:
+        if cancel is not None and cancel.is_set():
+            return
+        path, depth = stack.pop()
+        found, dirs = scan_dir(path, depth, max_depth, include, exclude, include_dirs)
+        yield from found
+        # 名前順に走査するため逆順に積む
+        stack.extend((dir_path, depth + 1) for dir_path in reversed(dirs))
@@ -0,0 +1,123 @@
+import errno
+import os
+import stat
+import time
+
+# 種類
+KIND_FILE = "file"
+KIND_DIR = "dir"
+
+# リンク状態
+LINK_OK = "ok"
+LINK_MISSING = "missing"
+LINK_ERROR = "error"
+LINK_TIMEOUT = "timeout"
+# リンク状態 -> 表示名
+LINK_STATUS_TEXT = {
+    LINK_OK: "正常",
+    LINK_MISSING: "リンク切れ",
+    LINK_TIMEOUT: "タイムアウト",
+    LINK_ERROR: "アクセスエラー",
+}
+
+# 存在しないと判断するエラー(それ以外は権限・ネットワーク等のエラー)
+_MISSING_ERRORS = (errno.ENOENT, errno.ENOTDIR)
+
+
+def _fingerprint(st: os.stat_result, inode: int = None) -> tuple:
+    """移動・名前変更の追跡に使う(デバイス, inode/ファイルID)
+
+    取得できない値(0)はNone
+    """
+    return st.st_dev or None, (inode if inode is not None else st.st_ino) or None
+
+
+def stat_path(path: str) -> tuple:
+    """パスの情報を取得
+
+    Returns:
+        tuple: (種類, サイズ, 更新日時, 存在する場合1, 確認日時, リンク状態,
+                デバイス, inode)
+            存在しない・アクセスできない場合は種類・サイズ・更新日時・デバイス・inodeがNone、
+            アクセスできない場合は存在有無もNone
+    """
+    checked_at = time.time()
+    try:
+        st = os.stat(path)
+    except ValueError:
+        return None, None, None, None, checked_at, LINK_ERROR, None, None
+    except OSError as ex:
+        if ex.errno in _MISSING_ERRORS:
+            return None, None, None, 0, checked_at, LINK_MISSING, None, None
+        # 存在有無は判断できない
+        return None, None, None, None, checked_at, LINK_ERROR, None, None
+    if stat.S_ISDIR(st.st_mode):
+        return (KIND_DIR, None, st.st_mtime, 1, checked_at, LINK_OK, *_fingerprint(st))
+    return (
+        KIND_FILE,
+        st.st_size,
+        st.st_mtime,
+        1,
+        checked_at,
+        LINK_OK,
+        *_fingerprint(st),
+    )
+
+
+def entry_info(entry: os.DirEntry, is_dir: bool) -> tuple:
+    """os.scandirの結果からパスの情報を取得(stat_pathと同じ形式)"""
+    checked_at = time.time()
+    kind = KIND_DIR if is_dir else KIND_FILE
+    try:
+        st = entry.stat(follow_symlinks=False)
+        # Windowsではstatの結果にファイルIDが含まれないためinode()で取得
+        fingerprint = _fingerprint(st, entry.inode())
+    except OSError:
+        return kind, None, None, 1, checked_at, LINK_OK, None, None
+    size = None if is_dir else st.st_size
+    return kind, size, st.st_mtime, 1, checked_at, LINK_OK, *fingerprint
+
+
+def volume_of(path: str) -> str:
+    """パスのボリューム(ドライブ・共有フォルダ・先頭のフォルダ)"""
+    drive, rest = os.path.splitdrive(path)
+    if drive:
+        return drive.casefold()
+    parts = rest.replace("\\", "/").strip("/").split("/", 1)
+    return "/" + parts[0] if parts[0] else "/"
+
+
+def nearest_ancestor(path: str, exists=os.path.exists) -> str:
+    """存在する最も近い親フォルダ(見つからない場合は空文字)
+
+    Args:
+        path (str): パス
+        exists (function): 存在確認の関数(キャッシュする場合に差し替える)
+    """
+    current = os.path.dirname(path)
+    while current:
+        if exists(current):
+            return current
+        parent = os.path.dirname(current)
+        if parent == current:
+            break
+        current = parent
+    return ""
+
+
+def format_size(size) -> str:
+    """サイズを表示用の文字列に変換"""
+    if size is None:
+        return ""
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} TB"
+
+
+def format_mtime(mtime) -> str:
+    """更新日時を表示用の文字列に変換"""
+    if mtime is None:
+        return ""
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(mtime))
@@ -0,0 +1,129 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+# 入力が止まってから検索を開始するまでの待ち時間(秒)
+DEFAULT_DELAY = 0.25
+
+# 実行前に破棄した検索の戻り値
+_SKIPPED = object()
+
+
+class SearchScheduler:
+    """入力中検索のスケジューラ
+
+    入力のたびにrequestを呼ぶと、入力が止まるまで待ってから(デバウンス)
+    バックグラウンドのワーカーで検索を実行する。
+    新しい入力があった時点で古い検索は不要になるため、
+    未実行のものは実行せず、実行済みの結果は破棄して最新の結果のみon_resultに渡す。
+
+    on_result/on_errorはワーカースレッドから呼ばれる
+    """
+
+    def __init__(
+        self,
+        run,
+        on_result,
+        on_error=None,
+        delay: float = DEFAULT_DELAY,
+        submit=None,
+    ):
+        """
+        Args:
+            run (function): 検索処理。requestの引数をそのまま受け取る
+            on_result (function): 最新の検索結果を受け取る処理
+            on_error (function): 最新の検索で発生した例外を受け取る処理
+            delay (float): デバウンスの待ち時間(秒)
+            submit (function): 検索処理をFutureとして実行する関数
+                (省略時は専用のワーカースレッドで実行)
+        """
+        self.run = run
+        self.on_result = on_result
+        self.on_error = on_error
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._timer = None
+        self._executor = None
+        if submit is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="search"
+            )
+            submit = self._executor.submit
+        self._submit = submit
+        # 計測値
+        self.requests = 0
+        self.queries_issued = 0
+        self.queries_skipped = 0
+        self.results_dropped = 0
+
+    def request(self, *args, delay: float = None):
+        """検索を予約(以前の予約・実行中の検索は古いものとして扱う)"""
+        with self._lock:
+            self.requests += 1
+            self._generation += 1
+            generation = self._generation
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(
+                self.delay if delay is None else delay,
+                self._dispatch,
+                (generation, args),
+            )
+            self._timer.daemon = True
+            self._timer.start()
+
+    def cancel(self):
+        """予約済み・実行中の検索を破棄"""
+        with self._lock:
+            self._generation += 1
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def shutdown(self):
+        self.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+    def metrics(self) -> dict:
+        """計測値を取得"""
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "queries_issued": self.queries_issued,
+                "queries_skipped": self.queries_skipped,
+                "results_dropped": self.results_dropped,
+            }
+
+    def _is_current(self, generation: int) -> bool:
+        with self._lock:
+            return generation == self._generation
+
+    def _dispatch(self, generation: int, args: tuple):
+        if not self._is_current(generation):
+            return
+        future = self._submit(self._run, generation, args)
+        future.add_done_callback(lambda f: self._deliver(generation, f))
+
+    def _run(self, generation: int, args: tuple):
+        # ワーカーの空き待ちの間に新しい入力があれば実行しない
+        with self._lock:
+            if generation != self._generation:
+                self.queries_skipped += 1
+                return _SKIPPED
+            self.queries_issued += 1
+        return self.run(*args)
+
+    def _deliver(self, generation: int, future: Future):
+        if not future.exception() and future.result() is _SKIPPED:
+            return
+        with self._lock:
+            if generation != self._generation:
+                self.results_dropped += 1
+                return
+        ex = future.exception()
+        if ex is not None:
+            if self.on_error:
+                self.on_error(ex)
+            return
+        self.on_result(future.result())
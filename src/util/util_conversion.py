@@ -1,3 +1,32 @@
-def str2bool(value: set):
-    """Convert a string to a boolean."""
-    return str(value).lower() in ["true", "1", "t", "yes", "y"]
+import re
+
+
+def path_key(path: str) -> str:
+    """Normalize a path for duplicate detection.
+
+    Case is folded, separators are unified to "/" and trailing
+    separators are removed.
+    """
+    key = str(path).strip().replace("\\", "/").casefold()
+    # 連続した区切り文字を1つにまとめる(UNCパス先頭の"//"は維持)
+    key = key[:2] + re.sub(r"/{2,}", "/", key[2:])
+    stripped = key.rstrip("/")
+    return stripped if stripped else key[:1]
+
+
+def split_path(path: str) -> tuple:
+    """Split a path into its folder (with trailing separator) and basename.
+
+    Trailing separators of the path are ignored. A path without a separator
+    has an empty folder.
+    """
+    path = str(path)
+    stripped = path.rstrip("/\\") or path
+    index = max(stripped.rfind("/"), stripped.rfind("\\"))
+    return stripped[: index + 1], stripped[index + 1 :]
+
+
+def location_key(path: str) -> tuple:
+    """Normalize a path as (folder key, basename key) for duplicate detection."""
+    folder, basename = split_path(path)
+    return path_key(folder), path_key(basename)
@@ -1,56 +1,937 @@
-import sqlite3
-
-
-def insert_file_joined(cursor: sqlite3.Cursor, file_id: int, tag: str, number_of: int):
-    """タグ登録と紐づけ登録
-
-    Args:
-        cursor (sqlite3.Cursor): _description_
-        file_id (int): _description_
-        tag (str): _description_
-    """
-    tag_id = 0
-    cursor.execute(
-        "SELECT id FROM tag_mng WHERE tag_name = ?",
-        (tag,),
-    )
-    # 既存レコードがない場合のみ挿入
-    result = cursor.fetchone()
-    if not result:
-        cursor.execute(
-            "INSERT INTO tag_mng (tag_name) VALUES (?)",
-            (tag,),
-        )
-        tag_id = cursor.lastrowid
-    else:
-        tag_id = result[0]
-    cursor.execute(
-        "INSERT OR IGNORE INTO file_tags (file_id, tag_id, number_of) VALUES (?,?,?)",
-        (file_id, tag_id, number_of),
-    )
-
-
-def delete_tag(cursor: sqlite3.Cursor, tag: str) -> bool:
-    """タグ削除
-
-    Args:
-        cursor (sqlite3.Cursor): _description_
-        tag (str): _description_
-    """
-    cursor.execute(
-        "SELECT id FROM tag_mng WHERE tag_name = ?",
-        (tag,),
-    )
-    # 既存レコードがない場合のみ挿入
-    result = cursor.fetchone()
-    if result:
-        tag_id = result[0]
-        cursor.execute(
-            "DELETE FROM tag_mng WHERE tag_name = ?",
-            (tag,),
-        )
-        cursor.execute(
-            "DELETE FROM file_tags WHERE tag_id = ?",
-            (tag_id,),
-        )
-    return True if result else False
+import sqlite3
+import time
+from util.util_conversion import location_key, path_key, split_path
+
+# トリガーでレコード数を更新するテーブル
+COUNTED_TABLES = ("file_entries", "dirs", "tag_mng", "file_tags")
+# 件数を元のテーブルのレコード数で表示するビュー・FTSのテーブル
+COUNT_SOURCES = {
+    "files": "file_entries",
+    "files_fts": "file_entries",
+    "dirs_fts": "dirs",
+}
+
+
+def tags_key_sql(file_id: str) -> str:
+    """ファイルのタグ名を登録順(number_of)にカンマ区切りで連結する式
+
+    並び替え用のfile_entries.tags_key(トリガーで更新)の値。タグなしは空文字
+
+    Args:
+        file_id (str): ファイルIDの式(new.file_id、file_entries.idなど)
+    """
+    return f"""
+        IFNULL((
+            SELECT GROUP_CONCAT(tag_name)
+            FROM (
+                SELECT t.tag_name
+                FROM file_tags j
+                JOIN tag_mng t ON j.tag_id = t.id
+                WHERE j.file_id = {file_id}
+                ORDER BY j.number_of
+            )
+        ), '')
+    """
+
+
+def select_tag_ids(cursor: sqlite3.Cursor, tags: list) -> dict:
+    """タグIDを取得(未登録のタグはまとめて登録)
+
+    Args:
+        cursor (sqlite3.Cursor): カーソル
+        tags (list): タグ名のリスト(重複なし)
+
+    Returns:
+        dict: タグ名 -> タグID
+    """
+    if not tags:
+        return {}
+    # 登録済みのタグはタグ名の一意インデックスで除外する
+    values = ",".join(["(?)"] * len(tags))
+    cursor.execute(f"INSERT OR IGNORE INTO tag_mng (tag_name) VALUES {values}", tags)
+    placeholders = ",".join("?" * len(tags))
+    cursor.execute(
+        f"SELECT tag_name, id FROM tag_mng WHERE tag_name IN ({placeholders})",
+        tags,
+    )
+    return dict(cursor.fetchall())
+
+
+def link_tags(cursor: sqlite3.Cursor, file_id: int, tags: list, start: int = 0):
+    """タグ登録と紐づけ登録(一括)
+
+    未登録のタグをまとめて登録し、タグIDを1回のクエリで取得して紐づける
+
+    Args:
+        cursor (sqlite3.Cursor): カーソル
+        file_id (int): ファイルID
+        tags (list): タグ名のリスト(並び順がnumber_ofになる)
+        start (int): number_ofの開始値
+    """
+    # 重複を除去(順序は維持)
+    tags = list(dict.fromkeys(tags))
+    if not tags:
+        return
+    tag_ids = select_tag_ids(cursor, tags)
+    cursor.executemany(
+        "INSERT OR IGNORE INTO file_tags (file_id, tag_id, number_of) VALUES (?,?,?)",
+        [(file_id, tag_ids[tag], start + index) for index, tag in enumerate(tags)],
+    )
+
+
+def unlink_tags(cursor: sqlite3.Cursor, file_id: int, tags: list) -> int:
+    """タグの紐づけ解除(タグ自体は削除しない)
+
+    Returns:
+        int: 解除した件数
+    """
+    if not tags:
+        return 0
+    placeholders = ",".join("?" * len(tags))
+    cursor.execute(
+        f"""
+        DELETE FROM file_tags
+        WHERE file_id = ?
+        AND tag_id IN (SELECT id FROM tag_mng WHERE tag_name IN ({placeholders}))
+        """,
+        (file_id, *tags),
+    )
+    return cursor.rowcount
+
+
+def insert_file_joined(cursor: sqlite3.Cursor, file_id: int, tag: str, number_of: int):
+    """タグ登録と紐づけ登録
+
+    Args:
+        cursor (sqlite3.Cursor): カーソル
+        file_id (int): ファイルID
+        tag (str): タグ名
+        number_of (int): 並び順
+    """
+    link_tags(cursor, file_id, [tag], number_of)
+
+
+# パス情報の列(path_info.stat_pathの戻り値の順)
+INFO_COLUMNS = (
+    "kind, size, mtime, exists_flag, checked_at, link_status, fp_dev, fp_ino"
+)
+NO_INFO = (None,) * 8
+# IN句に渡すパラメータ数の上限
+IN_BATCH = 500
+
+
+def _select_dir_ids(cursor: sqlite3.Cursor, keys: list) -> dict:
+    ids = {}
+    for start in range(0, len(keys), IN_BATCH):
+        chunk = keys[start : start + IN_BATCH]
+        placeholders = ",".join("?" * len(chunk))
+        cursor.execute(
+            f"SELECT path_key, id FROM dirs WHERE path_key IN ({placeholders})",
+            chunk,
+        )
+        ids.update(cursor.fetchall())
+    return ids
+
+
+def intern_dirs(cursor: sqlite3.Cursor, dir_paths) -> dict:
+    """フォルダIDを取得(未登録のフォルダは親フォルダを含めてまとめて登録)
+
+    Args:
+        cursor (sqlite3.Cursor): 書き込みセッションのカーソル
+        dir_paths (iterable): フォルダのパス(util_conversion.split_pathの戻り値)
+
+    Returns:
+        dict: 正規化したフォルダのパス -> フォルダID(登録した親フォルダを含む)
+    """
+    # 正規化パスが同じフォルダは最初のパスの表記で登録する
+    paths = {}
+    for dir_path in dir_paths:
+        paths.setdefault(path_key(dir_path), dir_path)
+    ids = _select_dir_ids(cursor, list(paths))
+    missing = [key for key in paths if key not in ids]
+    if not missing:
+        return ids
+    rows = []
+    parents = {}
+    for key in missing:
+        parent_path, name = split_path(paths[key])
+        parent_key = path_key(parent_path)
+        # UNCパスの先頭("\\\\")は親フォルダにしない
+        unc_head = len(parent_path) > 1 and not parent_path.strip("/\\")
+        if parent_path and parent_key != key and not unc_head:
+            parents[key] = parent_key
+            rows.append((key, parent_path, name))
+        else:
+            # ドライブ・ルートフォルダ・共有フォルダのサーバー
+            rows.append((key, None, paths[key].rstrip("/\\") or paths[key]))
+    parent_ids = intern_dirs(cursor, [row[1] for row in rows if row[1] is not None])
+    cursor.executemany(
+        "INSERT INTO dirs (parent_id, name, path, path_key) VALUES (?, ?, ?, ?)",
+        [
+            (parent_ids.get(parents.get(key)), name, paths[key], key)
+            for key, _, name in rows
+            # 親フォルダとして登録済みのもの以外
+            if key not in parent_ids
+        ],
+    )
+    ids.update(parent_ids)
+    ids.update(_select_dir_ids(cursor, [key for key in missing if key not in ids]))
+    return ids
+
+
+# ファイル・子フォルダのないフォルダ
+_ORPHAN_DIR = """
+    NOT EXISTS (SELECT 1 FROM file_entries WHERE dir_id = dirs.id)
+    AND NOT EXISTS (SELECT 1 FROM dirs c WHERE c.parent_id = dirs.id)
+"""
+
+
+def _select_orphan_dirs(cursor: sqlite3.Cursor, dir_ids: list) -> list:
+    rows = []
+    for start in range(0, len(dir_ids), IN_BATCH):
+        chunk = dir_ids[start : start + IN_BATCH]
+        placeholders = ",".join("?" * len(chunk))
+        cursor.execute(
+            f"""
+            SELECT id, parent_id FROM dirs
+            WHERE id IN ({placeholders}) AND {_ORPHAN_DIR}
+            """,
+            chunk,
+        )
+        rows += cursor.fetchall()
+    return rows
+
+
+def delete_orphan_dirs(cursor: sqlite3.Cursor, dir_ids=None) -> int:
+    """ファイル・子フォルダのなくなったフォルダを削除
+
+    削除したフォルダの親フォルダも同様に削除する
+
+    Args:
+        cursor (sqlite3.Cursor): 書き込みセッションのカーソル
+        dir_ids (iterable): ファイルを削除・移動した元のフォルダID(Noneはすべてのフォルダ)
+
+    Returns:
+        int: 削除したフォルダの数
+    """
+    if dir_ids is None:
+        cursor.execute(f"SELECT id, parent_id FROM dirs WHERE {_ORPHAN_DIR}")
+        rows = cursor.fetchall()
+    else:
+        rows = _select_orphan_dirs(cursor, list({i for i in dir_ids if i is not None}))
+    deleted = 0
+    while rows:
+        ids = [row[0] for row in rows]
+        for start in range(0, len(ids), IN_BATCH):
+            chunk = ids[start : start + IN_BATCH]
+            placeholders = ",".join("?" * len(chunk))
+            cursor.execute(f"DELETE FROM dirs WHERE id IN ({placeholders})", chunk)
+        deleted += len(ids)
+        parents = {row[1] for row in rows if row[1] is not None}
+        rows = _select_orphan_dirs(cursor, list(parents))
+    return deleted
+
+
+def _location(cursor: sqlite3.Cursor, filepath: str) -> tuple:
+    """パスを(フォルダID, ファイル名, 正規化したファイル名)に変換(フォルダは登録する)"""
+    dir_path, basename = split_path(filepath)
+    dir_id = intern_dirs(cursor, [dir_path])[path_key(dir_path)]
+    return dir_id, basename, path_key(basename)
+
+
+def register_file(
+    cursor: sqlite3.Cursor,
+    filename: str,
+    filepath: str,
+    memo: str = "",
+    info: tuple = NO_INFO,
+) -> tuple:
+    """ファイル登録(登録済みのパスは登録しない)
+
+    (フォルダID, 正規化したファイル名)の一意インデックスで重複を判定する
+
+    Args:
+        cursor (sqlite3.Cursor): カーソル
+        filename (str): 名称
+        filepath (str): パス
+        memo (str): メモ
+        info (tuple): パス情報(path_info.stat_pathの戻り値)
+
+    Returns:
+        tuple: (ファイルID, 新規登録の場合True)
+    """
+    location = _location(cursor, filepath)
+    cursor.execute(
+        f"""
+        INSERT INTO file_entries
+            (dir_id, basename, name_key, filename, memo, {INFO_COLUMNS})
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (dir_id, name_key) DO NOTHING
+        """,
+        (*location, filename, memo, *info),
+    )
+    if cursor.rowcount == 1:
+        return cursor.lastrowid, True
+    cursor.execute(
+        "SELECT id FROM file_entries WHERE dir_id = ? AND name_key = ?",
+        (location[0], location[2]),
+    )
+    return cursor.fetchone()[0], False
+
+
+def register_files(cursor: sqlite3.Cursor, entries: list, tags: list = ()) -> int:
+    """ファイル一括登録(登録済みのパスは登録しない)
+
+    新規登録したファイルにのみタグを紐づける。
+    タグは新規登録したファイルがある場合のみ登録する
+
+    Args:
+        cursor (sqlite3.Cursor): 書き込みセッションのカーソル
+        entries (list): (名称, パス, パス情報の各値)のリスト
+        tags (list): 紐づけるタグ名のリスト(重複なし、並び順がnumber_ofになる)
+
+    Returns:
+        int: 新規登録した件数
+    """
+    # 書き込みは1本の接続で直列に行うため、以降のIDは今回の登録分になる
+    cursor.execute("SELECT IFNULL(MAX(id), 0) FROM file_entries")
+    last_id = cursor.fetchone()[0]
+    splitted = [split_path(filepath) for _, filepath, *_ in entries]
+    dir_ids = intern_dirs(cursor, [dir_path for dir_path, _ in splitted])
+    cursor.executemany(
+        f"""
+        INSERT INTO file_entries
+            (dir_id, basename, name_key, filename, memo, {INFO_COLUMNS})
+        VALUES (?, ?, ?, ?, '', ?, ?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (dir_id, name_key) DO NOTHING
+        """,
+        [
+            (dir_ids[path_key(dir_path)], basename, path_key(basename), filename, *info)
+            for (dir_path, basename), (filename, _, *info) in zip(splitted, entries)
+        ],
+    )
+    count = cursor.rowcount
+    if count > 0 and tags:
+        tag_ids = select_tag_ids(cursor, tags)
+        cursor.executemany(
+            """
+            INSERT OR IGNORE INTO file_tags (file_id, tag_id, number_of)
+            SELECT id, ?, ? FROM file_entries WHERE id > ?
+            """,
+            [(tag_ids[tag], index, last_id) for index, tag in enumerate(tags)],
+        )
+    return count
+
+
+def find_file_by_path(cursor: sqlite3.Cursor, filepath: str):
+    """パスから登録済みのファイルを取得
+
+    Returns:
+        tuple: (id, filename, filepath, memo)。未登録の場合None
+    """
+    cursor.execute(
+        """
+        SELECT id, filename, filepath, memo FROM files
+        WHERE dir_key = ? AND name_key = ?
+        """,
+        location_key(filepath),
+    )
+    return cursor.fetchone()
+
+
+def select_registered_locations(cursor: sqlite3.Cursor, paths: list) -> set:
+    """登録済みのパスを取得
+
+    Returns:
+        set: 登録済みのパスの(正規化したフォルダのパス, 正規化したファイル名)
+    """
+    keys = list(dict.fromkeys(location_key(path) for path in paths))
+    registered = set()
+    for start in range(0, len(keys), IN_BATCH):
+        chunk = keys[start : start + IN_BATCH]
+        values = ",".join(["(?, ?)"] * len(chunk))
+        cursor.execute(
+            f"""
+            WITH p(dir_key, name_key) AS (VALUES {values})
+            SELECT p.dir_key, p.name_key
+            FROM p
+            JOIN dirs d ON d.path_key = p.dir_key
+            JOIN file_entries f ON f.dir_id = d.id AND f.name_key = p.name_key
+            """,
+            [value for key in chunk for value in key],
+        )
+        registered.update(cursor.fetchall())
+    return registered
+
+
+def update_file(
+    cursor: sqlite3.Cursor,
+    file_id: int,
+    filename: str,
+    filepath: str,
+    memo: str,
+    tags: list,
+    info: tuple = None,
+):
+    """ファイル情報とタグの更新
+
+    Args:
+        info (tuple): 変更後のパスのパス情報(パスを変更しない場合はNone)
+
+    Raises:
+        sqlite3.IntegrityError: 変更後のパスが他のファイルで登録済みの場合
+    """
+    cursor.execute("SELECT dir_id FROM file_entries WHERE id = ?", (file_id,))
+    old_dir_ids = [row[0] for row in cursor.fetchall()]
+    cursor.execute(
+        """
+        UPDATE file_entries
+        SET dir_id = ?, basename = ?, name_key = ?, filename = ?, memo = ?
+        WHERE id = ?
+        """,
+        (*_location(cursor, filepath), filename, memo, file_id),
+    )
+    delete_orphan_dirs(cursor, old_dir_ids)
+    if info is not None:
+        update_file_info(cursor, [(file_id, *info, None)])
+    cursor.execute("DELETE FROM file_tags WHERE file_id = ?", (file_id,))
+    link_tags(cursor, file_id, tags)
+
+
+def update_file_info(cursor: sqlite3.Cursor, rows: list):
+    """パス情報の更新
+
+    存在しなくなったパスは種類・サイズ・更新日時・フィンガープリントを前回の値のまま残す
+    (移動先の追跡に使うため)。
+    存在有無がNone(タイムアウト等で確認できなかった)の場合はリンク状態のみ更新し、
+    存在する最も近い親フォルダも前回の値のまま残す
+
+    Args:
+        cursor (sqlite3.Cursor): カーソル
+        rows (list): (ファイルID, パス情報の各値, 存在する最も近い親フォルダ)のリスト
+    """
+    cursor.executemany(
+        """
+        UPDATE file_entries
+        SET kind = IFNULL(?2, kind),
+            size = CASE WHEN ?5 THEN ?3 ELSE size END,
+            mtime = IFNULL(?4, mtime),
+            exists_flag = IFNULL(?5, exists_flag),
+            checked_at = ?6,
+            link_status = ?7,
+            fp_dev = IFNULL(?8, fp_dev),
+            fp_ino = IFNULL(?9, fp_ino),
+            nearest_ancestor = CASE WHEN ?5 IS NULL THEN nearest_ancestor ELSE ?10 END
+        WHERE id = ?1
+        """,
+        rows,
+    )
+
+
+def select_link_summary(cursor: sqlite3.Cursor) -> tuple:
+    """リンク状態ごとの件数
+
+    Returns:
+        tuple: ({リンク状態(未確認はNone): 件数}, 最も古い確認日時)
+    """
+    cursor.execute(
+        "SELECT link_status, COUNT(*) FROM file_entries GROUP BY link_status"
+    )
+    counts = dict(cursor.fetchall())
+    cursor.execute(
+        "SELECT MIN(checked_at) FROM file_entries WHERE checked_at IS NOT NULL"
+    )
+    return counts, cursor.fetchone()[0]
+
+
+def select_files_to_check(
+    cursor: sqlite3.Cursor, checked_before: float, limit: int
+) -> list:
+    """パス情報の再確認が必要なファイル
+
+    移動したフォルダ(dirs.moved_at)の配下で移動後に確認していないものを先に、
+    残りは未確認・確認日時の古い順
+
+    Returns:
+        list: (id, filepath)のリスト
+    """
+    cursor.execute(
+        """
+        SELECT f.id, f.filepath FROM dirs d
+        JOIN files f ON f.dir_id = d.id
+        WHERE d.moved_at IS NOT NULL
+            AND (f.checked_at IS NULL OR f.checked_at < d.moved_at)
+        LIMIT ?
+        """,
+        (limit,),
+    )
+    files = cursor.fetchall()
+    if len(files) >= limit:
+        return files
+    cursor.execute(
+        """
+        SELECT id, filepath FROM files
+        WHERE checked_at IS NULL OR checked_at < ?
+        ORDER BY checked_at
+        LIMIT ?
+        """,
+        (checked_before, limit),
+    )
+    ids = {row[0] for row in files}
+    rest = [row for row in cursor.fetchall() if row[0] not in ids]
+    return files + rest[: limit - len(files)]
+
+
+def clear_moved_dirs(cursor: sqlite3.Cursor, file_ids: list) -> int:
+    """確認したファイルのフォルダのうち、配下を移動後にすべて確認したものの印を外す
+
+    Args:
+        cursor (sqlite3.Cursor): 書き込みセッションのカーソル
+        file_ids (list): 確認したファイルID
+
+    Returns:
+        int: 印を外したフォルダの数
+    """
+    cleared = 0
+    for start in range(0, len(file_ids), IN_BATCH):
+        chunk = file_ids[start : start + IN_BATCH]
+        placeholders = ",".join("?" * len(chunk))
+        cursor.execute(
+            f"""
+            UPDATE dirs SET moved_at = NULL
+            WHERE moved_at IS NOT NULL
+                AND id IN (SELECT dir_id FROM file_entries WHERE id IN ({placeholders}))
+                AND NOT EXISTS (
+                    SELECT 1 FROM file_entries f
+                    WHERE f.dir_id = dirs.id
+                        AND (f.checked_at IS NULL OR f.checked_at < dirs.moved_at)
+                )
+            """,
+            chunk,
+        )
+        cleared += cursor.rowcount
+    return cleared
+
+
+def delete_tag(cursor: sqlite3.Cursor, tag: str) -> bool:
+    """タグ削除
+
+    Args:
+        cursor (sqlite3.Cursor): _description_
+        tag (str): _description_
+    """
+    cursor.execute(
+        "SELECT id FROM tag_mng WHERE tag_name = ?",
+        (tag,),
+    )
+    # 既存レコードがない場合のみ挿入
+    result = cursor.fetchone()
+    if result:
+        tag_id = result[0]
+        # タグを先に削除する。並び替え用のタグ列はタグ削除のトリガーで1回だけ更新し、
+        # 紐づけの削除ごとには更新しない
+        cursor.execute(
+            "DELETE FROM tag_mng WHERE tag_name = ?",
+            (tag,),
+        )
+        cursor.execute(
+            "DELETE FROM file_tags WHERE tag_id = ?",
+            (tag_id,),
+        )
+    return True if result else False
+
+
+def delete_file(cursor: sqlite3.Cursor, file_id: int):
+    """ファイルと紐づけの削除(ファイルのなくなったフォルダも削除)"""
+    cursor.execute("SELECT dir_id FROM file_entries WHERE id = ?", (file_id,))
+    dir_ids = [row[0] for row in cursor.fetchall()]
+    cursor.execute("DELETE FROM file_tags WHERE file_id = ?", (file_id,))
+    cursor.execute("DELETE FROM file_entries WHERE id = ?", (file_id,))
+    delete_orphan_dirs(cursor, dir_ids)
+
+
+def prefix_range(prefix: str) -> tuple:
+    """パスの配下(自身を含む)を正規化パスの範囲で表す
+
+    Returns:
+        tuple: (正規化パス, 配下の下限, 配下の上限(含まない))
+    """
+    key = path_key(prefix)
+    base = key if key.endswith("/") else key + "/"
+    # "/"の次の文字("0")を上限にすると配下のみの範囲になる
+    return key, base, base[:-1] + "0"
+
+
+def _prefix_where(alias: str = "") -> str:
+    column = f"{alias}path_key"
+    return f"({column} = :key OR ({column} >= :lower AND {column} < :upper))"
+
+
+def _prefix_params(old_prefix: str, new_prefix: str) -> dict:
+    key, lower, upper = prefix_range(old_prefix)
+    new_key = path_key(new_prefix)
+    if new_key.endswith("/"):
+        new_key = new_key[:-1]
+    # 配下の区切り文字は残りの部分に含まれるため末尾の区切り文字は除く
+    new_path = new_prefix.rstrip("/\\")
+    return {
+        "key": key,
+        "lower": lower,
+        "upper": upper,
+        # 置換する正規化パスの文字数
+        "cut": len(key.rstrip("/")),
+        "new_key": new_key,
+        "new_path": new_path,
+    }
+
+
+def _replace_prefix(path: str, params: dict) -> str:
+    """パスの先頭(変更前のフォルダ)を変更後のフォルダに置換"""
+    # 区切り文字の重複・大文字小文字の変換で正規化パスと文字数が変わる場合は位置を探す
+    cut = next(
+        (
+            index
+            for index in (params["cut"], *range(len(path) + 1))
+            if index <= len(path)
+            and path_key(path[:index]) == params["key"]
+            and (index == len(path) or path[index] in "/\\")
+        ),
+        None,
+    )
+    if cut is None:
+        # 元のパスで位置が決まらない場合は正規化パスの残りの部分を使う
+        return params["new_path"] + path_key(path)[params["cut"] :]
+    return params["new_path"] + path[cut:]
+
+
+def _is_nested(old_prefix: str, new_prefix: str) -> bool:
+    old_key, old_lower, old_upper = prefix_range(old_prefix)
+    new_key, new_lower, new_upper = prefix_range(new_prefix)
+    return (
+        old_key == new_key
+        or old_lower <= new_key < old_upper
+        or new_lower <= old_key < new_upper
+    )
+
+
+def _find_file(cursor: sqlite3.Cursor, filepath: str):
+    cursor.execute(
+        "SELECT id, filepath FROM files WHERE dir_key = ? AND name_key = ?",
+        location_key(filepath),
+    )
+    return cursor.fetchone()
+
+
+def preview_path_prefix(
+    cursor: sqlite3.Cursor, old_prefix: str, new_prefix: str, limit: int = 20
+) -> tuple:
+    """パスの前方一致置換のプレビュー
+
+    Returns:
+        tuple: (対象件数, 競合件数, (変更前, 変更後)の例のリスト, 競合するパスの例のリスト)
+    """
+    params = _prefix_params(old_prefix, new_prefix)
+    # フォルダ自身の登録
+    own = _find_file(cursor, old_prefix)
+    cursor.execute(
+        f"""
+        SELECT COUNT(*) FROM file_entries
+        WHERE dir_id IN (SELECT id FROM dirs WHERE {_prefix_where()})
+        """,
+        params,
+    )
+    count = cursor.fetchone()[0] + (1 if own else 0)
+    cursor.execute(
+        f"""
+        SELECT filepath FROM files
+        WHERE dir_id IN (SELECT id FROM dirs WHERE {_prefix_where()})
+        ORDER BY dir_key, name_key
+        LIMIT :limit
+        """,
+        {**params, "limit": limit},
+    )
+    paths = ([own[1]] if own else []) + [row[0] for row in cursor.fetchall()]
+    samples = [(path, _replace_prefix(path, params)) for path in paths[:limit]]
+    if _is_nested(old_prefix, new_prefix):
+        return count, count, samples, []
+    # 置換後のパスが登録済みのもの
+    cursor.execute(
+        f"""
+        SELECT e.filepath
+        FROM files m
+        JOIN files e
+            ON e.dir_key = :new_key || substr(m.dir_key, :cut + 1)
+            AND e.name_key = m.name_key
+        WHERE m.dir_id IN (SELECT id FROM dirs WHERE {_prefix_where()})
+        """,
+        params,
+    )
+    conflicts = [row[0] for row in cursor.fetchall()]
+    if own:
+        existing = _find_file(cursor, new_prefix)
+        if existing:
+            conflicts.insert(0, existing[1])
+    return count, len(conflicts), samples, conflicts[:limit]
+
+
+def rewrite_path_prefix(cursor: sqlite3.Cursor, old_prefix: str, new_prefix: str) -> int:
+    """パスの前方一致置換(配下のパスをまとめて付け替える)
+
+    ファイルはフォルダIDで参照しているため、フォルダ(dirs)のパスのみ置換する。
+    変更後のフォルダが登録済みの場合は統合する。
+    置換したフォルダには移動日時の印を付け、配下のファイルのパス情報は
+    バックグラウンドの確認で優先して更新する
+
+    Args:
+        cursor (sqlite3.Cursor): 書き込みセッションのカーソル
+        old_prefix (str): 変更前のフォルダ
+        new_prefix (str): 変更後のフォルダ
+
+    Raises:
+        ValueError: 変更前と変更後が同じ、または一方が他方の配下の場合
+        sqlite3.IntegrityError: 置換後のパスが登録済みの場合
+
+    Returns:
+        int: 更新した件数
+    """
+    if _is_nested(old_prefix, new_prefix):
+        raise ValueError("変更前と変更後のフォルダが同じか、一方が他方の配下です")
+    params = _prefix_params(old_prefix, new_prefix)
+    cursor.execute(
+        f"""
+        SELECT COUNT(*) FROM file_entries
+        WHERE dir_id IN (SELECT id FROM dirs WHERE {_prefix_where()})
+        """,
+        params,
+    )
+    count = cursor.fetchone()[0]
+    cursor.execute(
+        f"SELECT id, parent_id, path FROM dirs WHERE {_prefix_where()}", params
+    )
+    moved = []
+    for dir_id, parent_id, path in cursor.fetchall():
+        new_path = _replace_prefix(path, params)
+        moved.append((dir_id, parent_id, new_path, path_key(new_path)))
+    moved_ids = {row[0] for row in moved}
+    existing = _select_dir_ids(cursor, [row[3] for row in moved])
+    # 変更後のフォルダが登録済みの場合は統合する フォルダID -> 統合先のフォルダID
+    merged = {row[0]: existing[row[3]] for row in moved if row[3] in existing}
+    renamed = []
+    # 置換したフォルダの最上位 フォルダID -> 変更後の親フォルダ
+    top_parents = {}
+    for dir_id, parent_id, new_path, new_key in moved:
+        if dir_id in merged:
+            continue
+        parent_path, name = split_path(new_path)
+        if parent_id not in moved_ids:
+            parent_id = None
+            if parent_path and path_key(parent_path) != new_key:
+                top_parents[dir_id] = parent_path
+        renamed.append(
+            [dir_id, merged.get(parent_id, parent_id), name or new_path, new_path, new_key]
+        )
+    # 付け替え・統合でファイル・子フォルダがなくなる可能性のあるフォルダ
+    emptied = moved_ids | {row[1] for row in moved if row[1] not in moved_ids}
+    # 最上位は変更後の親フォルダに付け替える
+    parent_ids = intern_dirs(cursor, top_parents.values())
+    for row in renamed:
+        if row[0] in top_parents:
+            row[1] = parent_ids[path_key(top_parents[row[0]])]
+    moved_at = time.time()
+    # フォルダごとに更新するとFTSのトリガーが文ごとに動くため、一時テーブルから1文で更新する
+    if merged:
+        cursor.execute(
+            """
+            CREATE TEMP TABLE dir_merge (
+                id INTEGER PRIMARY KEY,
+                target_id INTEGER NOT NULL
+            )
+            """
+        )
+        cursor.executemany("INSERT INTO dir_merge VALUES (?, ?)", merged.items())
+        # 同じファイル名のファイルがある場合はIntegrityError
+        cursor.execute(
+            """
+            UPDATE file_entries
+            SET dir_id = (SELECT target_id FROM dir_merge WHERE id = file_entries.dir_id)
+            WHERE dir_id IN (SELECT id FROM dir_merge)
+            """
+        )
+        cursor.execute("DELETE FROM dirs WHERE id IN (SELECT id FROM dir_merge)")
+        cursor.execute(
+            "UPDATE dirs SET moved_at = ? WHERE id IN (SELECT target_id FROM dir_merge)",
+            (moved_at,),
+        )
+        cursor.execute("DROP TABLE dir_merge")
+    cursor.execute(
+        """
+        CREATE TEMP TABLE dir_move (
+            id INTEGER PRIMARY KEY,
+            parent_id INTEGER,
+            name TEXT,
+            path TEXT,
+            path_key TEXT
+        )
+        """
+    )
+    cursor.executemany("INSERT INTO dir_move VALUES (?, ?, ?, ?, ?)", renamed)
+    cursor.execute(
+        """
+        UPDATE dirs
+        SET (parent_id, name, path, path_key, moved_at) = (
+            SELECT parent_id, name, path, path_key, CASE
+                WHEN EXISTS (SELECT 1 FROM file_entries WHERE dir_id = dirs.id)
+                THEN ?
+            END
+            FROM dir_move
+            WHERE dir_move.id = dirs.id
+        )
+        WHERE id IN (SELECT id FROM dir_move)
+        """,
+        (moved_at,),
+    )
+    cursor.execute("DROP TABLE dir_move")
+    # フォルダ自身の登録
+    own = _find_file(cursor, old_prefix)
+    if own:
+        cursor.execute("SELECT dir_id FROM file_entries WHERE id = ?", (own[0],))
+        emptied.add(cursor.fetchone()[0])
+        cursor.execute(
+            """
+            UPDATE file_entries
+            SET dir_id = ?, basename = ?, name_key = ?, checked_at = NULL
+            WHERE id = ?
+            """,
+            (*_location(cursor, new_prefix), own[0]),
+        )
+        count += 1
+    delete_orphan_dirs(cursor, emptied)
+    return count
+
+
+def select_tags(cursor: sqlite3.Cursor) -> list:
+    """タグ一覧
+
+    Returns:
+        list: (id, tag_name)のリスト
+    """
+    cursor.execute(
+        """
+        SELECT 
+            mng.id, 
+            mng.tag_name
+        FROM tag_mng mng
+        ORDER BY mng.tag_name
+        """
+    )
+    return cursor.fetchall()
+
+
+def select_tag_counts(cursor: sqlite3.Cursor) -> list:
+    """タグごとの紐づけファイル数(トリガーで更新した件数)
+
+    Returns:
+        list: (id, tag_name, count)のリスト
+    """
+    cursor.execute(
+        """
+        SELECT id, tag_name, file_count
+        FROM tag_mng
+        ORDER BY tag_name
+        """
+    )
+    return cursor.fetchall()
+
+
+def select_table_stats(cursor: sqlite3.Cursor) -> list:
+    """テーブルごとのレコード数
+
+    トリガーで件数を更新しているテーブルは集計せずに件数を返す。
+    ビュー・FTSのテーブルは元のテーブルの件数、FTSの内部テーブルは対象外
+
+    Returns:
+        list: (テーブル名, レコード数)のリスト
+    """
+    cursor.execute("SELECT name, row_count FROM table_stats")
+    counts = dict(cursor.fetchall())
+    cursor.execute(
+        """
+        SELECT name, type, sql FROM sqlite_master
+        WHERE type IN ('table', 'view')
+        AND name NOT LIKE 'sqlite_%'
+        """
+    )
+    tables = cursor.fetchall()
+    fts_tables = [
+        name
+        for name, _, sql in tables
+        if sql and sql.upper().startswith("CREATE VIRTUAL TABLE")
+    ]
+    stats = []
+    for table_name, _, _ in tables:
+        if any(
+            table_name.startswith(f"{fts}_") and table_name != fts
+            for fts in fts_tables
+        ):
+            continue
+        source = COUNT_SOURCES.get(table_name, table_name)
+        if source in counts:
+            stats.append((table_name, counts[source]))
+            continue
+        cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
+        stats.append((table_name, cursor.fetchone()[0]))
+    return stats
+
+
+def rebuild_counters(cursor: sqlite3.Cursor) -> int:
+    """レコード数とタグごとのファイル数を集計し直す
+
+    Returns:
+        int: 集計結果と異なっていた件数の数
+    """
+    fixed = 0
+    for table in COUNTED_TABLES:
+        cursor.execute(f"SELECT COUNT(*) FROM {table}")
+        count = cursor.fetchone()[0]
+        cursor.execute(
+            "SELECT row_count FROM table_stats WHERE name = ?", (table,)
+        )
+        row = cursor.fetchone()
+        if row is None or row[0] != count:
+            fixed += 1
+            cursor.execute(
+                "INSERT OR REPLACE INTO table_stats (name, row_count) VALUES (?, ?)",
+                (table, count),
+            )
+    cursor.execute(
+        """
+        UPDATE tag_mng
+        SET file_count = (SELECT COUNT(*) FROM file_tags WHERE tag_id = tag_mng.id)
+        WHERE file_count IS NOT (
+            SELECT COUNT(*) FROM file_tags WHERE tag_id = tag_mng.id
+        )
+        """
+    )
+    return fixed + cursor.rowcount
+
+
+def rebuild_tags_keys(cursor: sqlite3.Cursor) -> int:
+    """並び替え用のタグ列(file_entries.tags_key)を作り直す
+
+    Returns:
+        int: 作り直した結果と異なっていた件数
+    """
+    cursor.execute(
+        f"""
+        UPDATE file_entries
+        SET tags_key = {tags_key_sql("file_entries.id")}
+        WHERE tags_key IS NOT {tags_key_sql("file_entries.id")}
+        """
+    )
+    return cursor.rowcount
+
+
+def select_table_columns(cursor: sqlite3.Cursor, table_name: str) -> list:
+    """テーブルのカラム情報(PRAGMA table_infoの結果)"""
+    cursor.execute(f"PRAGMA table_info({table_name})")
+    return cursor.fetchall()